@@ -1,6 +1,29 @@
 from pathlib import Path
 from collections.abc import Sequence
-from arcade.exceptions import warning, ReplacementWarning
+
+try:
+    from arcade.exceptions import warning, ReplacementWarning
+except ImportError:
+    # arcade 2.6 (pinned in requirements.txt) has no arcade.exceptions
+    import functools
+    import warnings
+
+    class ReplacementWarning(DeprecationWarning):
+        """Issued when a function is replaced by another one."""
+
+    def warning(warning_type, message: str = "", **kwargs):
+        """Warns with ``warning_type`` every time the decorated function is called."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kw):
+                text = message or f"{func.__name__} is replaced by {kwargs.get('new_name')}"
+                warnings.warn(text, warning_type, stacklevel=2)
+                return func(*args, **kw)
+
+            return wrapper
+
+        return decorator
 
 #: The absolute path to this directory
 RESOURCE_DIR = Path(__file__).parent.resolve()
@@ -20,11 +43,46 @@ handles: dict[str, list[Path]] = {
     "system": [SYSTEM_PATH],
 }
 
+#: Bundled font faces by name, mapped to the resource handle of their file.
+#: Faces are only registered with the text system when requested through
+#: :py:func:`load_font_faces`.
+FONT_FACES: dict[str, str] = {
+    "Kenney Blocks": ":system:fonts/ttf/Kenney/Kenney_Blocks.ttf",
+    "Kenney Future": ":system:fonts/ttf/Kenney/Kenney_Future.ttf",
+    "Kenney Future Narrow": ":system:fonts/ttf/Kenney/Kenney_Future_Narrow.ttf",
+    "Kenney High": ":system:fonts/ttf/Kenney/Kenney_High.ttf",
+    "Kenney High Square": ":system:fonts/ttf/Kenney/Kenney_High_Square.ttf",
+    "Kenney Mini": ":system:fonts/ttf/Kenney/Kenney_Mini.ttf",
+    "Kenney Mini Square": ":system:fonts/ttf/Kenney/Kenney_Mini_Square.ttf",
+    "Kenney Pixel": ":system:fonts/ttf/Kenney/Kenney_Pixel.ttf",
+    "Kenney Pixel Square": ":system:fonts/ttf/Kenney/Kenney_Pixel_Square.ttf",
+    "Kenney Rocket": ":system:fonts/ttf/Kenney/Kenney_Rocket.ttf",
+    "Kenney Rocket Square": ":system:fonts/ttf/Kenney/Kenney_Rocket_Square.ttf",
+    "Liberation Mono Bold Italic": ":system:fonts/ttf/Liberation/Liberation_Mono_BoldItalic.ttf",
+    "Liberation Mono Bold": ":system:fonts/ttf/Liberation/Liberation_Mono_Bold.ttf",
+    "Liberation Mono Italic": ":system:fonts/ttf/Liberation/Liberation_Mono_Italic.ttf",
+    "Liberation Mono": ":system:fonts/ttf/Liberation/Liberation_Mono_Regular.ttf",
+    "Liberation Sans Bold Italic": ":system:fonts/ttf/Liberation/Liberation_Sans_BoldItalic.ttf",
+    "Liberation Sans Bold": ":system:fonts/ttf/Liberation/Liberation_Sans_Bold.ttf",
+    "Liberation Sans Italic": ":system:fonts/ttf/Liberation/Liberation_Sans_Italic.ttf",
+    "Liberation Sans": ":system:fonts/ttf/Liberation/Liberation_Sans_Regular.ttf",
+    "Liberation Serif Bold Italic": ":system:fonts/ttf/Liberation/Liberation_Serif_BoldItalic.ttf",
+    "Liberation Serif Bold": ":system:fonts/ttf/Liberation/Liberation_Serif_Bold.ttf",
+    "Liberation Serif Italic": ":system:fonts/ttf/Liberation/Liberation_Serif_Italic.ttf",
+    "Liberation Serif": ":system:fonts/ttf/Liberation/Liberation_Serif_Regular.ttf",
+}
+
+# Names of the faces already passed to load_font
+_loaded_font_faces: set[str] = set()
+
 __all__ = [
     "resolve_resource_path",
     "resolve",
     "add_resource_handle",
     "get_resource_handle_paths",
+    "FONT_FACES",
+    "get_font_face_path",
+    "load_font_faces",
 ]
 
 
@@ -214,6 +272,46 @@ def list_built_in_assets(
     return filtered_paths
 
 
+def get_font_face_path(font_name: str) -> Path:
+    """
+    Returns the absolute path of a bundled font face without loading it.
+
+    Useful for tools that rasterise the font themselves, such as a
+    bitmap glyph atlas.
+
+    Args:
+        font_name: A key of :py:data:`FONT_FACES`, e.g. ``"Liberation Sans Bold"``
+    """
+    try:
+        return resolve(FONT_FACES[font_name])
+    except KeyError:
+        raise KeyError(f'Unknown bundled font face "{font_name}"')
+
+
+def load_font_faces(*font_names: str) -> None:
+    """
+    Loads only the requested bundled font faces.
+
+    Each face is registered with the text system the first time it is
+    requested; later calls for the same face do nothing, so it is cheap to
+    call this right before the text that needs it.
+
+    Example::
+
+        load_font_faces("Liberation Sans", "Liberation Sans Bold")
+
+    Args:
+        font_names: Keys of :py:data:`FONT_FACES`
+    """
+    from arcade import load_font
+
+    for font_name in font_names:
+        if font_name in _loaded_font_faces:
+            continue
+        load_font(get_font_face_path(font_name))
+        _loaded_font_faces.add(font_name)
+
+
 def load_kenney_fonts() -> None:
     """Loads all the Kenney.nl fonts bundled with Arcade.
 
@@ -246,19 +344,7 @@ def load_kenney_fonts() -> None:
     =========================================  =========================================================================
 
     """  # noqa: E501  # Silence ruff  # pending: better generation
-    from arcade.text import load_font
-
-    load_font(":system:fonts/ttf/Kenney/Kenney_Blocks.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Future.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Future_Narrow.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_High.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_High_Square.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Mini.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Mini_Square.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Pixel.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Pixel_Square.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Rocket.ttf")
-    load_font(":system:fonts/ttf/Kenney/Kenney_Rocket_Square.ttf")
+    load_font_faces(*(name for name in FONT_FACES if name.startswith("Kenney ")))
 
 
 def load_liberation_fonts() -> None:
@@ -289,17 +375,4 @@ def load_liberation_fonts() -> None:
          - ``"Liberation Sans"``
 
     """
-    from arcade.text import load_font
-
-    load_font(":system:fonts/ttf/Liberation/Liberation_Mono_BoldItalic.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Mono_Bold.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Mono_Italic.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Mono_Regular.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Sans_BoldItalic.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Sans_Bold.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Sans_Italic.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Sans_Regular.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Serif_BoldItalic.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Serif_Bold.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Serif_Italic.ttf")
-    load_font(":system:fonts/ttf/Liberation/Liberation_Serif_Regular.ttf")
+    load_font_faces(*(name for name in FONT_FACES if name.startswith("Liberation ")))
@@ -0,0 +1,18 @@
+#version 330
+
+// the atlas stores glyph coverage in the red channel
+
+uniform sampler2D tex;
+uniform vec4 color;
+
+in vec2 v_uv;
+
+out vec4 f_color;
+
+void main() {
+    float coverage = texture(tex, v_uv).r;
+    if (coverage == 0.0) {
+        discard;
+    }
+    f_color = vec4(color.rgb, color.a * coverage);
+}
@@ -0,0 +1,23 @@
+#version 330
+
+// instanced glyph quads from a bitmap font atlas (HUD text)
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+// quad corner in the range [-1, 1]
+in vec2 in_vert;
+
+// per instance: screen rectangle (x, y, width, height)
+// and atlas coordinates (u0, v_bottom, u1, v_top)
+in vec4 in_rect;
+in vec4 in_uv;
+
+out vec2 v_uv;
+
+void main() {
+    vec2 corner = in_vert * 0.5 + 0.5;
+    v_uv = mix(in_uv.xy, in_uv.zw, corner);
+    gl_Position = proj.matrix * vec4(in_rect.xy + corner * in_rect.zw, 0.0, 1.0);
+}
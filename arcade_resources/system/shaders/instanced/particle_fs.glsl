@@ -0,0 +1,14 @@
+#version 330
+
+in vec2 v_uv;
+in vec4 v_color;
+
+out vec4 f_color;
+
+void main() {
+    // round particle, dead particles are not drawn
+    if (v_color.a <= 0.0 || dot(v_uv, v_uv) > 1.0) {
+        discard;
+    }
+    f_color = v_color;
+}
@@ -0,0 +1,28 @@
+#version 330
+
+// instanced particles: one quad per particle,
+// alpha fades with the remaining lifetime
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+// quad corner in the range [-1, 1]
+in vec2 in_vert;
+
+// per instance
+in vec2 in_pos;
+in float in_size;
+in vec3 in_color;
+// (lifetime left, max lifetime)
+in vec2 in_life;
+
+out vec2 v_uv;
+out vec4 v_color;
+
+void main() {
+    float alpha = clamp(in_life.x / in_life.y, 0.0, 1.0);
+    v_uv = in_vert;
+    v_color = vec4(in_color, alpha);
+    gl_Position = proj.matrix * vec4(in_pos + in_vert * in_size, 0.0, 1.0);
+}
@@ -0,0 +1,15 @@
+#version 330
+
+uniform sampler2D tex;
+
+in vec2 v_uv;
+
+out vec4 f_color;
+
+void main() {
+    vec4 color = texture(tex, v_uv);
+    if (color.a == 0.0) {
+        discard;
+    }
+    f_color = color;
+}
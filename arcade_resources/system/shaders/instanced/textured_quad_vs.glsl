@@ -0,0 +1,22 @@
+#version 330
+
+// instanced textured quads of the same size (bullets)
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+uniform vec2 half_size;
+
+// quad corner in the range [-1, 1]
+in vec2 in_vert;
+
+// per instance
+in vec2 in_pos;
+
+out vec2 v_uv;
+
+void main() {
+    v_uv = in_vert * 0.5 + 0.5;
+    gl_Position = proj.matrix * vec4(in_pos + in_vert * half_size, 0.0, 1.0);
+}
@@ -0,0 +1,39 @@
+#version 330
+
+// parallax background: every layer lives in one atlas texture and all of them
+// are composited back to front in a single pass. Scrolling only changes the
+// offsets uniform, the geometry never changes.
+
+// replaced with the actual number of layers when the program is loaded
+#define LAYER_COUNT 1
+
+uniform sampler2D atlas;
+
+// atlas rectangle of the layer in texels: x, y of the top row, width, height
+uniform vec4 rects[LAYER_COUNT];
+// bottom edge on screen, screen pixels per texel, repeat vertically (0 / 1), brightness
+uniform vec4 placement[LAYER_COUNT];
+// current scroll of the layer in texels
+uniform vec2 offsets[LAYER_COUNT];
+
+in vec2 v_pos;
+
+out vec4 fragColor;
+
+void main() {
+    vec3 color = vec3(0.0);
+    for (int i = 0; i < LAYER_COUNT; i++) {
+        vec4 rect = rects[i];
+        vec4 place = placement[i];
+        vec2 p = vec2(v_pos.x, v_pos.y - place.x) / place.y;
+        // a strip that does not repeat vertically covers only its own height
+        if (place.z == 0.0 && (p.y < 0.0 || p.y >= rect.w)) {
+            continue;
+        }
+        vec2 texel = mod(floor(p + offsets[i]), rect.zw);
+        // atlas rows go from the top of the picture down
+        vec4 layer_color = texelFetch(atlas, ivec2(rect.x + texel.x, rect.y + rect.w - 1.0 - texel.y), 0);
+        color = mix(color, layer_color.rgb * place.w, layer_color.a);
+    }
+    fragColor = vec4(color, 1.0);
+}
@@ -0,0 +1,15 @@
+#version 330
+
+// fullscreen quad of the parallax background, corners in the range [-1, 1]
+
+uniform vec2 screen_size;
+
+in vec2 in_vert;
+
+// position in screen pixels, origin at the bottom left corner
+out vec2 v_pos;
+
+void main() {
+    v_pos = (in_vert * 0.5 + 0.5) * screen_size;
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+}
@@ -1,10 +1,37 @@
 import arcade
+import numpy as np
 import random
 import csv
 import os
 import math
 import datetime
 import sqlite3
+import gc
+import json
+import logging
+import logging.handlers
+import tracemalloc
+import struct
+import asyncio
+import itertools
+import gzip
+import io
+import shutil
+import time
+import hashlib
+import heapq
+import string
+import mmap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple, deque
+from pyglet.math import Mat4
+from pyglet.media.codecs.base import AudioData, AudioFormat, StaticMemorySource, StaticSource, StreamingSource
+import pyglet.media
+from arcade.gl import BufferDescription
+from PIL import Image, ImageDraw, ImageFont
+
+from arcade_resources import get_font_face_path
 
 # константы
 SCREEN_WIDTH = 1024
@@ -19,6 +46,123 @@ ENEMY_BULLET_SPEED = 5
 POWERUP_SPEED = 2
 PLAYER_START_LIVES = 3
 
+# бюджет времени кадра - при превышении качество эффектов снижается автоматически
+FRAME_BUDGET_MS = 1000 / 60
+
+# уровни качества эффектов от лучшего к худшему
+QUALITY_LEVELS = [
+    {"explosion_particles": 30, "particle_lifetime": 0.8, "enemy_pulse": True,
+     "shield_segments": -1, "sound_voices": 8},
+    {"explosion_particles": 20, "particle_lifetime": 0.6, "enemy_pulse": True,
+     "shield_segments": 32, "sound_voices": 6},
+    {"explosion_particles": 12, "particle_lifetime": 0.45, "enemy_pulse": False,
+     "shield_segments": 20, "sound_voices": 4},
+    {"explosion_particles": 6, "particle_lifetime": 0.3, "enemy_pulse": False,
+     "shield_segments": 12, "sound_voices": 2},
+]
+
+# раскодированные картинки и звуки (сырые буферы для mmap), пересобираются при изменении ресурсов
+ASSET_CACHE_DIR = ".asset_cache"
+
+# контуры спрайтов: готовые поставляются рядом с ресурсами и только читаются,
+# контуры измененных или новых текстур пересчитываются и сохраняются в кэш ресурсов
+HIT_BOX_FILE = "arcade_resources/hit_boxes.json"
+HIT_BOX_CACHE_FILE = os.path.join(ASSET_CACHE_DIR, "hit_boxes.json")
+
+# фоновая музыка - треки раскодируются потоком в фоне (выключается LINVADERS_MUSIC=0)
+# в ресурсах один трек, поэтому меню и игра используют его оба; при смене трека
+# музыка плавно переходит с одного на другой
+MUSIC_ENABLED = os.environ.get("LINVADERS_MUSIC", "1") == "1"
+MUSIC_MENU_TRACK = "arcade_resources/assets/music/1918.mp3"
+MUSIC_GAME_TRACK = "arcade_resources/assets/music/1918.mp3"
+MUSIC_VOLUME = 0.4
+MUSIC_BUFFER_SECONDS = 2.0  # размер кольцевого буфера раскодированного звука
+MUSIC_PREFETCH_SECONDS = 0.5  # сколько набрать в буфер перед началом воспроизведения
+MUSIC_CROSSFADE_SECONDS = 1.5
+
+# описание уровней и волн врагов (можно заменить переменной окружения LINVADERS_LEVELS)
+LEVELS_FILE = os.environ.get("LINVADERS_LEVELS", "levels.json")
+LEVEL_CACHE_DIR = ".level_cache"  # скомпилированные описания уровней, ключ - хеш файла
+
+# ввод: сколько нажатий выстрела запоминается, пока идет перезарядка
+FIRE_BUFFER_SIZE = 2
+# запись ввода игровых сессий для повтора (LINVADERS_RECORD_INPUT=<папка>), см. perf_gate.py
+INPUT_RECORD_DIR = os.environ.get("LINVADERS_RECORD_INPUT")
+
+# геймпады (выключаются LINVADERS_GAMEPAD=0): раскладки из базы SDL, которая
+# компилируется в двоичный индекс при первом подключении неизвестного pyglet геймпада
+GAMEPAD_ENABLED = os.environ.get("LINVADERS_GAMEPAD", "1") == "1"
+CONTROLLER_DB_FILE = "arcade_resources/system/gamecontrollerdb.txt"
+CONTROLLER_CACHE_DIR = ".controller_cache"
+GAMEPAD_DEADZONE = 0.35  # отклонение стика, с которого начинается движение
+GAMEPAD_RELEASE = 0.25  # отклонение, ниже которого движение прекращается
+# кнопки геймпада -> действия (стик и крестовина дают "left" и "right");
+# действие получает on_gamepad текущего view, каждый view решает сам, что оно значит
+GAMEPAD_BUTTON_ACTIONS = {
+    "a": "fire",
+    "rightshoulder": "fire",
+    "start": "start",
+    "back": "back",
+    "y": "restart",
+}
+
+# шрифт интерфейса (начертание из arcade_resources.FONT_FACES) - растеризуется
+# один раз в атлас, атлас кэшируется на диске
+HUD_FONT = "Liberation Sans Bold"
+HUD_CHARSET = (string.ascii_letters + string.digits + " :.,-_!?()"
+               + "абвгдеёжзийклмнопрстуфхцчшщъыьэюя" + "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ")
+FONT_CACHE_DIR = ".font_cache"
+
+# снимки состояния игры: F5 - сохранить, F9 - загрузить;
+# LINVADERS_SNAPSHOT=<файл> загружает снимок при первом запуске игры (для профилирования)
+SNAPSHOT_FILE = "savestate.bin"
+SNAPSHOT_ON_START = os.environ.get("LINVADERS_SNAPSHOT")
+
+# зрительский режим (второй экран): LINVADERS_SPECTATOR=<порт> запускает сервер,
+# к которому подключается spectator.py
+SPECTATOR_PORT = int(os.environ.get("LINVADERS_SPECTATOR", "0"))
+SPECTATOR_HOST = "127.0.0.1"
+SPECTATOR_INTERVAL = 3  # рассылка раз в столько тиков
+SPECTATOR_MAX_BACKLOG = 256 * 1024  # неотправленных байт на клиента, больше - клиент пропускает рассылки
+SPECTATOR_POSITION_SCALE = 256  # координаты и скорости передаются в 1/256 пикселя
+SPECTATOR_TOLERANCE = 64  # на сколько (в 1/256 пикселя) предсказание зрителя может разойтись с игрой
+
+# камера игрового слоя
+CAMERA_ZOOM = 1.0  # масштаб игрового слоя (1.0 - без увеличения)
+
+# параллакс-фон за игровым слоем (LINVADERS_BACKGROUND=0 - черный фон)
+BACKGROUND_ENABLED = os.environ.get("LINVADERS_BACKGROUND", "1") == "1"
+# слой фона: нижний край на экране, пикселей экрана на тексель, повтор по вертикали,
+# яркость, скорость прокрутки (текселей в секунду) и доля смещения игрока от центра экрана
+BackgroundLayer = namedtuple("BackgroundLayer", ["file", "bottom", "scale", "repeat_y", "brightness",
+                                                 "speed_x", "speed_y", "sway"])
+# слои от дальнего к ближнему
+BACKGROUND_LAYERS = [
+    BackgroundLayer("arcade_resources/assets/images/backgrounds/stars.png",
+                    0, 1, True, 0.7, 0, 12, 0.01),
+    BackgroundLayer("arcade_resources/assets/images/cybercity_background/back-buildings.png",
+                    0, 1.5, False, 0.2, 3, 0, 0.02),
+    BackgroundLayer("arcade_resources/assets/images/cybercity_background/foreground.png",
+                    0, 1, False, 0.3, 8, 0, 0.05),
+]
+
+# мониторинг памяти для долгой работы на игровых автоматах
+# включается переменной окружения LINVADERS_MEMORY_MONITOR=1
+MEMORY_MONITOR_ENABLED = os.environ.get("LINVADERS_MEMORY_MONITOR") == "1"
+MEMORY_MONITOR_INTERVAL = 30  # секунд между замерами
+MEMORY_MONITOR_LOG = "memory_monitor.log"
+MEMORY_MONITOR_TOP_N = 10  # сколько мест выделения памяти tracemalloc писать в лог
+MEMORY_GROWTH_WARNING_MB = 5  # предупреждение, если rss вырос за игровую сессию больше
+
+# телеметрия игровых сессий (включается переменной окружения LINVADERS_TELEMETRY=1)
+TELEMETRY_ENABLED = os.environ.get("LINVADERS_TELEMETRY") == "1"
+TELEMETRY_DIR = "telemetry"
+TELEMETRY_CAPACITY = 60 * 60 * 5  # тиков в буфере (5 минут), при заполнении сбрасывается досрочно
+
+# журналы результатов - ротация по размеру, старые сегменты сжимаются gzip
+SCORE_LOG_MAX_BYTES = 1024 * 1024
+SCORE_LOG_BACKUPS = 10
+SCORE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 class PowerUpType:
     # типы улучшений
@@ -27,287 +171,3363 @@ class PowerUpType:
     EXTRA_LIFE = 3
 
 
+# правила повторного подбора действующего улучшения
+STACK_REFRESH = "refresh"  # таймер заново отсчитывает duration
+STACK_EXTEND = "extend"  # к оставшемуся времени добавляется duration, но не больше max_duration
+STACK_INSTANT = "instant"  # мгновенное действие без таймера
+
+# flag - булев атрибут игрока, который включен пока действует улучшение
+# duration и max_duration в кадрах, instant - функция мгновенного действия
+PowerUpEffect = namedtuple("PowerUpEffect", ["flag", "duration", "stacking", "max_duration", "instant"])
+
+
+def grant_extra_life(player):
+    player.lives += 1
+
+
+POWERUP_EFFECTS = {
+    PowerUpType.SHIELD: PowerUpEffect("shield_active", 300, STACK_REFRESH, 300, None),  # 5 секунд
+    PowerUpType.RAPID_FIRE: PowerUpEffect("rapid_fire_active", 300, STACK_EXTEND, 600, None),
+    PowerUpType.EXTRA_LIFE: PowerUpEffect(None, 0, STACK_INSTANT, 0, grant_extra_life),
+}
+
+# прозрачность анимации щита по числу оставшихся кадров, считается один раз
+SHIELD_ALPHA = tuple(int(128 + 127 * math.sin(remaining * 0.2))
+                     for remaining in range(POWERUP_EFFECTS[PowerUpType.SHIELD].max_duration + 1))
+
+
+class PowerUpEffects:
+    # действующие улучшения игрока, у каждого свой таймер
+    #
+    # время окончания хранится в min-куче, поэтому за кадр проверяется только ее
+    # вершина и неактивные улучшения ничего не стоят; при продлении старая запись
+    # остается в куче и пропускается, когда до нее дойдет очередь
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.tick = 0
+        self.expiry = {}
+        self.heap = []
+
+    def apply(self, powerup_type):
+        effect = POWERUP_EFFECTS[powerup_type]
+        if effect.stacking == STACK_INSTANT:
+            effect.instant(self.owner)
+            return
+
+        current = self.expiry.get(powerup_type)
+        if current is None:
+            expires = self.tick + effect.duration
+            setattr(self.owner, effect.flag, True)
+        elif effect.stacking == STACK_EXTEND:
+            expires = min(current + effect.duration, self.tick + effect.max_duration)
+        else:
+            expires = max(current, self.tick + effect.duration)
+
+        if expires != current:
+            self.expiry[powerup_type] = expires
+            heapq.heappush(self.heap, (expires, powerup_type))
+
+    def update(self, steps=1):
+        # шаг в steps кадров: снятие закончившихся улучшений
+        self.tick += steps
+        heap = self.heap
+        while heap and heap[0][0] <= self.tick:
+            expires, powerup_type = heapq.heappop(heap)
+            if self.expiry.get(powerup_type) == expires:
+                del self.expiry[powerup_type]
+                setattr(self.owner, POWERUP_EFFECTS[powerup_type].flag, False)
+
+    def remaining(self, powerup_type):
+        # сколько кадров осталось действовать улучшению (0 - не действует)
+        return self.expiry.get(powerup_type, self.tick) - self.tick
+
+    def clear(self):
+        for powerup_type in self.expiry:
+            setattr(self.owner, POWERUP_EFFECTS[powerup_type].flag, False)
+        self.expiry.clear()
+        self.heap.clear()
+        self.tick = 0
+
+
 class DatabaseManager:
-    # менеджер базы данных sqlite для хранения рекордов
+    # менеджер базы данных sqlite для хранения рекордов и статистики игр
+    #
+    # схема версионируется через PRAGMA user_version: SCHEMA_MIGRATIONS[i] переводит
+    # базу с версии i на i + 1, при открытии применяются недостающие миграции.
+    # соединение одно на все время работы, а запросы берутся по имени из STATEMENTS -
+    # sqlite3 хранит подготовленные выражения в кэше соединения и не разбирает sql заново
+    #
+    #   scores        - итог каждой игры (как раньше, с ним работает scores_tool.py)
+    #   players       - игроки со сводкой: число игр, лучший и суммарный счет
+    #   sessions      - игры: игрок, начало, длительность, счет, уровень, жизни
+    #   level_results - уровни каждой игры: длительность, выстрелы, попадания, ...
+    #   level_totals  - сводка по номерам уровней
+    # сводки обновляются триггерами при вставке и удалении, поэтому статистика игроков
+    # и уровней читается из маленьких таблиц, а не агрегируется по всем сессиям.
+    # запись scores ссылается на свою сессию: запись, вставленная без сессии, получает ее
+    # триггером, а удаление записи удаляет и сессию
+
+    SCHEMA_MIGRATIONS = [
+        # 1 - исходная таблица результатов
+        """
+        CREATE TABLE IF NOT EXISTS scores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_name TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            level INTEGER NOT NULL,
+            lives INTEGER NOT NULL,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # 2 - игроки, сессии и результаты уровней
+        """
+        CREATE TABLE players (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            games INTEGER NOT NULL DEFAULT 0,
+            best_score INTEGER NOT NULL DEFAULT 0,
+            total_score INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE sessions (
+            id INTEGER PRIMARY KEY,
+            player_id INTEGER NOT NULL REFERENCES players (id) ON DELETE CASCADE,
+            started TIMESTAMP NOT NULL,
+            duration REAL NOT NULL DEFAULT 0,
+            score INTEGER NOT NULL,
+            level INTEGER NOT NULL,
+            lives INTEGER NOT NULL
+        );
+        CREATE TABLE level_results (
+            session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+            level INTEGER NOT NULL,
+            duration REAL NOT NULL,
+            score INTEGER NOT NULL,
+            shots INTEGER NOT NULL,
+            hits INTEGER NOT NULL,
+            kills INTEGER NOT NULL,
+            lives_lost INTEGER NOT NULL,
+            powerups INTEGER NOT NULL,
+            completed INTEGER NOT NULL,
+            PRIMARY KEY (session_id, level)
+        ) WITHOUT ROWID;
+        CREATE TABLE level_totals (
+            level INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            duration REAL NOT NULL DEFAULT 0,
+            shots INTEGER NOT NULL DEFAULT 0,
+            hits INTEGER NOT NULL DEFAULT 0,
+            kills INTEGER NOT NULL DEFAULT 0,
+            lives_lost INTEGER NOT NULL DEFAULT 0
+        );
+
+        -- покрывающие индексы: таблица рекордов и рекорды игрока
+        CREATE INDEX idx_sessions_score ON sessions (score DESC, player_id, level, started);
+        CREATE INDEX idx_sessions_player ON sessions (player_id, score DESC, level, started);
+
+        CREATE TRIGGER sessions_player_totals AFTER INSERT ON sessions BEGIN
+            UPDATE players SET games = games + 1,
+                               best_score = MAX(best_score, NEW.score),
+                               total_score = total_score + NEW.score
+            WHERE id = NEW.player_id;
+        END;
+        CREATE TRIGGER level_results_totals AFTER INSERT ON level_results BEGIN
+            INSERT OR IGNORE INTO level_totals (level) VALUES (NEW.level);
+            UPDATE level_totals SET attempts = attempts + 1,
+                                    completed = completed + NEW.completed,
+                                    duration = duration + NEW.duration,
+                                    shots = shots + NEW.shots,
+                                    hits = hits + NEW.hits,
+                                    kills = kills + NEW.kills,
+                                    lives_lost = lives_lost + NEW.lives_lost
+            WHERE level = NEW.level;
+        END;
+
+        -- старые результаты становятся сессиями без статистики уровней
+        INSERT INTO players (name) SELECT DISTINCT player_name FROM scores;
+        INSERT INTO sessions (player_id, started, score, level, lives)
+            SELECT players.id, COALESCE(scores.date, '1970-01-01 00:00:00'), scores.score, scores.level, scores.lives
+            FROM scores JOIN players ON players.name = scores.player_name
+            ORDER BY scores.id;
+        """,
+        # 3 - каждая запись scores связана со своей сессией: результаты, добавленные
+        # или удаленные в обход игры (scores_tool.py), попадают в рекорды и сводки
+        """
+        ALTER TABLE scores ADD COLUMN session_id INTEGER;
+
+        -- связь существующих записей с сессиями: n-я запись с данными игрока, счетом,
+        -- уровнем и жизнями соответствует n-й такой же сессии
+        UPDATE scores SET session_id = linked.session_id FROM (
+            SELECT ranked_scores.id AS score_id, ranked_sessions.id AS session_id
+            FROM (SELECT id, player_name, score, level, lives, ROW_NUMBER() OVER (
+                      PARTITION BY player_name, score, level, lives ORDER BY id) AS n
+                  FROM scores) AS ranked_scores
+            JOIN (SELECT sessions.id, players.name, sessions.score, sessions.level, sessions.lives,
+                         ROW_NUMBER() OVER (PARTITION BY players.name, sessions.score, sessions.level,
+                                            sessions.lives ORDER BY sessions.id) AS n
+                  FROM sessions JOIN players ON players.id = sessions.player_id) AS ranked_sessions
+            ON ranked_sessions.name = ranked_scores.player_name AND ranked_sessions.score = ranked_scores.score
+               AND ranked_sessions.level = ranked_scores.level AND ranked_sessions.lives = ranked_scores.lives
+               AND ranked_sessions.n = ranked_scores.n
+        ) AS linked WHERE scores.id = linked.score_id;
+
+        -- запись без сессии (вставлена не игрой) получает сессию без статистики уровней
+        CREATE TRIGGER scores_session AFTER INSERT ON scores WHEN NEW.session_id IS NULL BEGIN
+            INSERT OR IGNORE INTO players (name) VALUES (NEW.player_name);
+            INSERT INTO sessions (player_id, started, score, level, lives)
+                SELECT id, COALESCE(NEW.date, '1970-01-01 00:00:00'), NEW.score, NEW.level, NEW.lives
+                FROM players WHERE name = NEW.player_name;
+            UPDATE scores SET session_id = last_insert_rowid() WHERE id = NEW.id;
+        END;
+        -- удаление записи удаляет сессию, а с ней результаты уровней; сводки пересчитываются
+        CREATE TRIGGER scores_delete_session AFTER DELETE ON scores WHEN OLD.session_id IS NOT NULL BEGIN
+            DELETE FROM sessions WHERE id = OLD.session_id;
+        END;
+        CREATE TRIGGER sessions_delete_player_totals AFTER DELETE ON sessions BEGIN
+            DELETE FROM level_results WHERE session_id = OLD.id;
+            UPDATE players SET games = games - 1,
+                               best_score = COALESCE((SELECT MAX(score) FROM sessions
+                                                      WHERE player_id = OLD.player_id), 0),
+                               total_score = total_score - OLD.score
+            WHERE id = OLD.player_id;
+        END;
+        CREATE TRIGGER level_results_delete_totals AFTER DELETE ON level_results BEGIN
+            UPDATE level_totals SET attempts = attempts - 1,
+                                    completed = completed - OLD.completed,
+                                    duration = duration - OLD.duration,
+                                    shots = shots - OLD.shots,
+                                    hits = hits - OLD.hits,
+                                    kills = kills - OLD.kills,
+                                    lives_lost = lives_lost - OLD.lives_lost
+            WHERE level = OLD.level;
+        END;
+
+        -- записи, импортированные до этой версии, вставляются заново - уже с сессиями
+        CREATE TEMP TABLE unlinked_scores AS
+            SELECT id, player_name, score, level, lives, date FROM scores WHERE session_id IS NULL;
+        DELETE FROM scores WHERE session_id IS NULL;
+        INSERT INTO scores (id, player_name, score, level, lives, date)
+            SELECT id, player_name, score, level, lives, date FROM unlinked_scores ORDER BY id;
+        DROP TABLE unlinked_scores;
+        """,
+        # 4 - дата результата в местном времени, как в файловых журналах: до этой версии
+        # игра писала scores.date по utc (datetime('now')), сессии, созданные из таких
+        # записей, получили ту же дату начала
+        """
+        UPDATE sessions SET started = datetime(sessions.started, 'localtime') FROM scores
+            WHERE scores.session_id = sessions.id AND scores.date = sessions.started;
+        UPDATE scores SET date = datetime(date, 'localtime') WHERE date IS NOT NULL;
+        """,
+    ]
+
+    # версия схемы, с которой scores.date хранится в местном времени
+    LOCAL_DATE_VERSION = 4
+
+    STATEMENTS = {
+        "insert_player": "INSERT OR IGNORE INTO players (name) VALUES (?)",
+        "player_id": "SELECT id FROM players WHERE name = ?",
+        "insert_session": "INSERT INTO sessions (player_id, started, duration, score, level, lives) "
+                          "VALUES (?, ?, ?, ?, ?, ?)",
+        "insert_level_result": "INSERT INTO level_results (session_id, level, duration, score, shots, hits, "
+                               "kills, lives_lost, powerups, completed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        "insert_score": "INSERT INTO scores (player_name, score, level, lives, date, session_id) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+        "top_scores": "SELECT players.name, sessions.score, sessions.level, sessions.started "
+                      "FROM sessions JOIN players ON players.id = sessions.player_id "
+                      "ORDER BY sessions.score DESC LIMIT ?",
+        "player_summary": "SELECT games, best_score, total_score FROM players WHERE name = ?",
+        "player_best": "SELECT sessions.score, sessions.level, sessions.started FROM sessions "
+                       "WHERE sessions.player_id = (SELECT id FROM players WHERE name = ?) "
+                       "ORDER BY sessions.score DESC LIMIT ?",
+        "level_summary": "SELECT level, attempts, completed, duration / attempts, "
+                         "hits * 1.0 / MAX(shots, 1), kills, lives_lost FROM level_totals "
+                         "WHERE attempts > 0 ORDER BY level",
+    }
 
     def __init__(self, db_name='game_scores.db'):
         self.db_name = db_name
+        self.conn = None
         self.init_database()
 
     def init_database(self):
-        # инициализация базы данных
+        # открытие базы и обновление схемы до последней версии
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS scores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_name TEXT NOT NULL,
-                    score INTEGER NOT NULL,
-                    level INTEGER NOT NULL,
-                    lives INTEGER NOT NULL,
-                    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            conn.close()
+            self.conn = sqlite3.connect(self.db_name, cached_statements=len(self.STATEMENTS) + 16)
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.migrate()
             print(f"база данных {self.db_name} инициализирована")
         except Exception as e:
             print(f"ошибка создания базы данных: {e}")
 
-    def save_score(self, player_name, score, level, lives):
-        # сохранение результата в базу данных
+    def schema_version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        # каждая миграция вместе с номером версии применяется одной транзакцией
+        for version in range(self.schema_version(), len(self.SCHEMA_MIGRATIONS)):
+            try:
+                self.conn.executescript(f"BEGIN;\n{self.SCHEMA_MIGRATIONS[version]}\n"
+                                        f"PRAGMA user_version = {version + 1};\nCOMMIT;")
+            except sqlite3.Error:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                raise
+            print(f"схема базы {self.db_name} обновлена до версии {version + 1}")
+
+    def execute(self, name, params=()):
+        # выполнение запроса из STATEMENTS
+        return self.conn.execute(self.STATEMENTS[name], params)
+
+    def save_session(self, player_name, score, level, lives, started, level_results=(), date=None):
+        # итог игры, ее сессия и результаты всех уровней - одной транзакцией;
+        # date - время результата в местном времени, как в файловых журналах
+        # (раньше здесь было datetime('now') в utc, старые записи переводит миграция 4)
+        if date is None:
+            date = datetime.datetime.now().strftime(SCORE_DATE_FORMAT)
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO scores (player_name, score, level, lives, date)
-                VALUES (?, ?, ?, ?, datetime('now'))
-            ''', (player_name, score, level, lives))
-            conn.commit()
-            conn.close()
+            with self.conn:
+                self.execute("insert_player", (player_name,))
+                player_id, = self.execute("player_id", (player_name,)).fetchone()
+                duration = sum(result.duration for result in level_results)
+                session_id = self.execute("insert_session",
+                                          (player_id, started, duration, score, level, lives)).lastrowid
+                self.conn.executemany(self.STATEMENTS["insert_level_result"],
+                                      [(session_id,) + tuple(result) for result in level_results])
+                self.execute("insert_score", (player_name, score, level, lives, date, session_id))
             print(f"результат сохранен в бд: {player_name}, {score}, {level}, {lives}")
             return True
         except Exception as e:
             print(f"ошибка сохранения в бд: {e}")
             return False
 
+    def save_score(self, player_name, score, level, lives):
+        # сохранение результата без статистики уровней
+        started = datetime.datetime.now().strftime(SCORE_DATE_FORMAT)
+        return self.save_session(player_name, score, level, lives, started)
+
+    def top_scores(self, limit=10):
+        # лучшие результаты: (игрок, счет, уровень, начало игры)
+        return self.execute("top_scores", (limit,)).fetchall()
+
+    def player_stats(self, player_name, limit=10):
+        # сводка игрока (игр, лучший счет, суммарный счет) и его лучшие игры
+        return (self.execute("player_summary", (player_name,)).fetchone(),
+                self.execute("player_best", (player_name, limit)).fetchall())
+
+    def level_stats(self):
+        # по уровням: попыток, пройдено, средняя длительность, точность, убито врагов, потеряно жизней
+        return self.execute("level_summary").fetchall()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# одна запись о результате игры
+ScoreRecord = namedtuple("ScoreRecord", ["player_name", "score", "level", "lives", "date"])
+
+
+class CsvScoreFormat:
+    # формат csv (как в highscores.csv)
+    name = "csv"
+    header = ['Player', 'Score', 'Level', 'Lives', 'Date']
+
+    def file_header(self):
+        return self.encode_row(self.header)
+
+    def encode(self, record):
+        return self.encode_row([record.player_name, record.score, record.level,
+                                record.lives, record.date])
+
+    @staticmethod
+    def encode_row(row):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        return buffer.getvalue().encode('utf-8')
+
+    def read(self, f):
+        # потоковое чтение записей из бинарного файла
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        for row in csv.reader(text):
+            if len(row) < 5 or row == self.header:
+                continue
+            try:
+                yield ScoreRecord(row[0], int(row[1]), int(row[2]), int(row[3]), row[4])
+            except ValueError:
+                continue
+
+
+class JsonlScoreFormat:
+    # формат jsonl - одна запись json на строку
+    name = "jsonl"
+
+    def file_header(self):
+        return b""
+
+    def encode(self, record):
+        return (json.dumps(record._asdict(), ensure_ascii=False) + "\n").encode('utf-8')
+
+    def read(self, f):
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+                yield ScoreRecord(data["player_name"], int(data["score"]), int(data["level"]),
+                                  int(data["lives"]), data["date"])
+            except (ValueError, KeyError):
+                continue
+
+
+class TextScoreFormat:
+    # многострочный текстовый формат (как в game_results.txt)
+    name = "txt"
+    separator = "-" * 40
+
+    def file_header(self):
+        return b""
+
+    def encode(self, record):
+        return (f"дата: {record.date}\n"
+                f"игрок: {record.player_name}\n"
+                f"очки: {record.score}\n"
+                f"уровень: {record.level}\n"
+                f"жизни: {record.lives}\n"
+                f"{self.separator}\n\n").encode('utf-8')
+
+    def read(self, f):
+        keys = {"дата": "date", "игрок": "player_name", "очки": "score",
+                "уровень": "level", "жизни": "lives"}
+        fields = {}
+        for line in io.TextIOWrapper(f, encoding='utf-8'):
+            line = line.rstrip("\n")
+            if line == self.separator:
+                try:
+                    yield ScoreRecord(fields["player_name"], int(fields["score"]), int(fields["level"]),
+                                      int(fields["lives"]), fields["date"])
+                except (KeyError, ValueError):
+                    pass
+                fields = {}
+            elif ": " in line:
+                key, value = line.split(": ", 1)
+                if key in keys:
+                    fields[keys[key]] = value
+
+
+class BinaryScoreFormat:
+    # компактный бинарный формат с записями фиксированного размера (48 байт)
+    # имя (utf-8, до 32 байт), очки, уровень, жизни, время unix
+    name = "bin"
+    magic = b"LISC"
+    version = 1
+    record_struct = struct.Struct("<32siHhq")
+    header_struct = struct.Struct("<4sHH")
+
+    def file_header(self):
+        return self.header_struct.pack(self.magic, self.version, self.record_struct.size)
+
+    def encode(self, record):
+        name = record.player_name.encode('utf-8')[:32]
+        timestamp = int(time.mktime(time.strptime(record.date, SCORE_DATE_FORMAT)))
+        return self.record_struct.pack(name, record.score, record.level, record.lives, timestamp)
+
+    def read(self, f):
+        header = f.read(self.header_struct.size)
+        if len(header) < self.header_struct.size:
+            return
+        magic, version, record_size = self.header_struct.unpack(header)
+        if magic != self.magic or version != self.version:
+            print(f"неизвестный формат бинарного журнала: {magic!r} v{version}")
+            return
+        while True:
+            chunk = f.read(record_size)
+            if len(chunk) < record_size:
+                return
+            name, score, level, lives, timestamp = self.record_struct.unpack(chunk)
+            # обрезка по 32 байтам могла разрезать символ utf-8
+            name = name.rstrip(b"\0").decode('utf-8', errors='ignore')
+            date = datetime.datetime.fromtimestamp(timestamp).strftime(SCORE_DATE_FORMAT)
+            yield ScoreRecord(name, score, level, lives, date)
+
+
+SCORE_FORMATS = {fmt.name: fmt for fmt in (CsvScoreFormat, JsonlScoreFormat,
+                                           TextScoreFormat, BinaryScoreFormat)}
+
+
+class ScoreLog:
+    # журнал результатов с ротацией по размеру
+    # текущий сегмент - path, старые - path.1.gz (новее) ... path.N.gz (старше)
+
+    def __init__(self, path, score_format, max_bytes=SCORE_LOG_MAX_BYTES,
+                 backup_count=SCORE_LOG_BACKUPS, compress=True):
+        self.path = path
+        self.format = score_format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+
+    def segment_name(self, index):
+        suffix = ".gz" if self.compress else ""
+        return f"{self.path}.{index}{suffix}"
+
+    def append(self, record):
+        # добавление одной записи и ротация, если сегмент стал слишком большим
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(self.format.file_header())
+            f.write(self.format.encode(record))
+            size = f.tell()
+        if size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        # сдвиг старых сегментов и сжатие текущего
+        if not os.path.isfile(self.path):
+            return
+        oldest = self.segment_name(self.backup_count)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(self.backup_count - 1, 0, -1):
+            name = self.segment_name(index)
+            if os.path.exists(name):
+                os.replace(name, self.segment_name(index + 1))
+        if self.backup_count <= 0:
+            os.remove(self.path)
+        elif self.compress:
+            with open(self.path, 'rb') as src, gzip.open(self.segment_name(1), 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.segment_name(1))
+
+    def segments(self):
+        # существующие сегменты от самого старого к текущему
+        names = [self.segment_name(i) for i in range(self.backup_count, 0, -1)]
+        names.append(self.path)
+        return [name for name in names if os.path.isfile(name)]
+
+    def __iter__(self):
+        # потоковое чтение всех записей без загрузки файлов целиком
+        for name in self.segments():
+            opener = gzip.open if name.endswith(".gz") else open
+            with opener(name, 'rb') as f:
+                yield from self.format.read(f)
+
+
+class MemoryMonitor:
+    # монитор утечек памяти - периодически пишет замеры в ротируемый лог
+    # (rss процесса, число объектов игры по типам, буферы видеокарты, топ выделений tracemalloc)
+
+    # типы объектов, количество которых отслеживается
+    # (пули и частицы хранятся в массивах numpy, отдельных объектов у них нет)
+    TRACKED_TYPES = ("GameView", "Player", "Enemy", "PowerUp", "SpriteList", "Player(pyglet)")
+
+    def __init__(self, log_name=MEMORY_MONITOR_LOG, interval=MEMORY_MONITOR_INTERVAL,
+                 top_n=MEMORY_MONITOR_TOP_N, growth_warning_mb=MEMORY_GROWTH_WARNING_MB):
+        self.log_name = log_name
+        self.interval = interval
+        self.top_n = top_n
+        self.growth_warning_mb = growth_warning_mb
+        self.session_count = 0
+        self.session_start_rss = None
+        self.running = False
+
+        # отдельный логгер с ротацией, чтобы лог не рос бесконечно
+        self.logger = logging.getLogger("linvaders.memory")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(log_name, maxBytes=1024 * 1024,
+                                                           backupCount=5, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            self.logger.addHandler(handler)
+
+    def start(self):
+        # запуск периодических замеров
+        if self.running:
+            return
+        tracemalloc.start()
+        arcade.schedule(self.sample, self.interval)
+        self.running = True
+        print(f"монитор памяти включен, лог: {self.log_name}")
+
+    def stop(self):
+        # остановка замеров
+        if not self.running:
+            return
+        arcade.unschedule(self.sample)
+        tracemalloc.stop()
+        self.running = False
+
+    @staticmethod
+    def get_rss():
+        # текущий rss процесса в байтах
+        try:
+            with open('/proc/self/statm') as f:
+                resident_pages = int(f.read().split()[1])
+            return resident_pages * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            import resource
+            # не linux - доступен только пиковый rss (на macos в байтах, иначе в килобайтах)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if os.uname().sysname == "Darwin" else peak * 1024
+        except (ImportError, AttributeError):
+            return 0
+
+    def count_objects(self):
+        # подсчет объектов отслеживаемых типов среди объектов сборщика мусора
+        counts = dict.fromkeys(self.TRACKED_TYPES, 0)
+        for obj in gc.get_objects():
+            obj_type = type(obj)
+            name = obj_type.__name__
+            # у pyglet свой класс Player - это проигрыватели из arcade.play_sound
+            if name == "Player" and obj_type.__module__.startswith("pyglet"):
+                name = "Player(pyglet)"
+            if name in counts:
+                counts[name] += 1
+        return counts
+
+    @staticmethod
+    def get_gpu_stats():
+        # число живых объектов opengl (создано минус освобождено)
+        try:
+            stats = arcade.get_window().ctx.stats
+        except RuntimeError:
+            return {}
+        result = {}
+        for key in ("buffer", "texture", "vertex_array", "framebuffer", "program"):
+            created, freed = getattr(stats, key)
+            result[key] = created - freed
+        return result
+
+    def get_top_allocations(self):
+        # самые крупные места выделения памяти по данным tracemalloc
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        top = []
+        for stat in snapshot.statistics('lineno')[:self.top_n]:
+            frame = stat.traceback[0]
+            top.append({"site": f"{frame.filename}:{frame.lineno}",
+                        "size_kb": round(stat.size / 1024, 1),
+                        "count": stat.count})
+        return top
+
+    def sample(self, delta_time=0):
+        # один замер - пишется в лог одной строкой json
+        record = {
+            "session": self.session_count,
+            "rss_mb": round(self.get_rss() / (1024 * 1024), 2),
+            "objects": self.count_objects(),
+            "gpu": self.get_gpu_stats(),
+            "top": self.get_top_allocations(),
+        }
+        self.logger.info(json.dumps(record, ensure_ascii=False))
+        return record
+
+    def session_started(self):
+        # вызывается в начале каждой игры - проверка роста памяти за прошлую сессию
+        rss = self.get_rss()
+        if self.session_start_rss is not None:
+            growth_mb = (rss - self.session_start_rss) / (1024 * 1024)
+            if growth_mb > self.growth_warning_mb:
+                message = f"rss вырос на {growth_mb:.1f} мб за игровую сессию {self.session_count}"
+                self.logger.warning(message)
+                print(f"предупреждение: {message}")
+        self.session_start_rss = rss
+        self.session_count += 1
+        if self.running:
+            self.sample()
+
+
+# монитор памяти (создается в main, если включен)
+memory_monitor = None
+
+
+# текстуры игровых объектов
+PLAYER_TEXTURE = "arcade_resources/assets/images/space_shooter/playerShip1_orange.png"
+ENEMY_TEXTURE = "arcade_resources/assets/images/space_shooter/playerShip1_orange.png"
+POWERUP_TEXTURES = {
+    PowerUpType.SHIELD: "arcade_resources/assets/images/items/star.png",
+    PowerUpType.RAPID_FIRE: "arcade_resources/assets/images/items/gemBlue.png",
+    PowerUpType.EXTRA_LIFE: "arcade_resources/assets/images/items/coinGold.png"
+}
+
+# формы для проверки столкновений
+SHAPE_AABB = "aabb"  # прямоугольник контура без учета поворота
+SHAPE_CIRCLE = "circle"  # описанная окружность контура, поворот не влияет
+SHAPE_POLYGON = "polygon"  # повернутый многоугольник контура (проверка arcade)
+
+# контур текстуры (точки относительно центра, без масштаба) и его границы
+HitShape = namedtuple("HitShape", ["points", "left", "bottom", "right", "top", "radius"])
+
+
+class HitBoxCache:
+    # контуры текстур считаются по прозрачности один раз и сохраняются в json;
+    # запись привязана к хешу файла текстуры (из индекса AssetCache), поэтому
+    # при замене картинки контур пересчитывается
+    #
+    # path - поставляемый файл (только чтение), cache_path - пересчитанные контуры,
+    # они перекрывают поставляемые
+
+    def __init__(self, path=HIT_BOX_FILE, cache_path=HIT_BOX_CACHE_FILE):
+        self.path = path
+        self.cache_path = cache_path
+        self.entries = None
+        self.computed = {}
+        self.shapes = {}
+        self.dirty = False
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self):
+        self.entries = self.read(self.path)
+        self.computed = self.read(self.cache_path)
+        self.entries.update(self.computed)
+
+    def shape(self, file_name):
+        shape = self.shapes.get(file_name)
+        if shape is not None:
+            return shape
+        if self.entries is None:
+            self.load()
+
+        # хеш файла берется из индекса кэша ресурсов - файл перечитывается,
+        # только если изменились его размер или mtime
+        stamp = assets.source_hash(file_name)
+        entry = self.entries.get(file_name)
+        if entry is None or entry.get("stamp") != stamp:
+            points = arcade.calculate_hit_box_points_simple(assets.image(file_name))
+            entry = {"stamp": stamp, "points": [[x, y] for x, y in points]}
+            self.entries[file_name] = entry
+            self.computed[file_name] = entry
+            self.dirty = True
+
+        points = tuple((x, y) for x, y in entry["points"])
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        shape = HitShape(points, min(xs), min(ys), max(xs), max(ys),
+                         max(math.hypot(x, y) for x, y in points))
+        self.shapes[file_name] = shape
+        return shape
+
+    def preload(self, file_names):
+        # расчет контуров при загрузке ресурсов и сохранение новых на диск
+        for file_name in file_names:
+            self.shape(file_name)
+        self.save()
+
+    def save(self):
+        # в кэш пишутся только пересчитанные контуры, поставляемый файл не меняется
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.computed, f, sort_keys=True)
+            os.replace(temp_path, self.cache_path)
+            self.dirty = False
+        except OSError as e:
+            print(f"не удалось сохранить кэш контуров: {e}")
+
+
+hit_boxes = HitBoxCache()
+
+
+def apply_hit_shape(sprite, file_name):
+    # контур спрайта из кэша вместо расчета по текстуре
+    # (текстуры из кэша ресурсов создаются с hit_box_algorithm="None")
+    sprite.hit_shape = hit_boxes.shape(file_name)
+    sprite.hit_box = sprite.hit_shape.points
+
+
+def hit_bounds(sprite):
+    # прямоугольник формы спрайта (left, bottom, right, top) без учета поворота
+    shape = sprite.hit_shape
+    scale = sprite.scale
+    return (sprite.center_x + shape.left * scale, sprite.center_y + shape.bottom * scale,
+            sprite.center_x + shape.right * scale, sprite.center_y + shape.top * scale)
+
+
+def sprites_collide(a, b):
+    # столкновение двух спрайтов по их формам
+    modes = {a.hit_shape_mode, b.hit_shape_mode}
+    if SHAPE_POLYGON in modes:
+        return arcade.check_for_collision(a, b)
+    if modes == {SHAPE_CIRCLE}:
+        radius = a.hit_shape.radius * a.scale + b.hit_shape.radius * b.scale
+        return (a.center_x - b.center_x) ** 2 + (a.center_y - b.center_y) ** 2 <= radius * radius
+    if modes == {SHAPE_AABB}:
+        a_left, a_bottom, a_right, a_top = hit_bounds(a)
+        b_left, b_bottom, b_right, b_top = hit_bounds(b)
+        return a_left <= b_right and b_left <= a_right and a_bottom <= b_top and b_bottom <= a_top
+    # окружность против прямоугольника: ближайшая к центру точка прямоугольника
+    circle, box = (a, b) if a.hit_shape_mode == SHAPE_CIRCLE else (b, a)
+    left, bottom, right, top = hit_bounds(box)
+    dx = circle.center_x - min(max(circle.center_x, left), right)
+    dy = circle.center_y - min(max(circle.center_y, bottom), top)
+    radius = circle.hit_shape.radius * circle.scale
+    return dx * dx + dy * dy <= radius * radius
+
+
+class MappedMemorySource(StaticMemorySource):
+    # источник для проигрывателя pyglet поверх отображенного в память буфера pcm:
+    # копируется только очередной кусок, который забирает звуковой драйвер
+
+    def __init__(self, data, audio_format):
+        self._view = data
+        self._offset = 0
+        self._max_offset = len(data)
+        self.audio_format = audio_format
+        self._duration = len(data) / float(audio_format.bytes_per_second)
+
+    def seek(self, timestamp):
+        offset = int(timestamp * self.audio_format.bytes_per_second)
+        offset -= offset % self.audio_format.bytes_per_sample
+        self._offset = min(max(offset, 0), self._max_offset)
+
+    def get_audio_data(self, num_bytes, compensation_time=0.0):
+        num_bytes -= num_bytes % self.audio_format.bytes_per_sample
+        chunk = self._view[self._offset:self._offset + num_bytes]
+        if not len(chunk):
+            return None
+        timestamp = self._offset / self.audio_format.bytes_per_second
+        self._offset += len(chunk)
+        duration = len(chunk) / self.audio_format.bytes_per_second
+        return AudioData(bytes(chunk), len(chunk), timestamp, duration, [])
+
+
+class MappedSoundSource(StaticSource):
+    # раскодированный звук в отображенном файле, можно проигрывать одновременно много раз
+
+    def __init__(self, data, audio_format):
+        self._data = data
+        self.audio_format = audio_format
+        self._duration = len(data) / float(audio_format.bytes_per_second)
+
+    def get_queue_source(self):
+        return MappedMemorySource(self._data, self.audio_format)
+
+
+class CachedSound(arcade.Sound):
+    # arcade.Sound над буфером из кэша ресурсов (файл не раскодируется)
+
+    def __init__(self, file_name, source):
+        self.file_name = file_name
+        self.source = source
+        self.min_distance = 100000000  # как в arcade.Sound - для панорамы в 2d
+
+
+class AssetCache:
+    # кэш раскодированных ресурсов: пиксели rgba и отсчеты pcm лежат в файлах
+    # ASSET_CACHE_DIR и при запуске только отображаются в память (mmap) без
+    # раскодирования png/wav
+    #
+    # файл кэша назван по хешу исходника; index.json запоминает размер, mtime и хеш
+    # каждого исходника, чтобы не хешировать его заново, пока файл не менялся;
+    # при открытии кэша файлы, не совпадающие с текущими хешами исходников, удаляются
+
+    IMAGE_HEADER = struct.Struct("<4sHII")  # magic, версия, ширина, высота
+    SOUND_HEADER = struct.Struct("<4sHHHI")  # magic, версия, каналы, бит на отсчет, частота
+    VERSION = 1
+    EXTENSIONS = (".rgba", ".pcm")
+
+    def __init__(self, cache_dir=ASSET_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index = None
+        self.index_dirty = False
+        self.maps = {}
+        self.images = {}
+        self.textures = {}
+        self.sounds = {}
+
+    def load_index(self):
+        # чтение индекса и удаление устаревших файлов: исходник изменился или удален
+        try:
+            with open(os.path.join(self.cache_dir, "index.json"), encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+        try:
+            cached = os.listdir(self.cache_dir)
+        except OSError:
+            return
+
+        current = set()
+        for file_name in list(self.index):
+            if not os.path.exists(file_name):
+                del self.index[file_name]
+                self.index_dirty = True
+                continue
+            name = os.path.splitext(os.path.basename(file_name))[0]
+            current.add(f"{name}.{self.source_hash(file_name)[:16]}")
+        for cache_name in cached:
+            stem, extension = os.path.splitext(cache_name)
+            if extension in self.EXTENSIONS and stem not in current:
+                try:
+                    os.remove(os.path.join(self.cache_dir, cache_name))
+                except OSError as e:
+                    print(f"не удалось удалить устаревший кэш ресурса {cache_name}: {e}")
+
+    def source_hash(self, file_name):
+        # хеш исходника, пересчитывается только при изменении размера или mtime
+        if self.index is None:
+            self.load_index()
+        stat = os.stat(file_name)
+        entry = self.index.get(file_name)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        with open(file_name, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.index[file_name] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.index_dirty = True
+        return digest
+
+    def mapped(self, file_name, extension, build):
+        # отображение файла кэша в память, build() создает его содержимое при промахе
+        digest = self.source_hash(file_name)
+        name = os.path.splitext(os.path.basename(file_name))[0]
+        cache_path = os.path.join(self.cache_dir, f"{name}.{digest[:16]}.{extension}")
+        if not os.path.exists(cache_path):
+            data = build()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, cache_path)
+        with open(cache_path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps[file_name, extension] = mapping
+        return memoryview(mapping)
+
+    def image(self, file_name):
+        # картинка rgba поверх отображенного буфера (без копирования, только чтение)
+        image = self.images.get(file_name)
+        if image is not None:
+            return image
+
+        def build():
+            decoded = Image.open(file_name).convert("RGBA")
+            return self.IMAGE_HEADER.pack(b"ASTI", self.VERSION, *decoded.size) + decoded.tobytes()
+
+        view = self.mapped(file_name, "rgba", build)
+        magic, version, width, height = self.IMAGE_HEADER.unpack_from(view)
+        if magic != b"ASTI" or version != self.VERSION:
+            raise ValueError(f"поврежденный кэш ресурса {file_name}")
+        image = Image.frombuffer("RGBA", (width, height), view[self.IMAGE_HEADER.size:],
+                                 "raw", "RGBA", 0, 1)
+        self.images[file_name] = image
+        return image
+
+    def texture(self, file_name):
+        # текстура arcade из кэшированной картинки (контур задается отдельно)
+        texture = self.textures.get(file_name)
+        if texture is None:
+            texture = arcade.Texture(file_name, self.image(file_name), hit_box_algorithm="None")
+            self.textures[file_name] = texture
+        return texture
+
+    def sound(self, file_name):
+        sound = self.sounds.get(file_name)
+        if sound is not None:
+            return sound
+
+        def build():
+            source = pyglet.media.load(file_name, streaming=True)
+            audio_format = source.audio_format
+            chunks = []
+            while True:
+                audio_data = source.get_audio_data(1 << 20)
+                if not audio_data:
+                    break
+                chunks.append(audio_data.get_string_data())
+            header = self.SOUND_HEADER.pack(b"ASTS", self.VERSION, audio_format.channels,
+                                            audio_format.sample_size, audio_format.sample_rate)
+            return header + b"".join(chunks)
+
+        view = self.mapped(file_name, "pcm", build)
+        magic, version, channels, sample_size, sample_rate = self.SOUND_HEADER.unpack_from(view)
+        if magic != b"ASTS" or version != self.VERSION:
+            raise ValueError(f"поврежденный кэш ресурса {file_name}")
+        source = MappedSoundSource(view[self.SOUND_HEADER.size:],
+                                   AudioFormat(channels, sample_size, sample_rate))
+        sound = CachedSound(file_name, source)
+        self.sounds[file_name] = sound
+        return sound
+
+    def save_index(self):
+        if not self.index_dirty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = os.path.join(self.cache_dir, "index.json.tmp")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f)
+            os.replace(temp_path, os.path.join(self.cache_dir, "index.json"))
+            self.index_dirty = False
+        except OSError as e:
+            print(f"не удалось сохранить индекс кэша ресурсов: {e}")
+
+
+assets = AssetCache()
+
+
+class RingBuffer:
+    # кольцевой буфер байтов фиксированного размера между потоком декодирования
+    # (пишет) и звуковым драйвером (читает)
+
+    def __init__(self, capacity):
+        self.buffer = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.condition = threading.Condition()
+
+    def free(self):
+        with self.condition:
+            return self.capacity - self.size
+
+    def wait_for_space(self, num_bytes, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.capacity - self.size >= num_bytes, timeout)
+
+    def write(self, data):
+        with self.condition:
+            count = min(len(data), self.capacity - self.size)
+            end = (self.start + self.size) % self.capacity
+            first = min(count, self.capacity - end)
+            self.buffer[end:end + first] = data[:first]
+            self.buffer[:count - first] = data[first:count]
+            self.size += count
+            return count
+
+    def read(self, num_bytes):
+        with self.condition:
+            count = min(num_bytes, self.size)
+            first = min(count, self.capacity - self.start)
+            data = bytes(self.buffer[self.start:self.start + first]) + bytes(self.buffer[:count - first])
+            self.start = (self.start + count) % self.capacity
+            self.size -= count
+            self.condition.notify_all()
+            return data
+
+
+class MusicStreamSource(StreamingSource):
+    # бесконечный источник для проигрывателя pyglet, читает из кольцевого буфера;
+    # если буфер опустел, отдает тишину, чтобы проигрыватель не остановился
+
+    def __init__(self, ring, audio_format):
+        self.ring = ring
+        self.audio_format = audio_format
+        self.position = 0
+
+    def seek(self, timestamp):
+        pass
+
+    def get_audio_data(self, num_bytes, compensation_time=0.0):
+        bytes_per_sample = self.audio_format.bytes_per_sample
+        num_bytes = max(num_bytes - num_bytes % bytes_per_sample, bytes_per_sample)
+        data = self.ring.read(num_bytes)
+        if len(data) < num_bytes:
+            data += bytes(num_bytes - len(data))
+        bytes_per_second = self.audio_format.bytes_per_second
+        timestamp = self.position / bytes_per_second
+        self.position += num_bytes
+        return AudioData(data, num_bytes, timestamp, num_bytes / bytes_per_second, [])
+
+
+class MusicTrack:
+    # раскодировщик трека, который бесконечно повторяет его без паузы
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.source = pyglet.media.load(file_name, streaming=True)
+        self.audio_format = self.source.audio_format
+        self.pending = b""
+
+    def read(self, num_bytes):
+        data = self.pending
+        restarted = False
+        while len(data) < num_bytes:
+            audio_data = self.source.get_audio_data(num_bytes - len(data))
+            if audio_data is None:
+                if restarted:
+                    # пустой трек - дополняем тишиной
+                    data += bytes(num_bytes - len(data))
+                    break
+                # конец трека - продолжаем с начала в том же куске
+                self.source.seek(0)
+                restarted = True
+                continue
+            restarted = False
+            data += audio_data.get_string_data()
+        self.pending = data[num_bytes:]
+        return data[:num_bytes]
+
+
+class MusicPlayer:
+    # фоновая музыка с потоковым раскодированием:
+    # поток раскодирует трек кусками в кольцевой буфер фиксированного размера, поэтому
+    # память не зависит от длины трека, а запуск не ждет раскодирования всего файла;
+    # смена трека - плавный переход (громкости треков смешиваются в потоке)
+
+    def __init__(self, volume=MUSIC_VOLUME, buffer_seconds=MUSIC_BUFFER_SECONDS,
+                 prefetch_seconds=MUSIC_PREFETCH_SECONDS, crossfade_seconds=MUSIC_CROSSFADE_SECONDS):
+        self.volume = volume
+        self.buffer_seconds = buffer_seconds
+        self.prefetch_seconds = prefetch_seconds
+        self.crossfade_seconds = crossfade_seconds
+        self.requested_track = None
+        self.running = False
+        self.thread = None
+        self.ring = None
+        self.audio_format = None
+        self.output = None
+        self.failed_tracks = set()
+
+    def play(self, file_name):
+        # переключение на трек (с плавным переходом, если что-то уже играет)
+        if file_name == self.requested_track or file_name in self.failed_tracks:
+            return
+        self.requested_track = file_name
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self.decode_loop, name="music", daemon=True)
+            self.thread.start()
+            arcade.unschedule(self.update)
+            arcade.schedule(self.update, 0.1)
+
+    def decode_loop(self):
+        current = None
+        fading = None
+        fade_position = 0
+        fade_length = 0
+        chunk_bytes = 0
+
+        while self.running:
+            requested = self.requested_track
+            if current is None or requested != current.file_name:
+                try:
+                    track = MusicTrack(requested)
+                except Exception as e:
+                    print(f"не удалось открыть музыку {requested}: {e}")
+                    self.failed_tracks.add(requested)
+                    self.requested_track = current.file_name if current is not None else None
+                    if current is None:
+                        return
+                    continue
+                if current is None:
+                    self.audio_format = track.audio_format
+                    bytes_per_second = self.audio_format.bytes_per_second
+                    bytes_per_sample = self.audio_format.bytes_per_sample
+                    # кусок - 50 мс, выровнен по отсчету
+                    chunk_bytes = int(bytes_per_second * 0.05) // bytes_per_sample * bytes_per_sample
+                    capacity = int(bytes_per_second * self.buffer_seconds) // bytes_per_sample * bytes_per_sample
+                    self.ring = RingBuffer(max(capacity, chunk_bytes * 2))
+                    fade_length = int(self.audio_format.sample_rate * self.crossfade_seconds)
+                    current = track
+                elif (track.audio_format.channels, track.audio_format.sample_rate, track.audio_format.sample_size) != \
+                        (self.audio_format.channels, self.audio_format.sample_rate, self.audio_format.sample_size):
+                    print(f"трек {requested} в другом формате, переход без смешивания")
+                    fading = None
+                    current = track
+                else:
+                    fading = current
+                    fade_position = 0
+                    current = track
+
+            if not self.ring.wait_for_space(chunk_bytes, 0.1):
+                continue
+
+            chunk = current.read(chunk_bytes)
+            if fading is not None:
+                if self.audio_format.sample_size == 16:
+                    chunk, fade_position = self.mix(fading.read(chunk_bytes), chunk, fade_position, fade_length)
+                    if fade_position >= fade_length:
+                        fading = None
+                else:
+                    fading = None
+            self.ring.write(chunk)
+
+    def mix(self, old, new, fade_position, fade_length):
+        # линейный переход громкости со старого трека на новый
+        channels = self.audio_format.channels
+        old = np.frombuffer(old, dtype=np.int16).reshape(-1, channels).astype(np.float32)
+        new = np.frombuffer(new, dtype=np.int16).reshape(-1, channels).astype(np.float32)
+        gain = np.minimum((fade_position + np.arange(len(new), dtype=np.float32)) / fade_length, 1.0)[:, None]
+        mixed = old * (1 - gain) + new * gain
+        return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes(), fade_position + len(new)
+
+    def update(self, delta_time):
+        # запуск проигрывателя, как только в буфере набралось достаточно звука
+        if self.output is not None or self.ring is None:
+            return
+        if self.ring.capacity - self.ring.free() < self.audio_format.bytes_per_second * self.prefetch_seconds:
+            return
+        self.output = pyglet.media.Player()
+        self.output.volume = self.volume
+        self.output.queue(MusicStreamSource(self.ring, self.audio_format))
+        self.output.play()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            arcade.unschedule(self.update)
+            self.thread.join(timeout=1)
+            self.thread = None
+        if self.output is not None:
+            self.output.pause()
+            self.output.delete()
+            self.output = None
+
+
+# фоновая музыка (создается в main, если включена)
+music = None
+
 
 class Player(arcade.Sprite):
     # класс игрока с управлением и улучшениями
 
+    hit_shape_mode = SHAPE_AABB
+
     def __init__(self):
-        super().__init__("arcade_resources/assets/images/space_shooter/playerShip1_orange.png", SPRITE_SCALE)
+        super().__init__(texture=assets.texture(PLAYER_TEXTURE), scale=SPRITE_SCALE)
+        apply_hit_shape(self, PLAYER_TEXTURE)
+        self.speed = PLAYER_SPEED
+        self.shield_active = False
+        self.rapid_fire_active = False
+        self.effects = PowerUpEffects(self)
+        self.reset()
+
+    def reset(self):
+        # сброс состояния игрока для новой игры (спрайт и текстура остаются)
         self.center_x = SCREEN_WIDTH // 2
         self.center_y = 60
         self.lives = PLAYER_START_LIVES
-        self.speed = PLAYER_SPEED
         self.shoot_cooldown = 0
-        self.shield_active = False
-        self.rapid_fire_active = False
-        self.powerup_timer = 0
+        self.effects.clear()
 
+    @property
+    def shield_alpha(self):
         # для анимации щита
-        self.shield_alpha = 0
+        if not self.shield_active:
+            return 0
+        return SHIELD_ALPHA[self.effects.remaining(PowerUpType.SHIELD)]
 
-    def on_update(self, delta_time: float = 1 / 60):
-        # обновление игрока
+    def on_update(self, delta_time: float = 1 / 60, steps=1):
+        # обновление игрока за шаг в steps тиков
         # ограничение движения
         if self.left < 0:
             self.left = 0
         elif self.right > SCREEN_WIDTH:
             self.right = SCREEN_WIDTH
 
-        # обновление кулдаунов
+        # обновление кулдаунов: при шаге в несколько тиков перезарядка уходит ниже нуля
+        # на столько тиков, сколько выстрел уже готов (их учитывает GameView.shoot_bullet);
+        # если выстрела не было, запас не копится
         if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
-
-        if self.powerup_timer > 0:
-            self.powerup_timer -= 1
-            # анимация щита
-            if self.shield_active:
-                self.shield_alpha = int(128 + 127 * math.sin(self.powerup_timer * 0.2))
+            self.shoot_cooldown -= steps
         else:
-            self.shield_active = False
-            self.rapid_fire_active = False
-            self.shield_alpha = 0
-
-
-class Bullet(arcade.Sprite):
-    # класс пули с физикой
-
-    def __init__(self, x, y, direction=1, is_enemy=False):
-        texture = "arcade_resources/assets/images/space_shooter/laserRed01.png" if is_enemy else "arcade_resources/assets/images/space_shooter/laserBlue01.png"
-        super().__init__(texture, SPRITE_SCALE * 0.6)
-        self.center_x = x
-        self.center_y = y
-        self.direction = direction
-        self.speed = ENEMY_BULLET_SPEED if is_enemy else BULLET_SPEED
+            self.shoot_cooldown = 0
+
+        # таймеры улучшений
+        self.effects.update(steps)
+
+
+# текстуры пуль
+BULLET_TEXTURE = "arcade_resources/assets/images/space_shooter/laserBlue01.png"
+ENEMY_BULLET_TEXTURE = "arcade_resources/assets/images/space_shooter/laserRed01.png"
+BULLET_SCALE = SPRITE_SCALE * 0.6
+
+
+# столбцы упакованного массива пуль
+BULLET_X = 0
+BULLET_Y = 1
+BULLET_VX = 2
+BULLET_VY = 3
+BULLET_OWNER = 4
+BULLET_PREV_X = 5  # позиция в начале последнего шага - для непрерывной проверки столкновений
+BULLET_PREV_Y = 6
+BULLET_COLUMNS = 7
+
+# идентификаторы сущностей (врагов, пуль, улучшений) для рассылки зрителям
+entity_ids = itertools.count(1)
+
+# владельцы пуль
+OWNER_PLAYER = 0
+OWNER_ENEMY = 1
+
+
+def segment_box_entry(x0, y0, x1, y1, left, bottom, right, top):
+    # непрерывная проверка столкновений: пересечение отрезков с прямоугольниками (метод слэбов)
+    # аргументы - числа или массивы numpy (транслируются друг на друга);
+    # результат - параметр t в [0, 1] точки входа отрезка в прямоугольник, np.inf если мимо
+    t_enter = np.zeros(np.broadcast(x0, left).shape)
+    t_exit = np.ones_like(t_enter)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start, end, low, high in ((x0, x1, left, right), (y0, y1, bottom, top)):
+            start = np.asarray(start, dtype=np.float64)
+            delta = np.asarray(end, dtype=np.float64) - start
+            t1 = (low - start) / delta
+            t2 = (high - start) / delta
+            # отрезок параллелен оси - пересечение только если начало внутри полосы
+            inside = (start >= low) & (start <= high)
+            near = np.where(delta == 0, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+            far = np.where(delta == 0, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+            t_enter = np.maximum(t_enter, near)
+            t_exit = np.minimum(t_exit, far)
+    return np.where(t_enter <= t_exit, t_enter, np.inf)
+
+
+def sprite_boxes(sprites, grow_x=0, grow_y=0):
+    # прямоугольники форм спрайтов (left, bottom, right, top), расширенные на grow_x/grow_y
+    boxes = np.array([hit_bounds(sprite) for sprite in sprites], dtype=np.float64).reshape(-1, 4)
+    boxes[:, 0] -= grow_x
+    boxes[:, 1] -= grow_y
+    boxes[:, 2] += grow_x
+    boxes[:, 3] += grow_y
+    return boxes
+
+
+class BulletPool:
+    # пули хранятся в упакованном массиве numpy (x, y, скорость, владелец)
+    # и двигаются одной векторной операцией; вылетевшие за экран удаляются пачкой
+    # перестановкой последних живых на место удаленных.
+    # спрайтов у пуль нет - все пули пула рисуются одним instanced draw call
+
+    def __init__(self, is_enemy=False, capacity=64):
         self.is_enemy = is_enemy
+        self.owner = OWNER_ENEMY if is_enemy else OWNER_PLAYER
+        self.data = np.zeros((capacity, BULLET_COLUMNS), dtype=np.float32)
+        self.dead = np.zeros(capacity, dtype=bool)
+        self.ids = np.zeros(capacity, dtype=np.uint32)
+        self.count = 0
+        self.spawned = 0  # пуль выпущено за все время (для статистики)
+        self.texture_file = ENEMY_BULLET_TEXTURE if is_enemy else BULLET_TEXTURE
+        self.texture = None
+        self.renderer = None
+        # половина размера пули - прямоугольники целей расширяются на нее,
+        # и пуля при проверке считается точкой
+        image = assets.image(self.texture_file)
+        self.half_width = image.width * BULLET_SCALE / 2
+        self.half_height = image.height * BULLET_SCALE / 2
+
+    def spawn(self, x, y, vy, vx=0.0):
+        # новая пуля в конце массива
+        if self.count == len(self.data):
+            self.grow()
+        index = self.count
+        self.data[index] = (x, y, vx, vy, self.owner, x, y)
+        self.dead[index] = False
+        self.ids[index] = next(entity_ids)
+        self.count += 1
+        self.spawned += 1
+        return index
+
+    def grow(self):
+        # удвоение емкости массивов
+        capacity = len(self.data) * 2
+        data = np.zeros((capacity, BULLET_COLUMNS), dtype=np.float32)
+        data[:self.count] = self.data[:self.count]
+        dead = np.zeros(capacity, dtype=bool)
+        dead[:self.count] = self.dead[:self.count]
+        ids = np.zeros(capacity, dtype=np.uint32)
+        ids[:self.count] = self.ids[:self.count]
+        self.data = data
+        self.dead = dead
+        self.ids = ids
+
+    def kill(self, index):
+        # пометка пули как уничтоженной, из массива она уйдет при следующем update
+        self.dead[index] = True
+
+    def update(self, steps=1):
+        # движение всех пуль, удаление вылетевших за экран и синхронизация спрайтов
+        # steps - сколько тиков пройти за один вызов (путь пули проверяется целиком)
+        count = self.count
+        if count == 0:
+            return
+        active = self.data[:count]
+        active[:, BULLET_PREV_X] = active[:, BULLET_X]
+        active[:, BULLET_PREV_Y] = active[:, BULLET_Y]
+        active[:, BULLET_X] += active[:, BULLET_VX] * steps
+        active[:, BULLET_Y] += active[:, BULLET_VY] * steps
+
+        y = active[:, BULLET_Y]
+        removed = self.dead[:count] | (y < 0) | (y > SCREEN_HEIGHT)
+        if removed.any():
+            self.compact(removed)
+
+    def compact(self, removed):
+        # удаление помеченных пуль: живые из хвоста переносятся в дыры
+        count = self.count
+        keep_count = count - int(np.count_nonzero(removed))
+        holes = np.flatnonzero(removed[:keep_count])
+        fillers = np.flatnonzero(~removed[keep_count:count]) + keep_count
+        self.data[holes] = self.data[fillers]
+        self.ids[holes] = self.ids[fillers]
+        self.dead[:keep_count] = False
+        self.count = keep_count
+
+    def alive_indices(self):
+        # индексы живых пуль
+        return np.flatnonzero(~self.dead[:self.count])
+
+    def paths(self, indices):
+        # отрезки пути пуль за последний шаг: (x0, y0, x1, y1)
+        rows = self.data[indices]
+        return (rows[:, BULLET_PREV_X], rows[:, BULLET_PREV_Y],
+                rows[:, BULLET_X], rows[:, BULLET_Y])
 
-    def on_update(self, delta_time: float = 1 / 60):
-        # обновление пули
-        self.center_y += self.speed * self.direction
-
-        # удаление пули за пределами экрана
-        if self.center_y < 0 or self.center_y > SCREEN_HEIGHT:
-            self.remove_from_sprite_lists()
+    def draw(self):
+        # отрисовка всех живых пуль одним вызовом
+        if self.count == 0:
+            return
+        if self.renderer is None:
+            ctx = arcade.get_window().ctx
+            program = ctx.load_program(
+                vertex_shader="arcade_resources/system/shaders/instanced/textured_quad_vs.glsl",
+                fragment_shader="arcade_resources/system/shaders/instanced/textured_quad_fs.glsl",
+            )
+            program['half_size'] = (self.half_width, self.half_height)
+            program['tex'] = 0
+            image = assets.image(self.texture_file)
+            # в opengl строки текстуры идут снизу вверх
+            image = image.transpose(Image.FLIP_TOP_BOTTOM)
+            self.texture = ctx.texture(image.size, components=4, data=image.tobytes())
+            # в шейдер идут только координаты, остальные столбцы пропускаются
+            self.renderer = InstancedRenderer(program, '2f ' + padding_format(BULLET_COLUMNS - 2), ['in_pos'],
+                                              BULLET_COLUMNS * 4)
+        active = self.data[:self.count]
+        dead = self.dead[:self.count]
+        # пули, сбитые на этом тике, из массива уйдут только при следующем update
+        if dead.any():
+            active = active[~dead]
+        self.texture.use(0)
+        self.renderer.draw(active)
+
+    def clear(self):
+        # удаление всех пуль (массивы и буферы остаются для переиспользования)
+        self.count = 0
+        self.dead[:] = False
+
+    def load(self, rows):
+        # замена содержимого пула готовыми строками (при восстановлении снимка)
+        self.clear()
+        count = len(rows)
+        while len(self.data) < count:
+            self.grow()
+        self.data[:count] = rows
+        self.ids[:count] = np.fromiter(entity_ids, dtype=np.uint32, count=count)
+        self.count = count
 
 
 class Enemy(arcade.Sprite):
     # класс врага с анимацией
 
-    def __init__(self, x, y, enemy_type, level):
+    # пульсация врагов (отключается при снижении качества)
+    pulse_enabled = True
+    hit_shape_mode = SHAPE_AABB
+
+    def __init__(self, x, y, enemy_type, type_def, level_def):
         # используем одну текстуру для всех врагов
-        super().__init__("arcade_resources/assets/images/space_shooter/playerShip1_orange.png", SPRITE_SCALE * 0.8)
+        super().__init__(texture=assets.texture(ENEMY_TEXTURE), scale=SPRITE_SCALE * 0.8)
+        apply_hit_shape(self, ENEMY_TEXTURE)
 
-        # меняем цвет в зависимости от типа врага (анимация)
-        colors = [
-            arcade.color.GREEN,
-            arcade.color.BLUE,
-            arcade.color.RED
-        ]
-        self.color = colors[enemy_type]
+        # цвет, прочность, скорость и очки задаются типом врага в описании уровней
+        self.color = type_def.color
 
         self.center_x = x
         self.center_y = y
+        self.entity_id = next(entity_ids)
+        self.formation_slot = None  # (ряд, колонна) в строю, задается при расстановке
         self.enemy_type = enemy_type
-        self.health = 1 + enemy_type
-        self.base_speed = 1 + enemy_type * 0.3 + level * 0.2
+        self.health = type_def.health
+        self.base_speed = type_def.speed + level_def.speed_bonus
         self.speed = self.base_speed
         self.direction = 1
         self.shoot_cooldown = random.randint(60, 180)
-        self.points = (enemy_type + 1) * 10
+        self.fire_ticks = 0  # тиков последнего шага, в которые враг мог выстрелить
+        self.points = type_def.points
+        # вероятность выстрела за кадр (0 - тип врага не стреляет)
+        self.fire_chance = type_def.fire_rate * level_def.fire_chance
 
         # анимация - изменение масштаба (пульсация)
         self.animation_time = random.uniform(0, 3.14)
         self.base_scale = SPRITE_SCALE * 0.8
 
-    def on_update(self, delta_time: float = 1 / 60):
-        # обновление врага с анимацией
+    def on_update(self, delta_time: float = 1 / 60, steps=1):
+        # обновление врага с анимацией за шаг в steps тиков
         # анимация - простая пульсация
-        self.animation_time += 0.05
-        scale_factor = 1 + 0.1 * abs(math.sin(self.animation_time))
-        self.scale = self.base_scale * scale_factor
+        self.animation_time += 0.05 * steps
+        if Enemy.pulse_enabled:
+            scale_factor = 1 + 0.1 * abs(math.sin(self.animation_time))
+            self.scale = self.base_scale * scale_factor
+        elif self.scale != self.base_scale:
+            self.scale = self.base_scale
 
-        # кулдаун стрельбы
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
+        # кулдаун стрельбы; перезарядка может закончиться в середине шага -
+        # стрелять можно с тика, на котором она дошла до нуля
+        self.fire_ticks = max(0, steps + 1 - max(self.shoot_cooldown, 1))
+        self.shoot_cooldown = max(0, self.shoot_cooldown - steps)
 
 
 class PowerUp(arcade.Sprite):
     # класс улучшения с анимацией
 
-    def __init__(self, x, y):
-        textures = {
-            PowerUpType.SHIELD: "arcade_resources/assets/images/items/star.png",
-            PowerUpType.RAPID_FIRE: "arcade_resources/assets/images/items/gemBlue.png",
-            PowerUpType.EXTRA_LIFE: "arcade_resources/assets/images/items/coinGold.png"
-        }
-        self.powerup_type = random.choice([PowerUpType.SHIELD, PowerUpType.RAPID_FIRE, PowerUpType.EXTRA_LIFE])
-        super().__init__(textures[self.powerup_type], SPRITE_SCALE * 0.4)
+    # вращение только визуальное - окружность от него не зависит
+    hit_shape_mode = SHAPE_CIRCLE
+
+    def __init__(self, x, y, powerup_type=None):
+        if powerup_type is None:
+            powerup_type = random.choice([PowerUpType.SHIELD, PowerUpType.RAPID_FIRE, PowerUpType.EXTRA_LIFE])
+        self.powerup_type = powerup_type
+        texture_file = POWERUP_TEXTURES[self.powerup_type]
+        super().__init__(texture=assets.texture(texture_file), scale=SPRITE_SCALE * 0.4)
+        apply_hit_shape(self, texture_file)
         self.center_x = x
         self.center_y = y
+        self.entity_id = next(entity_ids)
         self.speed = POWERUP_SPEED
         self.animation_time = 0
 
-    def on_update(self, delta_time: float = 1 / 60):
-        # обновление улучшения с анимацией
-        self.center_y -= self.speed
+    def on_update(self, delta_time: float = 1 / 60, steps=1):
+        # обновление улучшения с анимацией за шаг в steps тиков
+        self.center_y -= self.speed * steps
 
         # анимация - вращение
-        self.animation_time += 0.1
+        self.animation_time += 0.1 * steps
         self.angle = math.sin(self.animation_time) * 30
 
         if self.center_y < 0:
             self.remove_from_sprite_lists()
 
 
-class Particle:
-    # система частиц - простая частица для эффектов взрыва
-
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.vx = random.uniform(-3, 3)
-        self.vy = random.uniform(-3, 3)
-        self.lifetime = random.uniform(0.3, 0.8)
-        self.max_lifetime = self.lifetime
-        self.size = random.uniform(2, 5)
-        # цвет как кортеж rgb
-        self.color = random.choice([
-            (255, 255, 0),  # желтый
-            (255, 165, 0),  # оранжевый
-            (255, 0, 0)  # красный
-        ])
-
-    def update(self, delta_time):
-        # обновление частицы
-        self.x += self.vx
-        self.y += self.vy
-        self.lifetime -= delta_time
-
-    def draw(self):
-        # отрисовка частицы с прозрачностью
-        # не рисуем мертвые частицы
-        if self.lifetime <= 0:
+# столбцы массива частиц
+PARTICLE_X = 0
+PARTICLE_Y = 1
+PARTICLE_VX = 2
+PARTICLE_VY = 3
+PARTICLE_SIZE = 4
+PARTICLE_R = 5
+PARTICLE_G = 6
+PARTICLE_B = 7
+PARTICLE_LIFETIME = 8
+PARTICLE_MAX_LIFETIME = 9
+PARTICLE_COLUMNS = 10
+
+# цвета частиц (0..1): желтый, оранжевый, красный
+PARTICLE_COLORS = np.array([
+    (255, 255, 0),
+    (255, 165, 0),
+    (255, 0, 0)
+], dtype=np.float32) / 255
+
+
+def padding_format(floats):
+    # формат пропуска столбцов float32 для BufferDescription (не больше 4 за раз)
+    parts = []
+    while floats > 0:
+        parts.append(f"{min(floats, 4)}x4")
+        floats -= 4
+    return " ".join(parts)
+
+
+class InstancedRenderer:
+    # отрисовка множества одинаковых квадов одним instanced draw call:
+    # данные всех экземпляров загружаются в буфер одной записью за кадр
+
+    def __init__(self, program, instance_format, attributes, row_bytes, capacity=256):
+        self.ctx = program.ctx
+        self.program = program
+        self.instance_format = instance_format
+        self.attributes = attributes
+        self.row_bytes = row_bytes
+        # квад из двух треугольников, углы в [-1, 1]
+        self.quad = self.ctx.buffer(data=np.array([-1, -1, 1, -1, -1, 1, 1, 1], dtype=np.float32))
+        self.capacity = 0
+        self.instance_buffer = None
+        self.geometry = None
+        self.reserve(capacity)
+
+    def reserve(self, capacity):
+        # буфер экземпляров пересоздается только при росте количества
+        self.capacity = capacity
+        self.instance_buffer = self.ctx.buffer(reserve=capacity * self.row_bytes)
+        self.geometry = self.ctx.geometry([
+            BufferDescription(self.quad, '2f', ['in_vert']),
+            BufferDescription(self.instance_buffer, self.instance_format, self.attributes, instanced=True),
+        ], mode=self.ctx.TRIANGLE_STRIP)
+
+    def draw(self, data):
+        # data - непрерывный массив float32, одна строка на экземпляр
+        count = len(data)
+        if count == 0:
             return
-
-        alpha = int(255 * (self.lifetime / self.max_lifetime))
-        alpha = max(0, min(255, alpha))  # гарантия диапазона [0, 255]
-        color = (self.color[0], self.color[1], self.color[2], alpha)
-        arcade.draw_circle_filled(self.x, self.y, self.size, color)
-
-    def is_alive(self):
-        # проверка жива ли частица
-        return self.lifetime > 0
+        if count > self.capacity:
+            self.reserve(max(count, self.capacity * 2))
+        self.instance_buffer.write(data)
+        self.ctx.enable(self.ctx.BLEND)
+        self.ctx.blend_func = self.ctx.BLEND_DEFAULT
+        self.geometry.render(self.program, vertices=4, instances=count)
+
+
+class GlyphAtlas:
+    # растровый шрифт: все символы набора рисуются в одну текстуру один раз,
+    # текст выводится квадами из атласа одним instanced draw call без растеризации в кадре
+    #
+    # атлас (png) и метрики символов (json) кэшируются в FONT_CACHE_DIR по имени шрифта,
+    # размеру и хешу набора символов и файла шрифта
+
+    ATLAS_WIDTH = 512
+    PADDING = 1
+
+    def __init__(self, font_name, font_size, charset=HUD_CHARSET, cache_dir=FONT_CACHE_DIR):
+        # файл начертания без регистрации в pyglet - атлас растеризуется через PIL
+        font_file = str(get_font_face_path(font_name))
+        self.font_file = font_file
+        self.font_size = font_size
+        # размер шрифта в пунктах как у arcade.draw_text (96 dpi)
+        self.pixel_size = round(font_size * 96 / 72)
+        self.charset = "".join(sorted(set(charset)))
+        self.glyphs = {}
+        self.image = None
+        self.texture = None
+        self.renderer = None
+        self.layouts = {}
+
+        with open(font_file, 'rb') as f:
+            font_hash = hashlib.sha1(f.read())
+        font_hash.update(self.charset.encode('utf-8'))
+        name = os.path.splitext(os.path.basename(font_file))[0]
+        base = os.path.join(cache_dir, f"{name}-{self.pixel_size}-{font_hash.hexdigest()[:12]}")
+        if not self.load(base):
+            self.build()
+            self.save(base)
+
+    def load(self, base):
+        try:
+            with open(base + ".json", encoding='utf-8') as f:
+                metrics = json.load(f)
+            image = Image.open(base + ".png")
+            image.load()
+        except (OSError, ValueError):
+            return False
+        self.glyphs = {char: tuple(values) for char, values in metrics["glyphs"].items()}
+        self.image = image.convert("L")
+        return True
+
+    def build(self):
+        # растеризация набора символов в атлас (полки по высоте строки)
+        font = ImageFont.truetype(self.font_file, self.pixel_size)
+        boxes = {char: font.getbbox(char, anchor="ls") for char in self.charset}
+        ascent, descent = font.getmetrics()
+        row_height = ascent + descent + self.PADDING * 2
+
+        positions = {}
+        x = y = 0
+        for char, (left, top, right, bottom) in boxes.items():
+            width = right - left + self.PADDING * 2
+            if x + width > self.ATLAS_WIDTH:
+                x = 0
+                y += row_height
+            positions[char] = (x, y)
+            x += width
+
+        image = Image.new("L", (self.ATLAS_WIDTH, y + row_height), 0)
+        draw = ImageDraw.Draw(image)
+        for char, (left, top, right, bottom) in boxes.items():
+            atlas_x, atlas_y = positions[char]
+            # атласная ячейка начинается с верхнего левого угла глифа
+            draw.text((atlas_x + self.PADDING - left, atlas_y + self.PADDING - top), char,
+                      font=font, fill=255, anchor="ls")
+            # x, y, ширина, высота в атласе, смещение от точки на базовой линии, шаг
+            self.glyphs[char] = (atlas_x, atlas_y, right - left + self.PADDING * 2,
+                                 bottom - top + self.PADDING * 2,
+                                 left - self.PADDING, -bottom - self.PADDING, font.getlength(char))
+        self.image = image
+
+    def save(self, base):
+        try:
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            self.image.save(base + ".png")
+            with open(base + ".json", 'w', encoding='utf-8') as f:
+                json.dump({"font": os.path.basename(self.font_file), "size": self.pixel_size,
+                           "glyphs": self.glyphs}, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"не удалось сохранить атлас шрифта: {e}")
+
+    def layout(self, text):
+        # квады строки относительно начала базовой линии (кэшируются по тексту)
+        rows = self.layouts.get(text)
+        if rows is not None:
+            return rows
+        atlas_width, atlas_height = self.image.size
+        fallback = self.glyphs.get("?")
+        rows = []
+        pen_x = 0.0
+        for char in text:
+            glyph = self.glyphs.get(char, fallback)
+            if glyph is None:
+                continue
+            atlas_x, atlas_y, width, height, offset_x, offset_y, advance = glyph
+            if char != " ":
+                rows.append((round(pen_x) + offset_x, offset_y, width, height,
+                             atlas_x / atlas_width, (atlas_y + height) / atlas_height,
+                             (atlas_x + width) / atlas_width, atlas_y / atlas_height))
+            pen_x += advance
+        rows = np.array(rows, dtype=np.float32).reshape(-1, 8)
+        if len(self.layouts) > 256:
+            self.layouts.clear()
+        self.layouts[text] = rows
+        return rows
+
+    def draw_text(self, text, x, y, color):
+        # вывод строки, (x, y) - начало базовой линии как у arcade.draw_text
+        rows = self.layout(text)
+        if len(rows) == 0:
+            return
+        if self.renderer is None:
+            ctx = arcade.get_window().ctx
+            program = ctx.load_program(
+                vertex_shader="arcade_resources/system/shaders/instanced/glyph_vs.glsl",
+                fragment_shader="arcade_resources/system/shaders/instanced/glyph_fs.glsl",
+            )
+            program['tex'] = 0
+            # строки атласа загружаются сверху вниз - v растет вниз по картинке
+            self.texture = ctx.texture(self.image.size, components=1, data=self.image.tobytes())
+            self.texture.filter = (ctx.NEAREST, ctx.NEAREST)
+            self.renderer = InstancedRenderer(program, '4f 4f', ['in_rect', 'in_uv'], 8 * 4)
+        quads = rows.copy()
+        quads[:, 0] += round(x)
+        quads[:, 1] += round(y)
+        alpha = color[3] if len(color) > 3 else 255
+        self.renderer.program['color'] = (color[0] / 255, color[1] / 255, color[2] / 255, alpha / 255)
+        self.texture.use(0)
+        self.renderer.draw(quads)
 
 
 class ParticleSystem:
     # система частиц для визуализации взрывов
-
-    def __init__(self):
-        self.particles = []
+    # частицы хранятся в массиве numpy и обновляются векторно, рисуются одним
+    # instanced draw call, прозрачность по остатку жизни считается в шейдере
+
+    def __init__(self, capacity=512):
+        self.data = np.zeros((capacity, PARTICLE_COLUMNS), dtype=np.float32)
+        self.count = 0
+        # отдельный генератор случайных чисел - визуальные эффекты не влияют
+        # на случайность игровой логики
+        self.rng = np.random.default_rng()
+        self.renderer = None
+        # наибольшее время жизни новых частиц (уменьшается при снижении качества)
+        self.lifetime_cap = 0.8
 
     def emit(self, x, y, count=20):
         # создание частиц в точке взрыва
-        for _ in range(count):
-            self.particles.append(Particle(x, y))
+        if self.count + count > len(self.data):
+            data = np.zeros((max(len(self.data) * 2, self.count + count), PARTICLE_COLUMNS),
+                            dtype=np.float32)
+            data[:self.count] = self.data[:self.count]
+            self.data = data
+        rng = self.rng
+        new = self.data[self.count:self.count + count]
+        new[:, PARTICLE_X] = x
+        new[:, PARTICLE_Y] = y
+        new[:, PARTICLE_VX:PARTICLE_VY + 1] = rng.uniform(-3, 3, (count, 2))
+        new[:, PARTICLE_SIZE] = rng.uniform(2, 5, count)
+        new[:, PARTICLE_R:PARTICLE_B + 1] = PARTICLE_COLORS[rng.integers(0, len(PARTICLE_COLORS), count)]
+        lifetime = rng.uniform(min(0.3, self.lifetime_cap), self.lifetime_cap, count)
+        new[:, PARTICLE_LIFETIME] = lifetime
+        new[:, PARTICLE_MAX_LIFETIME] = lifetime
+        self.count += count
 
     def update(self, delta_time):
-        # обновление всех частиц
-        self.particles = [p for p in self.particles if p.is_alive()]
-        for particle in self.particles:
-            particle.update(delta_time)
+        # обновление всех частиц: удаление мертвых и движение
+        active = self.data[:self.count]
+        alive = active[:, PARTICLE_LIFETIME] > 0
+        if not alive.all():
+            self.count = int(np.count_nonzero(alive))
+            self.data[:self.count] = active[alive]
+            active = self.data[:self.count]
+        active[:, PARTICLE_X] += active[:, PARTICLE_VX]
+        active[:, PARTICLE_Y] += active[:, PARTICLE_VY]
+        active[:, PARTICLE_LIFETIME] -= delta_time
 
     def draw(self):
-        # отрисовка всех частиц
-        for particle in self.particles:
-            particle.draw()
+        # отрисовка всех частиц одним вызовом
+        if self.count == 0:
+            return
+        if self.renderer is None:
+            ctx = arcade.get_window().ctx
+            program = ctx.load_program(
+                vertex_shader="arcade_resources/system/shaders/instanced/particle_vs.glsl",
+                fragment_shader="arcade_resources/system/shaders/instanced/particle_fs.glsl",
+            )
+            # скорость в шейдере не нужна - пропускается
+            self.renderer = InstancedRenderer(program, '2f 2x4 1f 3f 2f',
+                                              ['in_pos', 'in_size', 'in_color', 'in_life'],
+                                              PARTICLE_COLUMNS * 4)
+        self.renderer.draw(self.data[:self.count])
+
+    def clear(self):
+        # удаление всех частиц (при рестарте игры)
+        self.count = 0
+
+
+# описание уровней (levels.json):
+#   formation   - расположение строя по умолчанию: left, right, top (отступы от краев), spacing_y
+#   enemy_types - типы врагов по именам: color [r, g, b], health, points, speed,
+#                 fire_rate (множитель вероятности выстрела уровня, 0 - не стреляет)
+#   levels      - уровни по порядку: columns, rows (тип врага для каждого ряда сверху вниз),
+#                 fire_chance, speed_bonus, drop_chance, необязательный formation
+#   endless     - после последнего описанного уровня он повторяется, а fire_chance и
+#                 speed_bonus растут на fire_chance_step и speed_bonus_step за уровень
+EnemyTypeDef = namedtuple("EnemyTypeDef", ["color", "health", "points", "speed", "fire_rate"])
+LevelDef = namedtuple("LevelDef", ["columns", "rows", "fire_chance", "speed_bonus", "drop_chance",
+                                   "left", "right", "top", "spacing_y"])
+
+FORMATION_KEYS = ("left", "right", "top", "spacing_y")
+
+
+class LevelSet:
+    # описания уровней, скомпилированные в компактный двоичный кэш
+    #
+    # json разбирается и проверяется только при изменении файла: результат сохраняется
+    # в LEVEL_CACHE_DIR под хешем содержимого, при следующих запусках уровни читаются
+    # из кэша struct.unpack_from без разбора
+    #
+    # кэш: заголовок, таблица типов врагов, затем уровни - запись LEVEL_STRUCT и
+    # по байту на ряд (индекс типа врага)
+    MAGIC = b"LVLC"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHHdd")
+    ENEMY_TYPE_STRUCT = struct.Struct("<3BxHHdd")
+    LEVEL_STRUCT = struct.Struct("<HHddd4f")
+
+    def __init__(self, enemy_types, levels, fire_chance_step, speed_bonus_step):
+        self.enemy_types = enemy_types
+        self.levels = levels
+        self.fire_chance_step = fire_chance_step
+        self.speed_bonus_step = speed_bonus_step
+
+    @classmethod
+    def load(cls, path=LEVELS_FILE, cache_dir=LEVEL_CACHE_DIR):
+        with open(path, 'rb') as f:
+            source = f.read()
+        digest = hashlib.sha1(source + cls.MAGIC + bytes([cls.VERSION])).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.bin")
+
+        try:
+            with open(cache_path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        except (OSError, ValueError, struct.error):
+            pass
+
+        data = cls.compile(json.loads(source.decode('utf-8')), path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"не удалось сохранить кэш уровней: {e}")
+        return cls.from_bytes(data)
+
+    @classmethod
+    def compile(cls, definition, source="levels"):
+        # проверка описания и упаковка в двоичный вид
+
+        def fail(message):
+            raise ValueError(f"{source}: {message}")
+
+        def number(entry, key, where, minimum=0, maximum=None, integer=False):
+            value = entry.get(key)
+            if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+                fail(f"{where}: поле {key} должно быть {'целым ' if integer else ''}числом")
+            if value < minimum or (maximum is not None and value > maximum):
+                fail(f"{where}: {key} = {value} вне диапазона")
+            return value
+
+        def formation(entry, where, defaults):
+            result = dict(defaults)
+            result.update(entry or {})
+            for key in FORMATION_KEYS:
+                number(result, key, where)
+            return result
+
+        if not isinstance(definition, dict):
+            fail("ожидается объект json")
+        default_formation = formation(definition.get("formation"), "formation",
+                                      {"left": 100, "right": 100, "top": 150, "spacing_y": 60})
+
+        enemy_types = definition.get("enemy_types")
+        if not isinstance(enemy_types, dict) or not enemy_types or len(enemy_types) > 255:
+            fail("enemy_types должен содержать от 1 до 255 типов врагов")
+        type_index = {}
+        chunks = []
+        for name, entry in enemy_types.items():
+            where = f"enemy_types.{name}"
+            color = entry.get("color")
+            if not (isinstance(color, list) and len(color) == 3
+                    and all(isinstance(c, int) and 0 <= c <= 255 for c in color)):
+                fail(f"{where}: color должен быть [r, g, b] от 0 до 255")
+            chunks.append(cls.ENEMY_TYPE_STRUCT.pack(
+                *color,
+                number(entry, "health", where, 1, 65535, integer=True),
+                number(entry, "points", where, 0, 65535, integer=True),
+                number(entry, "speed", where),
+                number(entry, "fire_rate", where)))
+            type_index[name] = len(type_index)
+
+        levels = definition.get("levels")
+        if not isinstance(levels, list) or not levels:
+            fail("levels должен содержать хотя бы один уровень")
+        for number_in_file, entry in enumerate(levels, start=1):
+            where = f"levels[{number_in_file}]"
+            rows = entry.get("rows")
+            if not isinstance(rows, list) or not rows or len(rows) > 255:
+                fail(f"{where}: rows должен содержать от 1 до 255 рядов")
+            unknown = [name for name in rows if name not in type_index]
+            if unknown:
+                fail(f"{where}: неизвестные типы врагов {unknown}")
+            level_formation = formation(entry.get("formation"), where, default_formation)
+            if level_formation["left"] + level_formation["right"] >= SCREEN_WIDTH:
+                fail(f"{where}: строй не помещается по ширине экрана")
+            chunks.append(cls.LEVEL_STRUCT.pack(
+                number(entry, "columns", where, 1, 255, integer=True),
+                len(rows),
+                number(entry, "fire_chance", where, 0, 1),
+                number(entry, "speed_bonus", where),
+                number(entry, "drop_chance", where, 0, 1),
+                *(level_formation[key] for key in FORMATION_KEYS)))
+            chunks.append(bytes(type_index[name] for name in rows))
+
+        endless = definition.get("endless", {})
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(type_index), len(levels),
+                                 number(endless, "fire_chance_step", "endless", 0, 1),
+                                 number(endless, "speed_bonus_step", "endless"))
+        return header + b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        # чтение скомпилированного кэша
+        buffer = memoryview(data)
+        magic, version, type_count, level_count, fire_step, speed_step = cls.HEADER.unpack_from(buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("неподдерживаемый кэш уровней")
+        offset = cls.HEADER.size
+
+        enemy_types = []
+        for _ in range(type_count):
+            r, g, b, health, points, speed, fire_rate = cls.ENEMY_TYPE_STRUCT.unpack_from(buffer, offset)
+            enemy_types.append(EnemyTypeDef((r, g, b), health, points, speed, fire_rate))
+            offset += cls.ENEMY_TYPE_STRUCT.size
+
+        levels = []
+        for _ in range(level_count):
+            columns, row_count, fire_chance, speed_bonus, drop_chance, left, right, top, spacing_y = \
+                cls.LEVEL_STRUCT.unpack_from(buffer, offset)
+            offset += cls.LEVEL_STRUCT.size
+            rows = tuple(buffer[offset:offset + row_count])
+            if len(rows) != row_count or any(row >= type_count for row in rows):
+                raise ValueError("поврежденный кэш уровней")
+            offset += row_count
+            levels.append(LevelDef(columns, rows, fire_chance, speed_bonus, drop_chance,
+                                   left, right, top, spacing_y))
+        return cls(enemy_types, levels, fire_step, speed_step)
+
+    def level(self, level_number):
+        # описание уровня по номеру, после последнего описанного растет только сложность
+        if level_number <= len(self.levels):
+            return self.levels[level_number - 1]
+        last = self.levels[-1]
+        extra = level_number - len(self.levels)
+        return last._replace(fire_chance=min(1.0, last.fire_chance + extra * self.fire_chance_step),
+                             speed_bonus=last.speed_bonus + extra * self.speed_bonus_step)
 
 
 class Level:
-    # несколько уровней - класс управления уровнями с увеличивающейся сложностью
+    # несколько уровней - строй врагов и сложность уровня из описания уровней
 
-    def __init__(self, level_number):
+    def __init__(self, level_number, level_set):
         self.level_number = level_number
-        self.enemies_per_row = min(8 + level_number, 12)
-        self.enemy_rows = min(3 + level_number, 7)
-        self.enemy_speed_multiplier = 1 + (level_number - 1) * 0.15
+        self.level_set = level_set
+        self.definition = level_set.level(level_number)
+        self.enemies_per_row = self.definition.columns
+        self.enemy_rows = len(self.definition.rows)
 
-    def spawn_enemies(self):
+    def spawn_enemies(self, enemies=None):
         # генерация врагов для уровня (больше с каждым уровнем)
-        enemies = arcade.SpriteList()
+        # можно передать уже существующий пустой список, чтобы не выделять новый
+        if enemies is None:
+            enemies = arcade.SpriteList()
 
-        start_x = 100
-        start_y = SCREEN_HEIGHT - 150
-        spacing_x = (SCREEN_WIDTH - 200) / self.enemies_per_row
-        spacing_y = 60
+        definition = self.definition
+        start_x = definition.left
+        start_y = SCREEN_HEIGHT - definition.top
+        spacing_x = (SCREEN_WIDTH - definition.left - definition.right) / self.enemies_per_row
+        spacing_y = definition.spacing_y
 
-        for row in range(self.enemy_rows):
-            # тип врага зависит от ряда
-            enemy_type = min(row // 2, 2)
+        for row, enemy_type in enumerate(definition.rows):
+            # тип врага задается для каждого ряда
+            type_def = self.level_set.enemy_types[enemy_type]
 
             for col in range(self.enemies_per_row):
                 x = start_x + col * spacing_x
                 y = start_y - row * spacing_y
-                enemy = Enemy(x, y, enemy_type, self.level_number)
+                enemy = Enemy(x, y, enemy_type, type_def, definition)
+                enemy.formation_slot = (row, col)
                 enemies.append(enemy)
 
         return enemies
 
 
+class FormationBounds:
+    # учет строя врагов: число живых по рядам и колоннам и крайние живые враги каждого
+    # ряда обновляются при гибели врага (remove), поэтому проверки края экрана, нижней
+    # границы и завершения уровня не перебирают весь список врагов.
+    # враги одного ряда одного типа и движутся вместе, поэтому крайний по колонне
+    # враг ряда - он же крайний по координате
+
+    def __init__(self):
+        self.grid = []  # ряды: враги по колоннам, None - место освободилось
+        self.row_alive = []
+        self.column_alive = []
+        self.row_first = []  # колонна крайнего левого живого врага ряда (-1 - ряд пуст)
+        self.row_last = []
+        self.bottom_row = -1  # нижний ряд с живыми врагами
+        self.alive = 0
+
+    def track(self, enemies):
+        # разбор строя по formation_slot врагов (новый уровень или восстановленный снимок)
+        slots = [enemy.formation_slot for enemy in enemies]
+        rows = max((row for row, _ in slots), default=-1) + 1
+        columns = max((column for _, column in slots), default=-1) + 1
+        self.grid = [[None] * columns for _ in range(rows)]
+        self.row_alive = [0] * rows
+        self.column_alive = [0] * columns
+        for enemy, (row, column) in zip(enemies, slots):
+            self.grid[row][column] = enemy
+            self.row_alive[row] += 1
+            self.column_alive[column] += 1
+        self.alive = len(slots)
+        self.row_first = [self.next_alive(row, 0, 1) for row in range(rows)]
+        self.row_last = [self.next_alive(row, columns - 1, -1) for row in range(rows)]
+        self.bottom_row = max((row for row in range(rows) if self.row_alive[row]), default=-1)
+
+    def next_alive(self, row, column, step):
+        # ближайшая живая колонна ряда, начиная с column, в направлении step
+        cells = self.grid[row]
+        while 0 <= column < len(cells):
+            if cells[column] is not None:
+                return column
+            column += step
+        return -1
+
+    def remove(self, enemy):
+        # враг погиб
+        row, column = enemy.formation_slot
+        if self.grid[row][column] is not enemy:
+            return
+        self.grid[row][column] = None
+        self.alive -= 1
+        self.row_alive[row] -= 1
+        self.column_alive[column] -= 1
+        if self.row_alive[row] == 0:
+            self.row_first[row] = self.row_last[row] = -1
+            if row == self.bottom_row:
+                while self.bottom_row >= 0 and self.row_alive[self.bottom_row] == 0:
+                    self.bottom_row -= 1
+            return
+        if column == self.row_first[row]:
+            self.row_first[row] = self.next_alive(row, column + 1, 1)
+        if column == self.row_last[row]:
+            self.row_last[row] = self.next_alive(row, column - 1, -1)
+
+    def edge(self, direction):
+        # правая граница строя при движении вправо, левая - при движении влево
+        # (по формам крайних врагов рядов)
+        if direction > 0:
+            return max(hit_bounds(self.grid[row][last])[2]
+                       for row, last in enumerate(self.row_last) if last >= 0)
+        return min(hit_bounds(self.grid[row][first])[0]
+                   for row, first in enumerate(self.row_first) if first >= 0)
+
+    def bottom(self):
+        # высота нижнего ряда с живыми врагами
+        row = self.bottom_row
+        return self.grid[row][self.row_first[row]].center_y
+
+
+class GameCamera(arcade.Camera):
+    # камера игрового слоя - тряска и масштаб применяются одной матрицей проекции
+    # на видеокарте, поэтому их цена не зависит от количества спрайтов
+
+    def __init__(self, viewport_width=0, viewport_height=0):
+        super().__init__(viewport_width, viewport_height)
+        self.offset_x = 0
+        self.offset_y = 0
+        self.zoom_level = CAMERA_ZOOM
+
+    def set_offset(self, x, y):
+        # смещение всей сцены (тряска)
+        self.offset_x = x
+        self.offset_y = y
+
+    def set_zoom(self, zoom):
+        # масштаб относительно центра экрана
+        self.zoom_level = max(0.1, zoom)
+
+    def update(self):
+        # ортографическая проекция видимой области мира
+        half_width = self.viewport_width / 2 / self.zoom_level
+        half_height = self.viewport_height / 2 / self.zoom_level
+        center_x = self.viewport_width / 2 - self.offset_x
+        center_y = self.viewport_height / 2 - self.offset_y
+        self.projection_matrix = Mat4.orthogonal_projection(
+            center_x - half_width, center_x + half_width,
+            center_y - half_height, center_y + half_height,
+            self.near, self.far
+        )
+        self.view_matrix = Mat4()
+        self.combined_matrix = self.projection_matrix
+
+
+class ParallaxBackground:
+    # фон из нескольких прокручиваемых слоев: картинки слоев один раз собираются
+    # в одну текстуру-атлас, все слои рисуются одним полноэкранным квадом за один draw call,
+    # а прокрутка меняет только uniform со смещениями слоев
+
+    def __init__(self, layers=BACKGROUND_LAYERS):
+        self.layers = layers
+        self.sizes = np.zeros((len(layers), 2))
+        self.velocities = np.array([(layer.speed_x, layer.speed_y) for layer in layers], dtype=np.float64)
+        self.sway = np.array([layer.sway for layer in layers], dtype=np.float64)
+        self.scroll = np.zeros((len(layers), 2))
+        self.player_offset = 0.0
+        self.program = None
+        self.texture = None
+        self.geometry = None
+
+    def build_atlas(self):
+        # слои складываются в атлас друг под другом, возвращаются атлас и прямоугольники слоев
+        images = [assets.image(layer.file) for layer in self.layers]
+        atlas = Image.new("RGBA", (max(image.width for image in images), sum(image.height for image in images)))
+        rects = []
+        top = 0
+        for image in images:
+            atlas.paste(image, (0, top))
+            rects.append((0, top, image.width, image.height))
+            top += image.height
+        return atlas, rects
+
+    def load(self):
+        # атлас, программа и квад создаются при первой отрисовке
+        ctx = arcade.get_window().ctx
+        atlas, rects = self.build_atlas()
+        self.sizes[:] = [rect[2:] for rect in rects]
+        self.program = ctx.load_program(
+            vertex_shader="arcade_resources/system/shaders/parallax/parallax_vs.glsl",
+            fragment_shader="arcade_resources/system/shaders/parallax/parallax_fs.glsl",
+            defines={"LAYER_COUNT": str(len(self.layers))},
+        )
+        self.program['atlas'] = 0
+        self.program['screen_size'] = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.program['rects'] = tuple(value for rect in rects for value in rect)
+        self.program['placement'] = tuple(value for layer in self.layers for value in (
+            layer.bottom, layer.scale, float(layer.repeat_y), layer.brightness))
+        # строки атласа загружаются сверху вниз, шейдер читает тексели без фильтрации
+        self.texture = ctx.texture(atlas.size, components=4, data=atlas.tobytes())
+        self.texture.filter = (ctx.NEAREST, ctx.NEAREST)
+        quad = ctx.buffer(data=np.array([-1, -1, 1, -1, -1, 1, 1, 1], dtype=np.float32))
+        self.geometry = ctx.geometry([BufferDescription(quad, '2f', ['in_vert'])], mode=ctx.TRIANGLE_STRIP)
+
+    def update(self, delta_time, player_x):
+        # прокрутка слоев; смещение держится в пределах размера слоя, чтобы не терять точность
+        self.scroll += self.velocities * delta_time
+        if self.sizes[0, 0]:
+            np.mod(self.scroll, self.sizes, out=self.scroll)
+        self.player_offset = player_x - SCREEN_WIDTH / 2
+
+    def draw(self):
+        if self.program is None:
+            self.load()
+        offsets = self.scroll.copy()
+        offsets[:, 0] += self.sway * self.player_offset
+        self.program['offsets'] = tuple(offsets.ravel())
+        self.texture.use(0)
+        self.geometry.render(self.program, vertices=4)
+
+
+# игровые события - проверка столкновений только создает их,
+# а очки, частицы, звуки и улучшения обрабатываются пачкой в конце тика
+EnemyKilled = namedtuple("EnemyKilled", ["x", "y", "points", "enemy_type"])
+EnemyDamaged = namedtuple("EnemyDamaged", ["x", "y"])
+PlayerHit = namedtuple("PlayerHit", ["x", "y", "bullets"])
+ShieldBlocked = namedtuple("ShieldBlocked", ["bullets"])
+PowerUpCollected = namedtuple("PowerUpCollected", ["powerup_type"])
+LevelComplete = namedtuple("LevelComplete", ["level"])
+ShotFired = namedtuple("ShotFired", ["x", "y"])
+
+
+class EventBus:
+    # очередь игровых событий с подписчиками по типу события
+    # обработчик получает сразу список всех событий своего типа за тик,
+    # поэтому может объединять их (например, один звук на несколько взрывов)
+
+    def __init__(self):
+        self.queue = []
+        self.handlers = {}
+
+    def subscribe(self, event_type, handler):
+        # обработчики вызываются в порядке подписки
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def emit(self, event):
+        self.queue.append(event)
+
+    def dispatch(self):
+        # раздача накопленных событий пачками по типам
+        if not self.queue:
+            return
+        events, self.queue = self.queue, []
+        batches = {}
+        for event in events:
+            batches.setdefault(type(event), []).append(event)
+        for event_type, handlers in self.handlers.items():
+            batch = batches.get(event_type)
+            if batch:
+                for handler in handlers:
+                    handler(batch)
+
+    def clear(self):
+        self.queue.clear()
+
+
+# результат одного уровня игры (длительность в секундах игрового времени)
+LevelResult = namedtuple("LevelResult", ["level", "duration", "score", "shots", "hits", "kills",
+                                         "lives_lost", "powerups", "completed"])
+
+
+class EventCounters:
+    # счетчики игровых событий с момента последнего reset: выстрелы, попадания,
+    # убитые враги, потерянные жизни, подобранные улучшения и набранные очки
+
+    def __init__(self, events):
+        self.reset()
+
+        events.subscribe(ShotFired, self.on_shots)
+        events.subscribe(EnemyKilled, self.on_kills)
+        events.subscribe(EnemyDamaged, self.on_hits)
+        events.subscribe(PlayerHit, self.on_player_hit)
+        events.subscribe(PowerUpCollected, self.on_powerups)
+
+    def reset(self):
+        self.shots = 0
+        self.hits = 0
+        self.kills = 0
+        self.lives_lost = 0
+        self.powerups = 0
+        self.score = 0
+
+    def on_shots(self, events):
+        self.shots += len(events)
+
+    def on_kills(self, events):
+        self.kills += len(events)
+        self.hits += len(events)
+        self.score += sum(event.points for event in events)
+
+    def on_hits(self, events):
+        self.hits += len(events)
+
+    def on_player_hit(self, events):
+        self.lives_lost += len(events)
+
+    def on_powerups(self, events):
+        self.powerups += len(events)
+
+
+class SessionStats:
+    # статистика уровней текущей игры по игровым событиям; в конце игры
+    # результаты уровней записываются в базу вместе с итогом
+
+    def __init__(self, events):
+        self.counters = EventCounters(events)
+        self.results = []
+        self.started = None
+        self.reset()
+
+    def reset(self, level=1):
+        # новая игра (или игра, восстановленная из снимка на уровне level)
+        self.results = []
+        self.started = datetime.datetime.now().strftime(SCORE_DATE_FORMAT)
+        self.start_level(level)
+
+    def start_level(self, level):
+        self.level = level
+        self.ticks = 0
+        self.counters.reset()
+
+    def tick(self, steps):
+        self.ticks += steps
+
+    def finish_level(self, completed):
+        counters = self.counters
+        self.results.append(LevelResult(self.level, self.ticks / 60, counters.score, counters.shots, counters.hits,
+                                        counters.kills, counters.lives_lost, counters.powerups, int(completed)))
+
+    def level_complete(self, next_level):
+        self.finish_level(True)
+        self.start_level(next_level)
+
+    def finish_session(self):
+        # результаты всех уровней, включая последний, на котором игра закончилась
+        self.finish_level(False)
+        return self.results
+
+
+class TelemetryRecorder:
+    # запись состояния игры каждый тик в заранее выделенные буферы и сброс
+    # в столбцовый файл .npz в фоновом потоке (в конце уровня и игры)
+
+    COLUMNS = ("tick", "level", "score", "lives", "player_x", "enemies", "player_bullets",
+               "enemy_bullets", "powerups", "particles", "shield", "rapid_fire",
+               "shots", "kills", "hits", "lives_lost", "powerups_collected")
+
+    def __init__(self, events, directory=TELEMETRY_DIR, capacity=TELEMETRY_CAPACITY):
+        self.directory = directory
+        self.capacity = capacity
+        self.buffer = np.zeros((capacity, len(self.COLUMNS)), dtype=np.int32)
+        self.size = 0
+        self.tick = 0
+        self.part = 0
+        self.session_id = None
+        self.player_name = ""
+        # счетчики событий текущего тика
+        self.counters = EventCounters(events)
+        # один фоновый поток - файлы пишутся по очереди
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telemetry")
+
+        events.subscribe(LevelComplete, self.on_level_complete)
+
+    def on_level_complete(self, events):
+        # уровень пройден - сброс его данных на диск
+        self.flush(events[-1].level)
+
+    def start_session(self, player_name):
+        self.session_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self.player_name = player_name
+        self.size = 0
+        self.tick = 0
+        self.part = 0
+        self.counters.reset()
+
+    def sample(self, game):
+        # одна строка на тик
+        if self.session_id is None:
+            return
+        if self.size == self.capacity:
+            self.flush(game.current_level)
+        player = game.player_sprite
+        counters = self.counters
+        self.buffer[self.size] = (
+            self.tick, game.current_level, game.score, player.lives, int(player.center_x),
+            len(game.enemy_list), game.player_bullets.count, game.enemy_bullets.count,
+            len(game.powerup_list), game.particle_system.count,
+            player.shield_active, player.rapid_fire_active,
+            counters.shots, counters.kills, counters.hits, counters.lives_lost, counters.powerups,
+        )
+        self.size += 1
+        self.tick += 1
+        counters.reset()
+
+    def flush(self, level):
+        # копия заполненной части уходит в фоновый поток, буфер переиспользуется
+        if self.size == 0 or self.session_id is None:
+            return
+        data = self.buffer[:self.size].copy()
+        path = os.path.join(self.directory,
+                            f"session-{self.session_id}-level{level:02d}-{self.part:03d}.npz")
+        self.writer.submit(self.write, path, data, level, self.session_id, self.player_name)
+        self.size = 0
+        self.part += 1
+
+    def write(self, path, data, level, session_id, player_name):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            columns = {name: data[:, i] for i, name in enumerate(self.COLUMNS)}
+            np.savez_compressed(path, session=session_id, player=player_name,
+                                level_number=level, **columns)
+        except Exception as e:
+            print(f"ошибка записи телеметрии {path}: {e}")
+
+    def end_session(self, level):
+        # конец игры - сброс незавершенного уровня
+        self.flush(level)
+        self.session_id = None
+
+    def close(self):
+        # дождаться записи всех файлов
+        self.writer.shutdown(wait=True)
+
+
+class FrameProfiler:
+    # замер времени фаз кадра (обновление, столкновения, отрисовка ...) в миллисекундах
+    # для каждой фазы хранятся последние window_size замеров
+
+    def __init__(self, window_size=120):
+        self.window_size = window_size
+        self.samples = {}
+        self.started = {}
+
+    def begin(self, name):
+        self.started[name] = time.perf_counter()
+
+    def end(self, name):
+        elapsed = (time.perf_counter() - self.started.pop(name)) * 1000
+        self.add(name, elapsed)
+        return elapsed
+
+    def add(self, name, value):
+        # добавление замера, полученного снаружи
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window_size)
+        samples.append(value)
+
+    def last(self, name):
+        samples = self.samples.get(name)
+        return samples[-1] if samples else 0.0
+
+    def average(self, name):
+        samples = self.samples.get(name)
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def report(self):
+        # средние значения по всем фазам
+        return {name: round(self.average(name), 3) for name in self.samples}
+
+
+# действия игрока
+INPUT_LEFT = 0
+INPUT_RIGHT = 1
+INPUT_FIRE = 2
+INPUT_ACTIONS = 3
+
+# действия геймпада, которые в игре становятся действиями игрока
+GAMEPAD_INPUTS = {"left": INPUT_LEFT, "right": INPUT_RIGHT, "fire": INPUT_FIRE}
+
+InputEvent = namedtuple("InputEvent", ["time", "action", "pressed"])
+
+
+class InputQueue:
+    # события ввода с отметкой времени; обработчики окна только кладут их в очередь,
+    # а тик разбирает очередь целиком и считает, какую долю своего интервала
+    # каждая клавиша была нажата - короткое нажатие между кадрами не теряется,
+    # а движение соответствует реальному времени удержания
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.events = deque()
+        self.held = [False] * INPUT_ACTIONS
+        self.held_since = [0.0] * INPUT_ACTIONS
+        self.last_tick = None
+
+    def push(self, action, pressed):
+        self.events.append(InputEvent(self.clock(), action, pressed))
+
+    def tick(self):
+        # разбор событий с прошлого тика, возвращает доли удержания действий,
+        # число нажатий выстрела и время самого раннего события (None - событий не было)
+        now = self.clock()
+        start = now if self.last_tick is None else self.last_tick
+        self.last_tick = now
+        held_time = [0.0] * INPUT_ACTIONS
+        presses = 0
+        earliest = None
+
+        while self.events:
+            event = self.events.popleft()
+            event_time = min(max(event.time, start), now)
+            if earliest is None:
+                earliest = event.time
+            action = event.action
+            if event.pressed and not self.held[action]:
+                self.held[action] = True
+                self.held_since[action] = event_time
+                if action == INPUT_FIRE:
+                    presses += 1
+            elif not event.pressed and self.held[action]:
+                self.held[action] = False
+                held_time[action] += event_time - max(self.held_since[action], start)
+
+        duration = now - start
+        fractions = []
+        for action in range(INPUT_ACTIONS):
+            if self.held[action]:
+                held_time[action] += now - max(self.held_since[action], start)
+            if duration > 0:
+                fractions.append(min(1.0, held_time[action] / duration))
+            else:
+                fractions.append(1.0 if self.held[action] else 0.0)
+        return fractions, presses, earliest
+
+    def clear(self):
+        self.events.clear()
+        self.held = [False] * INPUT_ACTIONS
+        self.last_tick = None
+
+
+# ввод одного тика: шаг времени, доли удержания влево/вправо, удержание и нажатия выстрела
+INPUT_RECORD_DTYPE = np.dtype([("delta_time", "<f4"), ("left", "<f4"), ("right", "<f4"),
+                               ("fire", "u1"), ("presses", "u1")])
+
+
+class InputRecording:
+    # ввод игровой сессии по тикам вместе с зерном random: повтор через InputReplay
+    # дает ту же игру без клавиатуры и без отрисовки
+    #
+    # файл - заголовок и строки INPUT_RECORD_DTYPE, сжатые gzip
+
+    MAGIC = b"LVIN"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHQI")  # magic, версия, зерно random, число тиков
+
+    def __init__(self, seed, rows=None, capacity=4096):
+        self.seed = seed
+        if rows is None:
+            rows = np.zeros(capacity, dtype=INPUT_RECORD_DTYPE)
+            self.size = 0
+        else:
+            self.size = len(rows)
+        self.rows = rows
+
+    @classmethod
+    def start(cls, seed=None):
+        # новая запись; зерно сразу применяется к random, чтобы повтор начинался с того же состояния
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), "little")
+        random.seed(seed)
+        return cls(seed)
+
+    def record(self, delta_time, held, fire_held, presses):
+        if self.size == len(self.rows):
+            self.rows = np.resize(self.rows, len(self.rows) * 2)
+        self.rows[self.size] = (delta_time, held[INPUT_LEFT], held[INPUT_RIGHT], fire_held, min(presses, 255))
+        self.size += 1
+
+    @property
+    def ticks(self):
+        return self.rows[:self.size]
+
+    def save(self, path):
+        temp_path = path + ".tmp"
+        with gzip.open(temp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.size))
+            f.write(self.ticks.tobytes())
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+        magic, version, seed, size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"неизвестный формат записи ввода {path}")
+        rows = np.frombuffer(data, dtype=INPUT_RECORD_DTYPE, count=size, offset=cls.HEADER.size)
+        return cls(seed, rows)
+
+
+class InputReplay:
+    # источник ввода вместо InputQueue: отдает записанные тики по порядку,
+    # события окна игнорируются; после конца записи ввода нет
+
+    def __init__(self, recording):
+        self.rows = recording.ticks
+        self.position = 0
+        self.held = [False] * INPUT_ACTIONS
+
+    @property
+    def finished(self):
+        return self.position >= len(self.rows)
+
+    def push(self, action, pressed):
+        pass
+
+    def tick(self):
+        if self.finished:
+            self.held = [False] * INPUT_ACTIONS
+            return [0.0] * INPUT_ACTIONS, 0, None
+        row = self.rows[self.position]
+        self.position += 1
+        fire = bool(row["fire"])
+        self.held = [row["left"] > 0, row["right"] > 0, fire]
+        return [float(row["left"]), float(row["right"]), float(fire)], int(row["presses"]), None
+
+    def delta_time(self):
+        # шаг времени следующего тика
+        return float(self.rows[self.position]["delta_time"])
+
+    def clear(self):
+        self.held = [False] * INPUT_ACTIONS
+
+
+class ControllerDatabase:
+    # база раскладок геймпадов SDL (gamecontrollerdb.txt), скомпилированная в индекс
+    #
+    # текстовая база разбирается один раз: строки текущей платформы сортируются по
+    # guid и сохраняются в CONTROLLER_CACHE_DIR - заголовок, записи RECORD (guid,
+    # смещение и длина строки раскладки) и сами строки. индекс открывается через mmap
+    # только при первом поиске, поиск - двоичный по записям; кэш пересобирается, если
+    # у текстовой базы изменились размер или время изменения
+    MAGIC = b"LVCD"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHqqI")  # метка, версия, размер и mtime текстовой базы, число записей
+    RECORD = struct.Struct("<16sIH")
+    PLATFORMS = {"linux": "Linux", "win32": "Windows", "cygwin": "Windows", "darwin": "Mac OS X"}
+
+    def __init__(self, path=CONTROLLER_DB_FILE, cache_dir=CONTROLLER_CACHE_DIR, platform=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.platform = platform or self.PLATFORMS.get(pyglet.compat_platform, "Linux")
+        self.data = None
+        self.count = 0
+
+    def cache_path(self):
+        name = f"{os.path.basename(self.path)}.{self.platform.replace(' ', '_').lower()}.bin"
+        return os.path.join(self.cache_dir, name)
+
+    def load(self):
+        stat = os.stat(self.path)
+        cache_path = self.cache_path()
+        try:
+            with open(cache_path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, size, mtime, count = self.HEADER.unpack_from(data, 0)
+            if (magic, version, size, mtime) == (self.MAGIC, self.VERSION, stat.st_size, stat.st_mtime_ns):
+                self.data, self.count = data, count
+                return
+            data.close()
+        except (OSError, ValueError, struct.error):
+            pass
+
+        started = time.perf_counter()
+        with open(self.path, encoding='utf-8') as f:
+            data = self.compile(f, self.platform, stat.st_size, stat.st_mtime_ns)
+        self.count = self.HEADER.unpack_from(data, 0)[4]
+        self.data = data
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"не удалось сохранить индекс раскладок геймпадов: {e}")
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"база геймпадов {self.path} скомпилирована: {self.count} раскладок за {elapsed:.1f} мс")
+
+    @classmethod
+    def compile(cls, lines, platform, size=0, mtime=0):
+        # строки платформы по guid; при повторе guid действует последняя строка, как в SDL
+        mappings = {}
+        marker = f"platform:{platform},"
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#") or marker not in line:
+                continue
+            guid = line.split(",", 1)[0]
+            try:
+                key = bytes.fromhex(guid)
+            except ValueError:
+                continue
+            if len(key) == 16:
+                mappings[key] = line.encode('utf-8')
+
+        records = []
+        blob = []
+        offset = 0
+        for key in sorted(mappings):
+            line = mappings[key]
+            records.append(cls.RECORD.pack(key, offset, len(line)))
+            blob.append(line)
+            offset += len(line)
+        return b"".join([cls.HEADER.pack(cls.MAGIC, cls.VERSION, size, mtime, len(records))] + records + blob)
+
+    def lookup(self, guid):
+        # строка раскладки для guid устройства или None
+        if self.data is None:
+            self.load()
+        try:
+            key = bytes.fromhex(guid)
+        except ValueError:
+            return None
+        data = self.data
+        base = self.HEADER.size
+        size = self.RECORD.size
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * size
+            if data[start:start + 16] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count:
+            return None
+        record_key, offset, length = self.RECORD.unpack_from(data, base + low * size)
+        if record_key != key:
+            return None
+        start = base + self.count * size + offset
+        return data[start:start + length].decode('utf-8')
+
+
+class GamepadInput:
+    # геймпады через pyglet.input: стик и крестовина дают действия "left" и "right",
+    # кнопки - действия из GAMEPAD_BUTTON_ACTIONS. действия передаются в on_gamepad
+    # текущего view (в игре - в ту же очередь ввода, что и клавиатура); view без
+    # on_gamepad геймпад не слушает, поэтому в меню стик не печатает буквы в имя
+
+    DIRECTION_ACTIONS = {-1: "left", 1: "right"}
+
+    def __init__(self, window, database=None):
+        self.window = window
+        self.database = database or ControllerDatabase()
+        self.mappings = None  # pyglet.input.controller
+        self.manager = None
+        self.stick = {}  # направление стика каждого геймпада: -1, 0, 1
+        self.dpad = {}
+        self.direction = 0
+
+    def start(self):
+        # pyglet.input импортируется только здесь: без дисплея (например, в
+        # безоконных прогонах) модуль не загружается
+        try:
+            import pyglet.input
+            import pyglet.input.controller
+            self.mappings = pyglet.input.controller
+            self.manager = pyglet.input.ControllerManager()
+        except Exception as e:
+            print(f"геймпады недоступны: {e}")
+            return False
+        self.manager.push_handlers(on_connect=self.on_connect, on_disconnect=self.on_disconnect)
+        for controller in self.manager.get_controllers():
+            self.on_connect(controller)
+        return True
+
+    def apply_mapping(self, controller):
+        # раскладка из базы игры для геймпада, которого нет во встроенной базе pyglet
+        device = controller.device
+        guid = device.get_guid() if hasattr(device, "get_guid") else controller.guid
+        if not guid or self.mappings.get_mapping(guid) is not None:
+            return controller
+        line = self.database.lookup(guid)
+        if line is None:
+            return controller
+        self.mappings.add_mappings_from_string(line)
+        return type(controller)(device, self.mappings.get_mapping(guid))
+
+    def on_connect(self, controller):
+        try:
+            controller = self.apply_mapping(controller)
+            controller.open()
+        except OSError as e:
+            print(f"не удалось открыть геймпад {controller.name}: {e}")
+            return
+        controller.push_handlers(on_stick_motion=self.on_stick_motion, on_dpad_motion=self.on_dpad_motion,
+                                 on_button_press=self.on_button_press,
+                                 on_button_release=self.on_button_release)
+        self.stick[controller.guid] = 0
+        self.dpad[controller.guid] = 0
+        print(f"геймпад подключен: {controller.name}")
+
+    def on_disconnect(self, controller):
+        self.stick.pop(controller.guid, None)
+        self.dpad.pop(controller.guid, None)
+        self.update_direction()
+        print(f"геймпад отключен: {controller.name}")
+
+    def on_stick_motion(self, controller, stick, x, y):
+        if stick != "leftstick":
+            return
+        # гистерезис: движение начинается за GAMEPAD_DEADZONE и кончается ниже GAMEPAD_RELEASE
+        if abs(x) >= GAMEPAD_DEADZONE:
+            self.stick[controller.guid] = 1 if x > 0 else -1
+        elif abs(x) < GAMEPAD_RELEASE:
+            self.stick[controller.guid] = 0
+        self.update_direction()
+
+    def on_dpad_motion(self, controller, left, right, up, down):
+        self.dpad[controller.guid] = int(right) - int(left)
+        self.update_direction()
+
+    def update_direction(self):
+        # общее направление всех геймпадов (крестовина важнее стика)
+        total = sum(self.dpad.get(guid) or stick for guid, stick in self.stick.items())
+        direction = (total > 0) - (total < 0)
+        if direction == self.direction:
+            return
+        if self.direction:
+            self.send(self.DIRECTION_ACTIONS[self.direction], False)
+        self.direction = direction
+        if direction:
+            self.send(self.DIRECTION_ACTIONS[direction], True)
+
+    def on_button_press(self, controller, button):
+        action = GAMEPAD_BUTTON_ACTIONS.get(button)
+        if action is not None:
+            self.send(action, True)
+
+    def on_button_release(self, controller, button):
+        action = GAMEPAD_BUTTON_ACTIONS.get(button)
+        if action is not None:
+            self.send(action, False)
+
+    def send(self, action, pressed):
+        handler = getattr(self.window.current_view, "on_gamepad", None)
+        if handler is not None:
+            handler(action, pressed)
+
+
+class QualityGovernor:
+    # подстройка качества эффектов под бюджет кадра с гистерезисом:
+    # качество снижается, когда сглаженное время кадра держится выше бюджета,
+    # и возвращается, только когда оно долго остается заметно ниже бюджета
+
+    def __init__(self, budget_ms=FRAME_BUDGET_MS, levels=QUALITY_LEVELS):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.level = 0
+        self.smoothed_ms = 0.0
+        self.over_frames = 0
+        self.under_frames = 0
+        self.cooldown = 0
+        self.downgrade_after = 30  # кадров подряд выше бюджета
+        self.upgrade_after = 180  # кадров подряд ниже upgrade_ratio бюджета
+        self.upgrade_ratio = 0.6
+        self.cooldown_frames = 120  # кадров без изменений после смены уровня
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, frame_ms):
+        # учет времени очередного кадра, возвращает True при смене уровня
+        self.smoothed_ms += (frame_ms - self.smoothed_ms) * 0.1
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return False
+
+        if self.smoothed_ms > self.budget_ms:
+            self.over_frames += 1
+            self.under_frames = 0
+        elif self.smoothed_ms < self.budget_ms * self.upgrade_ratio:
+            self.under_frames += 1
+            self.over_frames = 0
+        else:
+            self.over_frames = 0
+            self.under_frames = 0
+
+        if self.over_frames >= self.downgrade_after and self.level < len(self.levels) - 1:
+            self.set_level(self.level + 1)
+            return True
+        if self.under_frames >= self.upgrade_after and self.level > 0:
+            self.set_level(self.level - 1)
+            return True
+        return False
+
+    def set_level(self, level):
+        print(f"качество эффектов: {self.level} -> {level} "
+              f"(кадр {self.smoothed_ms:.1f} мс, бюджет {self.budget_ms:.1f} мс)")
+        self.level = level
+        self.over_frames = 0
+        self.under_frames = 0
+        self.cooldown = self.cooldown_frames
+
+
+class GameSnapshot:
+    # снимок полного состояния GameView в компактном двоичном формате:
+    # заголовок, состояние игры и игрока, действующие улучшения, затем массивы
+    # пуль, врагов, улучшений и частиц (число строк + сырые данные numpy) и
+    # состояние генератора random - после восстановления игра продолжается так же,
+    # как продолжилась бы без сохранения
+    #
+    # генератор частиц не сохраняется - он влияет только на картинку
+    MAGIC = b"LVSS"
+    VERSION = 2
+    HEADER = struct.Struct("<4sH")
+    GAME = struct.Struct("<qHbBf32s")  # очки, уровень, направление врагов, буфер выстрелов, тряска, имя
+    PLAYER = struct.Struct("<ddhhIB")  # x, y, жизни, перезарядка, такт улучшений, число улучшений
+    EFFECT = struct.Struct("<BI")  # тип улучшения, такт окончания
+    COUNT = struct.Struct("<I")
+    RANDOM = struct.Struct("<B625IBd")  # версия, состояние mt19937, есть ли gauss_next, gauss_next
+
+    ENEMY_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("type", "u1"), ("health", "<i2"),
+                            ("speed", "<f8"), ("cooldown", "<i2"), ("animation", "<f8"),
+                            ("row", "u1"), ("column", "u1")])
+    POWERUP_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("type", "u1"), ("animation", "<f8")])
+
+    @classmethod
+    def capture(cls, game):
+        player = game.player_sprite
+        chunks = [
+            cls.HEADER.pack(cls.MAGIC, cls.VERSION),
+            cls.GAME.pack(game.score, game.current_level, game.enemy_direction, game.fire_buffer,
+                          game.camera_shake, game.player_name.encode('utf-8')[:32]),
+        ]
+
+        effects = player.effects
+        chunks.append(cls.PLAYER.pack(player.center_x, player.center_y, player.lives, player.shoot_cooldown,
+                                      effects.tick, len(effects.expiry)))
+        for powerup_type, expires in effects.expiry.items():
+            chunks.append(cls.EFFECT.pack(powerup_type, expires))
+
+        for pool in (game.player_bullets, game.enemy_bullets):
+            # сбитые на этом тике пули в снимок не попадают
+            chunks.append(cls.pack_array(pool.data[:pool.count][~pool.dead[:pool.count]]))
+
+        enemies = np.array([(enemy.center_x, enemy.center_y, enemy.enemy_type, enemy.health, enemy.speed,
+                             enemy.shoot_cooldown, enemy.animation_time) + enemy.formation_slot
+                            for enemy in game.enemy_list],
+                           dtype=cls.ENEMY_DTYPE)
+        chunks.append(cls.pack_array(enemies))
+        powerups = np.array([(powerup.center_x, powerup.center_y, powerup.powerup_type, powerup.animation_time)
+                             for powerup in game.powerup_list], dtype=cls.POWERUP_DTYPE)
+        chunks.append(cls.pack_array(powerups))
+        particles = game.particle_system
+        chunks.append(cls.pack_array(particles.data[:particles.count]))
+
+        version, state, gauss_next = random.getstate()
+        chunks.append(cls.RANDOM.pack(version, *state, gauss_next is not None, gauss_next or 0.0))
+        return b"".join(chunks)
+
+    @classmethod
+    def pack_array(cls, array):
+        return cls.COUNT.pack(len(array)) + np.ascontiguousarray(array).tobytes()
+
+    @classmethod
+    def restore(cls, game, data):
+        # восстановление состояния в уже загруженный GameView (списки и буферы переиспользуются)
+        buffer = memoryview(data)
+        magic, version = cls.HEADER.unpack_from(buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("неподдерживаемый формат снимка")
+        offset = cls.HEADER.size
+
+        score, level, direction, fire_buffer, camera_shake, name = cls.GAME.unpack_from(buffer, offset)
+        offset += cls.GAME.size
+        x, y, lives, shoot_cooldown, tick, effect_count = cls.PLAYER.unpack_from(buffer, offset)
+        offset += cls.PLAYER.size
+        expiry = {}
+        for _ in range(effect_count):
+            powerup_type, expires = cls.EFFECT.unpack_from(buffer, offset)
+            offset += cls.EFFECT.size
+            expiry[powerup_type] = expires
+
+        arrays = []
+        for dtype, columns in ((np.float32, BULLET_COLUMNS), (np.float32, BULLET_COLUMNS),
+                               (cls.ENEMY_DTYPE, None), (cls.POWERUP_DTYPE, None),
+                               (np.float32, PARTICLE_COLUMNS)):
+            count, = cls.COUNT.unpack_from(buffer, offset)
+            offset += cls.COUNT.size
+            items = count * (columns or 1)
+            array = np.frombuffer(buffer, dtype=dtype, count=items, offset=offset)
+            offset += array.nbytes
+            arrays.append(array.reshape(count, columns) if columns else array)
+        player_bullets, enemy_bullets, enemies, powerups, particles = arrays
+        random_state = cls.RANDOM.unpack_from(buffer, offset)
+
+        # сброс текущего состояния
+        game.events.clear()
+        game.input.clear()
+        game.input_event_time = None
+        game.enemy_list.clear()
+        game.powerup_list.clear()
+
+        game.score = score
+        game.current_level = level
+        game.enemy_direction = direction
+        game.enemy_move_down = False
+        game.fire_buffer = fire_buffer
+        game.camera_shake = camera_shake
+        game.player_name = name.rstrip(b"\0").decode('utf-8', errors='ignore')
+        game.level = Level(level, game.level_set)
+        game.session_stats.reset(level)
+
+        player = game.player_sprite
+        player.reset()
+        player.center_x = x
+        player.center_y = y
+        player.lives = lives
+        player.shoot_cooldown = shoot_cooldown
+        effects = player.effects
+        effects.tick = tick
+        for powerup_type, expires in expiry.items():
+            effects.expiry[powerup_type] = expires
+            heapq.heappush(effects.heap, (expires, powerup_type))
+            setattr(player, POWERUP_EFFECTS[powerup_type].flag, True)
+
+        game.player_bullets.load(player_bullets)
+        game.enemy_bullets.load(enemy_bullets)
+
+        definition = game.level.definition
+        for row in enemies:
+            enemy_type = int(row["type"])
+            enemy = Enemy(float(row["x"]), float(row["y"]), enemy_type,
+                          game.level_set.enemy_types[enemy_type], definition)
+            enemy.health = int(row["health"])
+            enemy.speed = float(row["speed"])
+            enemy.shoot_cooldown = int(row["cooldown"])
+            enemy.animation_time = float(row["animation"])
+            enemy.formation_slot = (int(row["row"]), int(row["column"]))
+            game.enemy_list.append(enemy)
+        game.formation.track(game.enemy_list)
+
+        for row in powerups:
+            powerup = PowerUp(float(row["x"]), float(row["y"]), int(row["type"]))
+            powerup.animation_time = float(row["animation"])
+            game.powerup_list.append(powerup)
+
+        particle_system = game.particle_system
+        particle_system.clear()
+        if len(particles) > len(particle_system.data):
+            particle_system.data = np.zeros((len(particles), PARTICLE_COLUMNS), dtype=np.float32)
+        particle_system.data[:len(particles)] = particles
+        particle_system.count = len(particles)
+
+        random_version = random_state[0]
+        mt_state = random_state[1:626]
+        has_gauss, gauss_next = random_state[626:]
+        random.setstate((random_version, tuple(mt_state), gauss_next if has_gauss else None))
+
+    @classmethod
+    def save(cls, game, path=SNAPSHOT_FILE):
+        data = cls.capture(game)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return len(data)
+
+    @classmethod
+    def load(cls, game, path=SNAPSHOT_FILE):
+        with open(path, 'rb') as f:
+            cls.restore(game, f.read())
+
+
+# сущности, которые видит зритель, в порядке кодирования
+SPECTATOR_CHANNELS = ("enemies", "player_bullets", "enemy_bullets", "powerups")
+
+# сущность в рассылке: координаты и скорость за тик в 1/SPECTATOR_POSITION_SCALE пикселя, тип
+ENTITY_DTYPE = np.dtype([("id", "<u4"), ("x", "<i4"), ("y", "<i4"), ("vx", "<i2"), ("vy", "<i2"), ("kind", "u1")])
+# поправка координат уже известной зрителю сущности
+ENTITY_MOVE_DTYPE = np.dtype([("id", "<u4"), ("dx", "i1"), ("dy", "i1")])
+
+SpectatorState = namedtuple("SpectatorState", ["tick", "score", "level", "lives", "player_x", "player_y"])
+
+
+class SpectatorDelta:
+    # кодирование состояния игры для зрителей
+    #
+    # сущность передается целиком только при появлении - вместе со скоростью, и зритель
+    # сам продвигает ее на скорость за прошедшие тики. дальше сервер шлет лишь поправки
+    # там, где предсказание разошлось с игрой больше чем на SPECTATOR_TOLERANCE (разворот
+    # и спуск строя, накопленная ошибка округления скорости), и идентификаторы
+    # исчезнувших сущностей. пули и улучшения летят по прямой и после появления ничего
+    # не стоят, поэтому размер рассылки растет с числом событий, а не сущностей
+    #
+    # сообщение: FRAME (длина остатка, тип), STATE, затем по каждому каналу COUNTS и
+    # массивы исчезнувших id, появившихся (или замененных целиком) и поправок
+    FRAME = struct.Struct("<IB")
+    STATE = struct.Struct("<Iqhhii")  # тик, очки, уровень, жизни, x и y игрока
+    COUNTS = struct.Struct("<HHH")
+    KEYFRAME = 0
+    DELTA = 1
+
+    @staticmethod
+    def entity_table(ids, x, y, vx, vy, kind):
+        # таблица сущностей канала, отсортированная по id
+        scale = SPECTATOR_POSITION_SCALE
+        table = np.empty(len(ids), dtype=ENTITY_DTYPE)
+        table["id"] = ids
+        table["x"] = np.rint(np.asarray(x) * scale)
+        table["y"] = np.rint(np.asarray(y) * scale)
+        table["vx"] = np.clip(np.rint(np.asarray(vx) * scale), -32768, 32767)
+        table["vy"] = np.clip(np.rint(np.asarray(vy) * scale), -32768, 32767)
+        table["kind"] = kind
+        return table[np.argsort(table["id"], kind="stable")]
+
+    @classmethod
+    def sprite_table(cls, rows):
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 6)
+        return cls.entity_table(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4], rows[:, 5])
+
+    @classmethod
+    def pool_table(cls, pool):
+        alive = pool.alive_indices()
+        rows = pool.data[alive]
+        return cls.entity_table(pool.ids[alive], rows[:, BULLET_X], rows[:, BULLET_Y],
+                                rows[:, BULLET_VX], rows[:, BULLET_VY], 0)
+
+    @classmethod
+    def capture(cls, game):
+        # таблицы всех каналов
+        direction = game.enemy_direction
+        return {
+            "enemies": cls.sprite_table([(enemy.entity_id, enemy.center_x, enemy.center_y,
+                                          enemy.speed * direction, 0, enemy.enemy_type)
+                                         for enemy in game.enemy_list]),
+            "player_bullets": cls.pool_table(game.player_bullets),
+            "enemy_bullets": cls.pool_table(game.enemy_bullets),
+            "powerups": cls.sprite_table([(powerup.entity_id, powerup.center_x, powerup.center_y,
+                                           0, -powerup.speed, powerup.powerup_type)
+                                          for powerup in game.powerup_list]),
+        }
+
+    @classmethod
+    def state(cls, game, tick):
+        player = game.player_sprite
+        scale = SPECTATOR_POSITION_SCALE
+        return SpectatorState(tick, game.score, game.current_level, player.lives,
+                              int(player.center_x * scale), int(player.center_y * scale))
+
+    @staticmethod
+    def predict(table, ticks):
+        # положение сущностей через ticks тиков (одинаково на сервере и у зрителя)
+        table = table.copy()
+        if ticks:
+            table["x"] += table["vx"].astype(np.int32) * ticks
+            table["y"] += table["vy"].astype(np.int32) * ticks
+        return table
+
+    @classmethod
+    def encode_channel(cls, previous, current, ticks):
+        # изменения канала и таблица, которая получится у зрителя после их применения
+        predicted = cls.predict(previous, ticks)
+        known = np.isin(current["id"], predicted["id"], assume_unique=True)
+        kept = np.isin(predicted["id"], current["id"], assume_unique=True)
+        removed = predicted["id"][~kept]
+
+        # обе выборки отсортированы по id, поэтому строки совпадают
+        old = predicted[kept]
+        new = current[known]
+        dx = new["x"] - old["x"]
+        dy = new["y"] - old["y"]
+        small = (np.abs(dx) <= 127) & (np.abs(dy) <= 127)
+        same_motion = (new["vx"] == old["vx"]) & (new["vy"] == old["vy"]) & (new["kind"] == old["kind"])
+        moved = same_motion & small & ((np.abs(dx) > SPECTATOR_TOLERANCE) | (np.abs(dy) > SPECTATOR_TOLERANCE))
+        replaced = ~(same_motion & small)
+
+        # у сущностей без поправок у зрителя остается предсказанное положение
+        reference = current.copy()
+        idle = ~(moved | replaced)
+        idle_index = np.flatnonzero(known)[idle]
+        reference["x"][idle_index] = old["x"][idle]
+        reference["y"][idle_index] = old["y"][idle]
+
+        added = np.concatenate([current[~known], new[replaced]])
+        moves = np.empty(np.count_nonzero(moved), dtype=ENTITY_MOVE_DTYPE)
+        moves["id"] = new["id"][moved]
+        moves["dx"] = dx[moved]
+        moves["dy"] = dy[moved]
+        data = b"".join((cls.COUNTS.pack(len(removed), len(added), len(moves)),
+                         removed.astype("<u4").tobytes(), added.tobytes(), moves.tobytes()))
+        return data, reference
+
+    @classmethod
+    def encode(cls, message_type, state, previous, current, ticks):
+        # сообщение с изменениями от previous к current (ключевой кадр - от пустого состояния)
+        # и таблицы каналов, которые будут у зрителя после него
+        chunks = [cls.STATE.pack(*state)]
+        references = {}
+        empty = np.empty(0, dtype=ENTITY_DTYPE)
+        for channel in SPECTATOR_CHANNELS:
+            base = empty if previous is None else previous[channel]
+            data, references[channel] = cls.encode_channel(base, current[channel], ticks)
+            chunks.append(data)
+        body = b"".join(chunks)
+        return cls.FRAME.pack(len(body), message_type) + body, references
+
+    @classmethod
+    def apply_channel(cls, table, buffer, offset, ticks):
+        removed_count, added_count, moved_count = cls.COUNTS.unpack_from(buffer, offset)
+        offset += cls.COUNTS.size
+        removed = np.frombuffer(buffer, dtype="<u4", count=removed_count, offset=offset)
+        offset += removed.nbytes
+        added = np.frombuffer(buffer, dtype=ENTITY_DTYPE, count=added_count, offset=offset)
+        offset += added.nbytes
+        moves = np.frombuffer(buffer, dtype=ENTITY_MOVE_DTYPE, count=moved_count, offset=offset)
+        offset += moves.nbytes
+
+        table = cls.predict(table, ticks)
+        table = table[~(np.isin(table["id"], removed) | np.isin(table["id"], added["id"]))]
+        if moved_count:
+            index = np.searchsorted(table["id"], moves["id"])
+            table["x"][index] += moves["dx"]
+            table["y"][index] += moves["dy"]
+        if added_count:
+            table = np.concatenate([table, added])
+            table = table[np.argsort(table["id"], kind="stable")]
+        return table, offset
+
+    @classmethod
+    def apply(cls, tables, message_type, body, last_tick):
+        # применение тела сообщения (без FRAME) к таблицам зрителя, возвращает SpectatorState
+        buffer = memoryview(body)
+        state = SpectatorState(*cls.STATE.unpack_from(buffer, 0))
+        offset = cls.STATE.size
+        ticks = state.tick - last_tick
+        if message_type == cls.KEYFRAME:
+            ticks = 0
+            for channel in SPECTATOR_CHANNELS:
+                tables[channel] = np.empty(0, dtype=ENTITY_DTYPE)
+        for channel in SPECTATOR_CHANNELS:
+            tables[channel], offset = cls.apply_channel(tables[channel], buffer, offset, ticks)
+        return state
+
+
+class SpectatorServer:
+    # сервер зрительского режима: цикл asyncio в отдельном потоке принимает подключения
+    # по TCP, игровой поток раз в interval тиков кодирует изменения и передает готовое
+    # сообщение циклу, а тот рассылает его клиентам. новый или отставший клиент
+    # (переполнен буфер отправки) ждет следующего ключевого кадра, остальные получают изменения
+
+    def __init__(self, port=SPECTATOR_PORT, host=SPECTATOR_HOST, interval=SPECTATOR_INTERVAL,
+                 max_backlog=SPECTATOR_MAX_BACKLOG):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.max_backlog = max_backlog
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.clients = {}  # writer -> нужен ли ключевой кадр (меняется только в потоке сервера)
+        self.keyframe_requested = False
+        self.tick_count = 0
+        self.reference = None  # состояние, которое есть у клиентов после последней рассылки
+        self.reference_tick = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(ready,), name="spectator", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.server is not None
+
+    def run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_client, self.host, self.port))
+        except OSError as e:
+            print(f"не удалось запустить сервер зрителей на порту {self.port}: {e}")
+            ready.set()
+            self.loop.close()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"сервер зрителей: {self.host}:{self.port}")
+        ready.set()
+
+        self.loop.run_forever()
+
+        self.server.close()
+        for writer in self.clients:
+            writer.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    async def handle_client(self, reader, writer):
+        # зритель ничего не присылает - соединение держится до его закрытия
+        self.clients[writer] = True
+        self.keyframe_requested = True
+        try:
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            writer.close()
+
+    def tick(self, game):
+        # вызывается игровым потоком каждый тик
+        self.tick_count += game.sim_steps
+        if self.server is None or self.tick_count - self.reference_tick < self.interval:
+            return
+        if not self.clients:
+            self.reference = None
+            self.reference_tick = self.tick_count
+            return
+
+        current = SpectatorDelta.capture(game)
+        state = SpectatorDelta.state(game, self.tick_count)
+        # ключевой кадр получают все клиенты сразу - так у всех остается одно и то же
+        # состояние, с которым сверяются следующие изменения
+        keyframe = self.keyframe_requested or self.reference is None
+        if keyframe:
+            self.keyframe_requested = False
+            message, self.reference = SpectatorDelta.encode(SpectatorDelta.KEYFRAME, state, None, current, 0)
+        else:
+            message, self.reference = SpectatorDelta.encode(SpectatorDelta.DELTA, state, self.reference, current,
+                                                            self.tick_count - self.reference_tick)
+        self.reference_tick = self.tick_count
+        self.loop.call_soon_threadsafe(self.broadcast, message, keyframe)
+
+    def broadcast(self, message, keyframe):
+        for writer, needs_keyframe in list(self.clients.items()):
+            if writer.transport.get_write_buffer_size() > self.max_backlog:
+                # клиент не успевает читать - рассылки ему пропускаются, а когда
+                # буфер освободится, он запросит ключевой кадр
+                self.clients[writer] = True
+                continue
+            if needs_keyframe and not keyframe:
+                self.keyframe_requested = True
+                continue
+            writer.write(message)
+            self.clients[writer] = False
+            self.messages_sent += 1
+            self.bytes_sent += len(message)
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=2)
+
+
+# сервер зрителей (создается в main, если задан порт)
+spectator = None
+
+
 class GameView(arcade.View):
     # основной класс игры с камерой
+    # db_name и score_logs задают, куда сохраняются результаты (perf_gate передает
+    # ":memory:" и пустой список журналов, чтобы ничего не писать на диск)
 
-    def __init__(self):
+    def __init__(self, db_name='game_scores.db', score_logs=None):
         super().__init__()
 
         # спрайты
         self.player_sprite = None
         self.player_list = None
-        self.bullet_list = None
-        self.enemy_bullet_list = None
+        self.player_bullets = None
+        self.enemy_bullets = None
         self.enemy_list = None
         self.powerup_list = None
 
@@ -320,10 +3540,20 @@ class GameView(arcade.View):
         self.enemy_direction = 1
         self.enemy_move_down = False
 
-        # камера - используем смещение для эффекта тряски
+        # сколько тиков симуляции проходит за один вызов on_update - больше 1 для
+        # ускоренных пакетных прогонов без отрисовки (пули, враги и игрок смещаются
+        # на весь шаг, попадания пуль ищутся по всему пути, перезарядки, таймеры улучшений
+        # и вероятность выстрела врагов считаются на весь шаг); совпадение с покадровой
+        # игрой проверяет python perf_gate.py steps
+        self.sim_steps = 1
+
+        # камера - смещение для эффекта тряски применяется камерой игрового слоя,
+        # интерфейс рисуется отдельной неподвижной камерой
         self.camera_shake = 0
         self.camera_x = 0
         self.camera_y = 0
+        self.camera = None
+        self.gui_camera = None
 
         # физический движок - arcade для обработки физики
         self.physics_engine = None
@@ -331,6 +3561,33 @@ class GameView(arcade.View):
         # система частиц для взрывов
         self.particle_system = ParticleSystem()
 
+        # параллакс-фон (None - черный фон)
+        self.background = ParallaxBackground() if BACKGROUND_ENABLED else None
+
+        # строй врагов - границы и число живых без перебора списка
+        self.formation = FormationBounds()
+
+        # игровые события и их обработчики
+        self.events = EventBus()
+        self.events.subscribe(EnemyKilled, self.on_enemies_killed)
+        self.events.subscribe(EnemyDamaged, self.on_enemies_damaged)
+        self.events.subscribe(PlayerHit, self.on_player_hit)
+        self.events.subscribe(ShieldBlocked, self.on_shield_blocked)
+        self.events.subscribe(PowerUpCollected, self.on_powerups_collected)
+        self.events.subscribe(LevelComplete, self.on_level_complete)
+
+        # замер времени кадра и автоматическое снижение качества эффектов
+        self.profiler = FrameProfiler()
+        self.quality = QualityGovernor()
+        self.sound_players = []
+        self.apply_quality()
+
+        # статистика уровней для базы результатов
+        self.session_stats = SessionStats(self.events)
+
+        # телеметрия сессии (по умолчанию выключена)
+        self.telemetry = TelemetryRecorder(self.events) if TELEMETRY_ENABLED else None
+
         # звуки
         self.shoot_sound = None
         self.explosion_sound = None
@@ -338,52 +3595,140 @@ class GameView(arcade.View):
         self.level_complete_sound = None
         self.hit_sound = None
 
-        # управление
-        self.left_pressed = False
-        self.right_pressed = False
+        # управление - очередь событий ввода, разбирается в начале тика
+        self.input = InputQueue()
+        self.fire_buffer = 0  # нажатия выстрела, ждущие конца перезарядки
+        self.input_event_time = None  # самое раннее событие, еще не показанное на экране
+        self.input_recording = None  # запись ввода текущей сессии (LINVADERS_RECORD_INPUT)
 
         # менеджер базы данных
-        self.db_manager = DatabaseManager()
+        self.db_manager = DatabaseManager(db_name)
+
+        # файловые журналы результатов
+        if score_logs is None:
+            score_logs = [
+                ScoreLog('highscores.csv', CsvScoreFormat()),
+                ScoreLog('game_results.txt', TextScoreFormat()),
+                ScoreLog('game_results.bin', BinaryScoreFormat()),
+            ]
+        self.score_logs = score_logs
 
         # имя игрока
         self.player_name = "Player"
 
+        # загружены ли списки спрайтов и звуки (делается один раз на весь сеанс)
+        self.resources_loaded = False
+
+        # снимок состояния, который загружается при первом запуске игры
+        self.startup_snapshot = SNAPSHOT_ON_START
+
         arcade.set_background_color(arcade.color.BLACK)
 
     def setup(self):
         # инициализация игры
+        # списки спрайтов, игрок и звуки создаются только при первом запуске,
+        # при рестарте они переиспользуются и сбрасывается только состояние игры
+        if not self.resources_loaded:
+            self.load_resources()
+        self.reset_game()
+        if self.startup_snapshot:
+            self.load_snapshot(self.startup_snapshot)
+            self.startup_snapshot = None
+
+    def load_resources(self):
+        # однократное выделение ресурсов view
 
         # физический движок arcade
         self.physics_engine = None  # в этой игре не используется сложная физика движка
 
         # спрайты
         self.player_list = arcade.SpriteList()
-        self.bullet_list = arcade.SpriteList()
-        self.enemy_bullet_list = arcade.SpriteList()
+        # пули - упакованные массивы, рисуются instanced-шейдером
+        self.player_bullets = BulletPool(is_enemy=False)
+        self.enemy_bullets = BulletPool(is_enemy=True)
         self.enemy_list = arcade.SpriteList()
         self.powerup_list = arcade.SpriteList()
 
+        # описания уровней (из кэша, если файл не менялся)
+        self.level_set = LevelSet.load(LEVELS_FILE)
+
+        # текстуры и контуры всех игровых объектов - из кэшей или расчет один раз
+        sprite_textures = [PLAYER_TEXTURE, ENEMY_TEXTURE, *POWERUP_TEXTURES.values()]
+        for texture_file in sprite_textures:
+            assets.texture(texture_file)
+        hit_boxes.preload(sprite_textures)
+
         # игрок
         self.player_sprite = Player()
         self.player_list.append(self.player_sprite)
 
-        # несколько уровней
-        self.level = Level(self.current_level)
-        self.enemy_list = self.level.spawn_enemies()
+        # шрифты интерфейса - атласы из кэша или растеризация один раз
+        self.hud_font = GlyphAtlas(HUD_FONT, 20)
+        self.hud_small_font = GlyphAtlas(HUD_FONT, 16)
+
+        # камеры
+        self.camera = GameCamera(self.window.width, self.window.height)
+        self.gui_camera = arcade.Camera(self.window.width, self.window.height)
 
         # звуки
         try:
-            self.shoot_sound = arcade.load_sound("arcade_resources/assets/sounds/hurt1.wav")
-            self.explosion_sound = arcade.load_sound("arcade_resources/assets/sounds/explosion1.wav")
-            self.powerup_sound = arcade.load_sound("arcade_resources/assets/sounds/coin1.wav")
-            self.level_complete_sound = arcade.load_sound("arcade_resources/assets/sounds/upgrade1.wav")
-            self.hit_sound = arcade.load_sound("arcade_resources/assets/sounds/hit1.wav")
+            self.shoot_sound = assets.sound("arcade_resources/assets/sounds/hurt1.wav")
+            self.explosion_sound = assets.sound("arcade_resources/assets/sounds/explosion1.wav")
+            self.powerup_sound = assets.sound("arcade_resources/assets/sounds/coin1.wav")
+            self.level_complete_sound = assets.sound("arcade_resources/assets/sounds/upgrade1.wav")
+            self.hit_sound = assets.sound("arcade_resources/assets/sounds/hit1.wav")
         except Exception as e:
             print(f"не удалось загрузить звуки: {e}")
+        assets.save_index()
+
+        self.resources_loaded = True
+
+    def reset_game(self):
+        # сброс игрового состояния без пересоздания ресурсов
+        # запись ввода начинается до первого обращения к random в новой игре
+        if INPUT_RECORD_DIR:
+            self.input_recording = InputRecording.start()
+        self.player_bullets.clear()
+        self.enemy_bullets.clear()
+        # SpriteList.clear - O(n); буферы списка создаются заново в начальном размере,
+        # поштучное удаление сохранило бы их, но стоит O(n^2)
+        self.enemy_list.clear()
+        self.powerup_list.clear()
+        self.particle_system.clear()
+        self.events.clear()
+
+        self.player_sprite.reset()
+
+        # игровые переменные
+        self.score = 0
+        self.current_level = 1
+        self.enemy_direction = 1
+        self.enemy_move_down = False
+        self.camera_shake = 0
+        self.camera_x = 0
+        self.camera_y = 0
+        self.input.clear()
+        self.fire_buffer = 0
+        self.input_event_time = None
+
+        # несколько уровней
+        self.level = Level(self.current_level, self.level_set)
+        self.level.spawn_enemies(self.enemy_list)
+        self.formation.track(self.enemy_list)
+        self.session_stats.reset()
+
+        if memory_monitor is not None:
+            memory_monitor.session_started()
+        if self.telemetry is not None:
+            self.telemetry.start_session(self.player_name)
 
     def on_show_view(self):
-        # вызывается при показе view (стартовое окно переключается сюда)
+        # вызывается при показе view (стартовое окно переключается сюда);
+        # цвет фона восстанавливается - окно конца игры меняет его на красный
+        arcade.set_background_color(arcade.color.BLACK)
         self.setup()
+        if music is not None:
+            music.play(MUSIC_GAME_TRACK)
 
     def on_draw(self):
         # отрисовка с камерой
@@ -393,6 +3738,14 @@ class GameView(arcade.View):
         if self.player_sprite is None:
             return
 
+        self.profiler.begin("draw")
+
+        # фон - до игровой камеры, тряска его не сдвигает
+        if self.background is not None:
+            self.profiler.begin("background")
+            self.background.draw()
+            self.profiler.end("background")
+
         # камера - применяем смещение для эффекта тряски при попадании
         if self.camera_shake > 0:
             self.camera_x = random.uniform(-self.camera_shake, self.camera_shake)
@@ -401,11 +3754,13 @@ class GameView(arcade.View):
         else:
             self.camera_x = 0
             self.camera_y = 0
+        self.camera.set_offset(self.camera_x, self.camera_y)
+        self.camera.use()
 
         # спрайты
         self.player_list.draw()
-        self.bullet_list.draw()
-        self.enemy_bullet_list.draw()
+        self.player_bullets.draw()
+        self.enemy_bullets.draw()
         self.enemy_list.draw()
         self.powerup_list.draw()
 
@@ -419,26 +3774,43 @@ class GameView(arcade.View):
                 self.player_sprite.center_y,
                 40,
                 (0, 255, 255, self.player_sprite.shield_alpha),
-                3
+                3,
+                num_segments=self.quality.settings["shield_segments"]
             )
 
-        # подсчет и вывод результатов
-        arcade.draw_text(f"очки: {self.score}", 10, SCREEN_HEIGHT - 30,
-                         arcade.color.WHITE, 20, bold=True)
-        arcade.draw_text(f"уровень: {self.current_level}", 10, SCREEN_HEIGHT - 60,
-                         arcade.color.WHITE, 20, bold=True)
-        arcade.draw_text(f"жизни: {self.player_sprite.lives}", 10, SCREEN_HEIGHT - 90,
-                         arcade.color.WHITE, 20, bold=True)
-        arcade.draw_text(f"игрок: {self.player_name}", 10, SCREEN_HEIGHT - 120,
-                         arcade.color.YELLOW, 16, bold=True)
+        # интерфейс - в координатах экрана, без тряски
+        self.gui_camera.use()
+
+        # подсчет и вывод результатов (растровые шрифты из атласа)
+        self.hud_font.draw_text(f"очки: {self.score}", 10, SCREEN_HEIGHT - 30, arcade.color.WHITE)
+        self.hud_font.draw_text(f"уровень: {self.current_level}", 10, SCREEN_HEIGHT - 60,
+                                arcade.color.WHITE)
+        self.hud_font.draw_text(f"жизни: {self.player_sprite.lives}", 10, SCREEN_HEIGHT - 90,
+                                arcade.color.WHITE)
+        self.hud_small_font.draw_text(f"игрок: {self.player_name}", 10, SCREEN_HEIGHT - 120,
+                                      arcade.color.YELLOW)
 
         # активные улучшения
         if self.player_sprite.shield_active:
-            arcade.draw_text("щит", SCREEN_WIDTH - 150, SCREEN_HEIGHT - 30,
-                             arcade.color.CYAN, 16, bold=True)
+            self.hud_small_font.draw_text("щит", SCREEN_WIDTH - 150, SCREEN_HEIGHT - 30,
+                                          arcade.color.CYAN)
         if self.player_sprite.rapid_fire_active:
-            arcade.draw_text("быстрая стрельба", SCREEN_WIDTH - 200, SCREEN_HEIGHT - 60,
-                             arcade.color.YELLOW, 16, bold=True)
+            self.hud_small_font.draw_text("быстрая стрельба", SCREEN_WIDTH - 200, SCREEN_HEIGHT - 60,
+                                          arcade.color.YELLOW)
+
+        self.profiler.end("draw")
+
+        # задержка от события ввода до кадра, в котором виден его результат
+        if self.input_event_time is not None:
+            self.profiler.add("input_latency", (time.perf_counter() - self.input_event_time) * 1000)
+            self.input_event_time = None
+
+    def on_resize(self, width, height):
+        # изменение размера окна - обновление областей камер
+        super().on_resize(width, height)
+        if self.camera is not None:
+            self.camera.resize(width, height)
+            self.gui_camera.resize(width, height)
 
     def on_update(self, delta_time):
         # обновление логики игры
@@ -447,35 +3819,76 @@ class GameView(arcade.View):
         if self.player_sprite is None:
             return
 
-        # управление игроком
-        if self.left_pressed:
-            self.player_sprite.center_x -= self.player_sprite.speed
-        if self.right_pressed:
-            self.player_sprite.center_x += self.player_sprite.speed
+        self.profiler.begin("update")
+
+        # управление игроком - смещение пропорционально времени удержания клавиш
+        held, presses, event_time = self.input.tick()
+        if self.input_recording is not None:
+            self.input_recording.record(delta_time, held, self.input.held[INPUT_FIRE], presses)
+        direction = held[INPUT_RIGHT] - held[INPUT_LEFT]
+        if direction:
+            self.player_sprite.center_x += self.player_sprite.speed * self.sim_steps * direction
+        if event_time is not None and self.input_event_time is None:
+            self.input_event_time = event_time
+
+        # стрельба: удержание - автоповтор, отдельные нажатия во время перезарядки
+        # запоминаются и срабатывают, как только она закончится; за шаг в несколько
+        # тиков выстрелов может быть больше одного
+        self.fire_buffer = min(self.fire_buffer + presses, FIRE_BUFFER_SIZE)
+        while (self.fire_buffer or self.input.held[INPUT_FIRE]) and self.shoot_bullet():
+            self.fire_buffer = max(0, self.fire_buffer - 1)
 
         # обновление спрайтов
+        steps = self.sim_steps
         for sprite in self.player_list:
-            sprite.on_update(delta_time)
-        for sprite in self.bullet_list:
-            sprite.on_update(delta_time)
-        for sprite in self.enemy_bullet_list:
-            sprite.on_update(delta_time)
+            sprite.on_update(delta_time, steps)
+        self.player_bullets.update(steps)
+        self.enemy_bullets.update(steps)
         for sprite in self.enemy_list:
-            sprite.on_update(delta_time)
+            sprite.on_update(delta_time, steps)
         for sprite in self.powerup_list:
-            sprite.on_update(delta_time)
+            sprite.on_update(delta_time, steps)
 
         # система частиц
+        self.profiler.begin("particles")
         self.particle_system.update(delta_time)
+        self.profiler.end("particles")
+
+        # прокрутка фона
+        if self.background is not None:
+            self.background.update(delta_time, self.player_sprite.center_x)
 
         # логика врагов
+        self.profiler.begin("enemies")
         self.update_enemies()
+        self.profiler.end("enemies")
 
         # collide - проверка столкновений
+        self.profiler.begin("collisions")
         self.check_collisions()
+        self.profiler.end("collisions")
+
+        # обработка событий тика (очки, взрывы, звуки, улучшения)
+        self.profiler.begin("events")
+        self.events.dispatch()
+        self.profiler.end("events")
+
+        self.session_stats.tick(self.sim_steps)
+        if self.telemetry is not None:
+            self.telemetry.sample(self)
+
+        if spectator is not None:
+            self.profiler.begin("spectator")
+            spectator.tick(self)
+            self.profiler.end("spectator")
+
+        # время работы кадра - обновление плюс последняя отрисовка
+        frame_ms = self.profiler.end("update") + self.profiler.last("draw")
+        if self.quality.observe(frame_ms):
+            self.apply_quality()
 
         # несколько уровней - переход на следующий уровень
-        if len(self.enemy_list) == 0:
+        if self.formation.alive == 0:
             self.level_complete()
 
         # финальное окно - переход при поражении
@@ -485,17 +3898,17 @@ class GameView(arcade.View):
     def update_enemies(self):
         # обновление поведения врагов
 
-        if len(self.enemy_list) == 0:
+        formation = self.formation
+        if formation.alive == 0:
             return
 
-        # проверка границ
-        move_down = False
         for enemy in self.enemy_list:
-            enemy.center_x += enemy.speed * self.enemy_direction
+            enemy.center_x += enemy.speed * self.enemy_direction * self.sim_steps
 
-            if (self.enemy_direction == 1 and enemy.right >= SCREEN_WIDTH - 50) or \
-                    (self.enemy_direction == -1 and enemy.left <= 50):
-                move_down = True
+        # проверка границ - по крайним живым врагам рядов
+        edge = formation.edge(self.enemy_direction)
+        move_down = (self.enemy_direction == 1 and edge >= SCREEN_WIDTH - 50) or \
+                    (self.enemy_direction == -1 and edge <= 50)
 
         # опускание вниз и смена направления
         if move_down:
@@ -504,18 +3917,20 @@ class GameView(arcade.View):
                 enemy.center_y -= 30
                 enemy.speed *= 1.05  # ускорение с каждым рядом
 
-        # стрельба врагов
+        # стрельба врагов: fire_chance - вероятность за тик, за шаг в несколько тиков -
+        # вероятность выстрела хотя бы в одном из тиков, когда враг был готов
         for enemy in self.enemy_list:
-            if enemy.enemy_type >= 1 and enemy.shoot_cooldown <= 0:
-                if random.random() < 0.005 * self.current_level:
-                    bullet = Bullet(enemy.center_x, enemy.center_y, -1, is_enemy=True)
-                    self.enemy_bullet_list.append(bullet)
+            if enemy.fire_chance > 0 and enemy.fire_ticks:
+                chance = enemy.fire_chance
+                if enemy.fire_ticks > 1:
+                    chance = 1 - (1 - chance) ** enemy.fire_ticks
+                if random.random() < chance:
+                    self.enemy_bullets.spawn(enemy.center_x, enemy.center_y, -ENEMY_BULLET_SPEED)
                     enemy.shoot_cooldown = random.randint(60, 180)
 
         # проверка достижения нижней границы
-        for enemy in self.enemy_list:
-            if enemy.center_y < 100:
-                self.player_sprite.lives = 0  # мгновенное поражение
+        if formation.bottom() < 100:
+            self.player_sprite.lives = 0  # мгновенное поражение
 
     def check_collisions(self):
         # collide - проверка всех столкновений
@@ -524,139 +3939,226 @@ class GameView(arcade.View):
         if self.player_sprite is None:
             return
 
-        # пули игрока vs враги
-        for bullet in self.bullet_list:
-            hit_list = arcade.check_for_collision_with_list(bullet, self.enemy_list)
-
-            if hit_list:
-                bullet.remove_from_sprite_lists()
-
-                for enemy in hit_list:
-                    enemy.health -= 1
-
-                    if enemy.health <= 0:
-                        # подсчет результатов
-                        self.score += enemy.points
-                        # система частиц - создание взрыва
-                        self.create_explosion(enemy.center_x, enemy.center_y)
-                        enemy.remove_from_sprite_lists()
-
-                        # звук взрыва
-                        if self.explosion_sound:
-                            arcade.play_sound(self.explosion_sound, volume=0.3)
-
-                        # случайное появление улучшения
-                        if random.random() < 0.15:
-                            powerup = PowerUp(enemy.center_x, enemy.center_y)
-                            self.powerup_list.append(powerup)
-                    else:
-                        # звук попадания
-                        if self.hit_sound:
-                            arcade.play_sound(self.hit_sound, volume=0.2)
-
-        # пули врагов vs игрок
-        hit_list = arcade.check_for_collision_with_list(self.player_sprite, self.enemy_bullet_list)
+        # пули игрока vs враги - проверяется весь путь пули за шаг (отрезок против
+        # прямоугольника), поэтому быстрые пули не пролетают сквозь врагов при крупном шаге
+        pool = self.player_bullets
+        bullet_indices = pool.alive_indices()
+        enemies = list(self.enemy_list)
+        if len(bullet_indices) > 0 and enemies:
+            boxes = sprite_boxes(enemies, pool.half_width, pool.half_height)
+            x0, y0, x1, y1 = pool.paths(bullet_indices)
+            # матрица пуля x враг: где на пути пули она входит в каждого врага
+            entry = segment_box_entry(x0[:, None], y0[:, None], x1[:, None], y1[:, None],
+                                      boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+            enemy_alive = np.ones(len(enemies), dtype=bool)
+
+            for row in np.flatnonzero(np.isfinite(entry).any(axis=1)).tolist():
+                # пуля попадает в первого живого врага на своем пути
+                hits = np.where(enemy_alive, entry[row], np.inf)
+                target = int(np.argmin(hits))
+                if not np.isfinite(hits[target]):
+                    continue
+                pool.kill(int(bullet_indices[row]))
+
+                enemy = enemies[target]
+                enemy.health -= 1
+
+                if enemy.health <= 0:
+                    enemy.remove_from_sprite_lists()
+                    self.formation.remove(enemy)
+                    enemy_alive[target] = False
+                    self.events.emit(EnemyKilled(enemy.center_x, enemy.center_y,
+                                                 enemy.points, enemy.enemy_type))
+                else:
+                    self.events.emit(EnemyDamaged(enemy.center_x, enemy.center_y))
+
+        # пули врагов vs игрок - так же по пути пули
+        pool = self.enemy_bullets
+        hit_list = []
+        bullet_indices = pool.alive_indices()
+        if len(bullet_indices) > 0:
+            left, bottom, right, top = hit_bounds(self.player_sprite)
+            x0, y0, x1, y1 = pool.paths(bullet_indices)
+            entry = segment_box_entry(x0, y0, x1, y1,
+                                      left - pool.half_width, bottom - pool.half_height,
+                                      right + pool.half_width, top + pool.half_height)
+            hit_list = bullet_indices[np.isfinite(entry)].tolist()
+
+        if hit_list:
+            for index in hit_list:
+                pool.kill(index)
+            if self.player_sprite.shield_active:
+                # щит поглощает удар
+                self.events.emit(ShieldBlocked(len(hit_list)))
+            else:
+                self.events.emit(PlayerHit(self.player_sprite.center_x, self.player_sprite.center_y,
+                                           len(hit_list)))
 
-        if hit_list and not self.player_sprite.shield_active:
-            for bullet in hit_list:
-                bullet.remove_from_sprite_lists()
+        # игрок vs улучшения
+        hit_list = [powerup for powerup in self.powerup_list
+                    if sprites_collide(self.player_sprite, powerup)]
 
+        for powerup in hit_list:
+            powerup.remove_from_sprite_lists()
+            self.events.emit(PowerUpCollected(powerup.powerup_type))
+
+    def on_enemies_killed(self, events):
+        # обработка уничтоженных за тик врагов
+        for event in events:
+            # подсчет результатов
+            self.score += event.points
+            # система частиц - создание взрыва
+            self.create_explosion(event.x, event.y)
+
+            # случайное появление улучшения
+            if random.random() < self.level.definition.drop_chance:
+                powerup = PowerUp(event.x, event.y)
+                self.powerup_list.append(powerup)
+
+        # звук взрыва - один на все взрывы тика
+        if self.explosion_sound:
+            self.play_sound(self.explosion_sound, volume=0.3)
+
+    def on_enemies_damaged(self, events):
+        # звук попадания - один на все попадания тика
+        if self.hit_sound:
+            self.play_sound(self.hit_sound, volume=0.2)
+
+    def on_player_hit(self, events):
+        # попадание вражеских пуль в игрока без щита
+        for event in events:
             self.player_sprite.lives -= 1
             # система частиц - взрыв при попадании
-            self.create_explosion(self.player_sprite.center_x, self.player_sprite.center_y)
-            # камера - эффект тряски
-            self.camera_shake = 5
-
-            # звук
-            if self.explosion_sound:
-                arcade.play_sound(self.explosion_sound, volume=0.5)
-        elif hit_list and self.player_sprite.shield_active:
-            # щит поглощает удар
-            for bullet in hit_list:
-                bullet.remove_from_sprite_lists()
-            if self.hit_sound:
-                arcade.play_sound(self.hit_sound, volume=0.3)
+            self.create_explosion(event.x, event.y)
+        # камера - эффект тряски
+        self.camera_shake = 5
 
-        # игрок vs улучшения
-        hit_list = arcade.check_for_collision_with_list(self.player_sprite, self.powerup_list)
+        # звук
+        if self.explosion_sound:
+            self.play_sound(self.explosion_sound, volume=0.5)
 
-        for powerup in hit_list:
-            self.apply_powerup(powerup.powerup_type)
-            powerup.remove_from_sprite_lists()
+    def on_shield_blocked(self, events):
+        # щит поглотил удар
+        if self.hit_sound:
+            self.play_sound(self.hit_sound, volume=0.3)
 
-            # звук подбора улучшения
-            if self.powerup_sound:
-                arcade.play_sound(self.powerup_sound, volume=0.5)
+    def on_powerups_collected(self, events):
+        # подобранные улучшения
+        for event in events:
+            self.apply_powerup(event.powerup_type)
 
-    def apply_powerup(self, powerup_type):
-        # применение улучшения
+        # звук подбора улучшения
+        if self.powerup_sound:
+            self.play_sound(self.powerup_sound, volume=0.5)
 
-        if powerup_type == PowerUpType.SHIELD:
-            self.player_sprite.shield_active = True
-            self.player_sprite.powerup_timer = 300  # 5 секунд
-        elif powerup_type == PowerUpType.RAPID_FIRE:
-            self.player_sprite.rapid_fire_active = True
-            self.player_sprite.powerup_timer = 300
-        elif powerup_type == PowerUpType.EXTRA_LIFE:
-            self.player_sprite.lives += 1
+    def on_level_complete(self, events):
+        # звук завершения уровня
+        if self.level_complete_sound:
+            self.play_sound(self.level_complete_sound)
+
+    def apply_powerup(self, powerup_type):
+        # применение улучшения (длительность и правила повторного подбора - в POWERUP_EFFECTS)
+        self.player_sprite.effects.apply(powerup_type)
+
+    def apply_quality(self):
+        # применение настроек текущего уровня качества эффектов
+        settings = self.quality.settings
+        self.particle_system.lifetime_cap = settings["particle_lifetime"]
+        Enemy.pulse_enabled = settings["enemy_pulse"]
+
+    def play_sound(self, sound, volume=1.0):
+        # воспроизведение звука с ограничением числа одновременно звучащих голосов
+        self.sound_players = [player for player in self.sound_players if player.playing]
+        if len(self.sound_players) >= self.quality.settings["sound_voices"]:
+            return None
+        player = arcade.play_sound(sound, volume=volume)
+        if player is not None:
+            self.sound_players.append(player)
+        return player
 
     def create_explosion(self, x, y):
         # система частиц - создание эффекта взрыва
-        self.particle_system.emit(x, y, 30)
+        self.particle_system.emit(x, y, self.quality.settings["explosion_particles"])
 
     def shoot_bullet(self):
         # стрельба игрока
 
         # проверка что игрок существует
         if self.player_sprite is None:
-            return
+            return False
 
         cooldown = 10 if not self.player_sprite.rapid_fire_active else 3
 
         if self.player_sprite.shoot_cooldown <= 0:
-            bullet = Bullet(self.player_sprite.center_x, self.player_sprite.center_y + 20)
-            self.bullet_list.append(bullet)
-            self.player_sprite.shoot_cooldown = cooldown
+            self.player_bullets.spawn(self.player_sprite.center_x, self.player_sprite.center_y + 20,
+                                      BULLET_SPEED)
+            # отрицательная перезарядка - выстрел был готов раньше (шаг в несколько тиков)
+            self.player_sprite.shoot_cooldown += cooldown
+            self.events.emit(ShotFired(self.player_sprite.center_x, self.player_sprite.center_y + 20))
 
             # звук стрельбы
             if self.shoot_sound:
-                arcade.play_sound(self.shoot_sound, volume=0.2)
+                self.play_sound(self.shoot_sound, volume=0.2)
+            return True
+        return False
 
     def level_complete(self):
         # несколько уровней - завершение уровня и переход на следующий
 
         self.current_level += 1
-        self.level = Level(self.current_level)
-        self.enemy_list = self.level.spawn_enemies()
+        self.level = Level(self.current_level, self.level_set)
+        self.level.spawn_enemies(self.enemy_list)
+        self.formation.track(self.enemy_list)
         self.enemy_direction = 1
+        self.session_stats.level_complete(self.current_level)
 
-        # звук завершения уровня
-        if self.level_complete_sound:
-            arcade.play_sound(self.level_complete_sound)
+        self.events.emit(LevelComplete(self.current_level - 1))
 
     def game_over(self):
         # финальное окно - окончание игры
 
         # сохранение результатов во все форматы
         self.save_score_all_formats()
+        self.save_input_recording()
+
+        if self.telemetry is not None:
+            self.telemetry.end_session(self.current_level)
 
         game_over_view = GameOverView(
             self.score,
             self.current_level,
             self.player_sprite.lives if self.player_sprite else 0,
-            self.player_name
+            self.player_name,
+            game_view=self
         )
         self.window.show_view(game_over_view)
 
+    def save_input_recording(self):
+        # запись ввода законченной сессии - для повтора в perf_gate.py
+        if self.input_recording is None or not INPUT_RECORD_DIR:
+            return
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(INPUT_RECORD_DIR, f"session-{timestamp}.lvin")
+        try:
+            os.makedirs(INPUT_RECORD_DIR, exist_ok=True)
+            self.input_recording.save(path)
+            print(f"ввод сессии записан в {path}")
+        except OSError as e:
+            print(f"ошибка записи ввода сессии {path}: {e}")
+        self.input_recording = None
+
     def save_score_all_formats(self):
         # хранение данных - сохранение результата во все форматы
 
         lives = self.player_sprite.lives if self.player_sprite else 0
+        # одна отметка времени для базы и журналов - по ней scores_tool.py находит повторы
+        timestamp = datetime.datetime.now().strftime(SCORE_DATE_FORMAT)
 
-        # сохранение в sqlite базу данных
+        # сохранение в sqlite базу данных вместе со статистикой уровней
         try:
-            success = self.db_manager.save_score(self.player_name, self.score,
-                                                 self.current_level, lives)
+            success = self.db_manager.save_session(self.player_name, self.score, self.current_level, lives,
+                                                   self.session_stats.started,
+                                                   self.session_stats.finish_session(), timestamp)
             if success:
                 print("успешно сохранено в бд")
             else:
@@ -664,65 +4166,85 @@ class GameView(arcade.View):
         except Exception as e:
             print(f"ошибка при вызове сохранения в бд: {e}")
 
-        # сохранение в csv файл
-        file_exists = os.path.isfile('highscores.csv')
+        # сохранение в файловые журналы (csv, txt и компактный бинарный) с ротацией
+        record = ScoreRecord(self.player_name, self.score, self.current_level, lives, timestamp)
+        for score_log in self.score_logs:
+            try:
+                score_log.append(record)
+                print(f"результат сохранен в {score_log.format.name}: {self.player_name}, {self.score}")
+            except Exception as e:
+                print(f"ошибка сохранения в {score_log.path}: {e}")
+
+    def save_snapshot(self, path=SNAPSHOT_FILE):
         try:
-            with open('highscores.csv', 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                if not file_exists:
-                    writer.writerow(['Player', 'Score', 'Level', 'Lives', 'Date'])
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                writer.writerow([self.player_name, self.score, self.current_level,
-                                 lives, timestamp])
-            print(f"результат сохранен в csv: {self.player_name}, {self.score}")
-        except Exception as e:
-            print(f"ошибка сохранения в csv: {e}")
+            size = GameSnapshot.save(self, path)
+            print(f"состояние игры сохранено в {path} ({size} байт)")
+        except OSError as e:
+            print(f"не удалось сохранить состояние игры: {e}")
 
-        # сохранение в txt файл
+    def load_snapshot(self, path=SNAPSHOT_FILE):
         try:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with open('game_results.txt', 'a', encoding='utf-8') as f:
-                f.write(f"дата: {timestamp}\n")
-                f.write(f"игрок: {self.player_name}\n")
-                f.write(f"очки: {self.score}\n")
-                f.write(f"уровень: {self.current_level}\n")
-                f.write(f"жизни: {lives}\n")
-                f.write("-" * 40 + "\n\n")
-            print(f"результат сохранен в txt: {self.player_name}, {self.score}")
-        except Exception as e:
-            print(f"ошибка сохранения в txt: {e}")
+            started = time.perf_counter()
+            GameSnapshot.load(self, path)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"состояние игры загружено из {path} за {elapsed:.1f} мс")
+            # повтор записанного ввода не воспроизведет игру, продолженную со снимка
+            self.input_recording = None
+        except (OSError, ValueError, struct.error) as e:
+            print(f"не удалось загрузить состояние игры: {e}")
 
     def on_key_press(self, key, modifiers):
         # обработка нажатий клавиш
         if key == arcade.key.A:
-            self.left_pressed = True
+            self.input.push(INPUT_LEFT, True)
         elif key == arcade.key.D:
-            self.right_pressed = True
+            self.input.push(INPUT_RIGHT, True)
+        elif key == arcade.key.SPACE:
+            self.input.push(INPUT_FIRE, True)
+        elif key == arcade.key.F5:
+            self.save_snapshot()
+        elif key == arcade.key.F9:
+            self.load_snapshot()
 
     def on_key_release(self, key, modifiers):
         # обработка отпускания клавиш
         if key == arcade.key.A:
-            self.left_pressed = False
+            self.input.push(INPUT_LEFT, False)
         elif key == arcade.key.D:
-            self.right_pressed = False
+            self.input.push(INPUT_RIGHT, False)
+        elif key == arcade.key.SPACE:
+            self.input.push(INPUT_FIRE, False)
+
+    def on_gamepad(self, action, pressed):
+        # действия геймпада - в ту же очередь ввода, что и клавиатура
+        if action in GAMEPAD_INPUTS:
+            self.input.push(GAMEPAD_INPUTS[action], pressed)
 
     def on_mouse_press(self, x, y, button, modifiers):
-        # обработка нажатий мыши
+        # обработка нажатий мыши (удержание - автоматическая стрельба)
+        if button == arcade.MOUSE_BUTTON_LEFT:
+            self.input.push(INPUT_FIRE, True)
+
+    def on_mouse_release(self, x, y, button, modifiers):
         if button == arcade.MOUSE_BUTTON_LEFT:
-            self.shoot_bullet()
+            self.input.push(INPUT_FIRE, False)
 
 
 class MenuView(arcade.View):
     # стартовое окно - меню игры
 
-    def __init__(self):
+    def __init__(self, game_view=None):
         super().__init__()
         self.player_name = "Player"
+        # уже созданный GameView для повторного использования
+        self.game_view = game_view
         self.caps_lock = False  # режим caps lock
         self.shift_pressed = False  # нажат ли shift
 
     def on_show_view(self):
         arcade.set_background_color(arcade.color.BLACK)
+        if music is not None:
+            music.play(MUSIC_MENU_TRACK)
 
     def on_draw(self):
         self.clear()
@@ -800,10 +4322,7 @@ class MenuView(arcade.View):
                 self.player_name = self.player_name[:-1]
 
         elif key == arcade.key.ENTER:
-            # запуск игры с текущим именем
-            game_view = GameView()
-            game_view.player_name = self.player_name
-            self.window.show_view(game_view)
+            self.start_game()
 
         # переключение caps lock
         elif key == arcade.key.CAPSLOCK or key == arcade.key.C:
@@ -849,6 +4368,18 @@ class MenuView(arcade.View):
                     else:
                         self.player_name += char.lower()
 
+    def on_gamepad(self, action, pressed):
+        # с геймпада в меню можно только начать игру, имя вводится с клавиатуры
+        if action == "start" and pressed:
+            self.start_game()
+
+    def start_game(self):
+        # запуск игры с текущим именем
+        if self.game_view is None:
+            self.game_view = GameView()
+        self.game_view.player_name = self.player_name
+        self.window.show_view(self.game_view)
+
     def on_key_release(self, key, modifiers):
         # отслеживание отпускания shift
         if key == arcade.key.LSHIFT or key == arcade.key.RSHIFT:
@@ -858,12 +4389,14 @@ class MenuView(arcade.View):
 class GameOverView(arcade.View):
     # финальное окно - экран окончания игры с результатами
 
-    def __init__(self, score, level, lives, player_name="Player"):
+    def __init__(self, score, level, lives, player_name="Player", game_view=None):
         super().__init__()
         self.score = score
         self.level = level
         self.lives = lives
         self.player_name = player_name
+        # завершившийся GameView - при рестарте сбрасывается, а не создается заново
+        self.game_view = game_view
 
     def on_show_view(self):
         arcade.set_background_color(arcade.color.DARK_RED)
@@ -922,24 +4455,60 @@ class GameOverView(arcade.View):
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.R:
-            # рестарт игры
-            game_view = GameView()
-            game_view.player_name = self.player_name
-            self.window.show_view(game_view)
+            self.restart()
         elif key == arcade.key.ESCAPE:
-            # возврат в меню
-            menu_view = MenuView()
-            self.window.show_view(menu_view)
+            self.to_menu()
+
+    def on_gamepad(self, action, pressed):
+        if not pressed:
+            return
+        if action in ("restart", "start"):
+            self.restart()
+        elif action == "back":
+            self.to_menu()
+
+    def restart(self):
+        # рестарт игры
+        if self.game_view is None:
+            self.game_view = GameView()
+        self.game_view.player_name = self.player_name
+        self.window.show_view(self.game_view)
+
+    def to_menu(self):
+        # возврат в меню
+        menu_view = MenuView(self.game_view)
+        self.window.show_view(menu_view)
 
 
 def main():
     # главная функция запуска игры
+    global memory_monitor, music, spectator
 
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+
+    if MEMORY_MONITOR_ENABLED:
+        memory_monitor = MemoryMonitor()
+        memory_monitor.start()
+    if MUSIC_ENABLED:
+        music = MusicPlayer()
+    if SPECTATOR_PORT:
+        spectator = SpectatorServer()
+        spectator.start()
+    gamepads = GamepadInput(window) if GAMEPAD_ENABLED else None
+    if gamepads is not None:
+        gamepads.start()
+
     menu_view = MenuView()
     window.show_view(menu_view)
     arcade.run()
 
+    if music is not None:
+        music.close()
+    if spectator is not None:
+        spectator.close()
+    if memory_monitor is not None:
+        memory_monitor.stop()
+
 
 if __name__ == "__main__":
     main()
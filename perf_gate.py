@@ -0,0 +1,572 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import pyglet
+
+# проверка производительности игровой логики: записанные сессии ввода повторяются
+# без отрисовки, время и выделения памяти каждой фазы тика сравниваются с базовой линией
+#
+# примеры:
+#   python perf_gate.py record perf/sessions/sweep.lvin --bot sweep --seed 1
+#   python perf_gate.py baseline                 # после осознанного изменения скорости
+#   python perf_gate.py check --report perf_report.txt
+#   python perf_gate.py steps                    # крупный шаг симуляции против покадрового
+#
+# сессии можно записать и из настоящей игры: LINVADERS_RECORD_INPUT=perf/sessions python linvadersfinal.py
+#
+# базовая линия зависит от машины, поэтому в репозиторий не входит: check записывает ее
+# при первом запуске, если файла нет. на сервере сборки perf/baseline.npz нужно сохранять
+# между запусками (кэш сборки) и записывать заново при смене машины или образа
+
+# окно нужно только ради контекста opengl для списков спрайтов;
+# без дисплея (сервер сборки) контекст создается через EGL
+if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+    pyglet.options["headless"] = True
+
+# настройки игры из окружения на повтор не действуют - игра работает с настройками
+# по умолчанию (фон, музыка, телеметрия и т.п. меняют работу тика)
+for name in [name for name in os.environ if name.startswith("LINVADERS_")]:
+    os.environ.pop(name)
+
+import arcade  # noqa: E402
+
+from linvadersfinal import (GameView, EventCounters, InputQueue, InputRecording, InputReplay,  # noqa: E402
+                            SCREEN_WIDTH, SCREEN_HEIGHT, FrameProfiler)
+
+PERF_DIR = "perf"
+SESSIONS_DIR = os.path.join(PERF_DIR, "sessions")
+BASELINE_FILE = os.path.join(PERF_DIR, "baseline.npz")
+
+# фазы тика, которые отмечает FrameProfiler в GameView.on_update
+PHASES = ("update", "enemies", "collisions", "particles", "events")
+
+TICKS_PER_SECOND = 60
+REPEAT = 5  # повторов каждой сессии при замере времени
+ALPHA = 0.01  # уровень значимости критерия Манна-Уитни
+TIME_THRESHOLD = 0.10  # рост медианы времени фазы, который считается регрессией
+TIME_FLOOR_MS = 0.005  # меньший абсолютный рост медианы не учитывается (фазы почти нулевой длины)
+CALIBRATION_ROUNDS = 200  # замеров эталонной нагрузки, берется лучший
+CALIBRATION_WARNING = 0.15  # расхождение эталона с базовой линией, о котором предупреждает отчет
+ALLOC_THRESHOLD = 0.10  # рост выделений памяти фазы, который считается регрессией
+ALLOC_PEAK_FLOOR_KB = 1.0  # меньшие абсолютные изменения пика памяти не учитываются
+ALLOC_BLOCKS_FLOOR = 1.0  # то же для прироста блоков памяти за тик
+
+# сравнение крупного шага симуляции (GameView.sim_steps) с покадровым: игры ботов
+# с одними зернами, частоты событий по всем играм должны совпадать с точностью до допуска.
+# при разном шаге случайные числа расходуются по-разному и игры расходятся, поэтому
+# к допуску добавляется статистический разброс редких событий (2 sqrt(n)).
+# dodge_bot не участвует - он уворачивается от пуль и при крупном шаге реагирует позже
+STEPS = 4
+STEPS_BOTS = ("sweep", "turret", "random")
+STEPS_SEEDS = 12
+STEPS_TICKS = TICKS_PER_SECOND * 40
+STEPS_TOLERANCE = 0.15
+STEPS_METRICS = ("score", "shots", "enemy_shots", "kills", "hits", "lives_lost", "powerups")
+
+
+class TraceProfiler(FrameProfiler):
+    # профилировщик, который кроме скользящего окна хранит все замеры фаз
+
+    def __init__(self):
+        super().__init__()
+        self.trace = defaultdict(list)
+
+    def add(self, name, value):
+        super().add(name, value)
+        self.trace[name].append(value)
+
+
+class AllocationProfiler(FrameProfiler):
+    # профилировщик прохода под tracemalloc: для каждой фазы - пик временно выделенной
+    # памяти (кб) и прирост числа блоков памяти python за тик;
+    # пик вложенной фазы учитывается и в пике внешней
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []  # [фаза, память в начале, блоков в начале, наибольшая память]
+        self.peaks = defaultdict(list)
+        self.blocks = defaultdict(list)
+
+    def begin(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1][3] = max(self.stack[-1][3], peak)
+        tracemalloc.reset_peak()
+        entry = [name, current, 0, current]
+        self.stack.append(entry)
+        # блоки считаются после служебных выделений самого профилировщика
+        entry[2] = sys.getallocatedblocks()
+
+    def end(self, name):
+        blocks = sys.getallocatedblocks()
+        current, peak = tracemalloc.get_traced_memory()
+        _, started, started_blocks, top = self.stack.pop()
+        top = max(top, peak)
+        self.peaks[name].append((top - started) / 1024)
+        self.blocks[name].append(blocks - started_blocks)
+        if self.stack:
+            self.stack[-1][3] = max(self.stack[-1][3], top)
+        tracemalloc.reset_peak()
+        return 0.0
+
+
+def create_game():
+    # окно без показа и игра, результаты которой никуда не сохраняются
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, "perf_gate", visible=False)
+    view = GameView(db_name=":memory:", score_logs=[])
+    window.show_view(view)
+    # качество эффектов не подстраивается под скорость машины - нагрузка одинакова
+    view.quality.budget_ms = math.inf
+    return window, view
+
+
+def start_session(window, view, seed):
+    # новая игра с заданным зерном; то же делает запись сессии
+    if window.current_view is not view:
+        window.show_view(view)
+    random.seed(seed)
+    view.particle_system.rng = np.random.default_rng(seed)
+    view.reset_game()
+
+
+def replay(window, view, recording, profiler):
+    # повтор сессии до конца записи или конца игры, возвращает (тиков, очки, уровень)
+    view.profiler = profiler
+    start_session(window, view, recording.seed)
+    replay_input = view.input = InputReplay(recording)
+    ticks = 0
+    while not replay_input.finished and window.current_view is view:
+        view.on_update(replay_input.delta_time())
+        ticks += 1
+    view.input = InputQueue()
+    return ticks, view.score, view.current_level
+
+
+# боты для записи сессий без игрока: bot(view, tick, rng) нажимает клавиши перед тиком
+
+def sweep_bot(view, tick, rng):
+    # ходит от края к краю и часто стреляет
+    if tick % 40 == 0:
+        view.on_key_press(arcade.key.A if (tick // 40) % 2 else arcade.key.D, 0)
+    if tick % 40 == 20:
+        view.on_key_release(arcade.key.A, 0)
+        view.on_key_release(arcade.key.D, 0)
+    if tick % 5 == 0:
+        view.on_key_press(arcade.key.SPACE, 0)
+        view.on_key_release(arcade.key.SPACE, 0)
+
+
+def turret_bot(view, tick, rng):
+    # держит выстрел и изредка сдвигается
+    if tick == 0:
+        view.on_key_press(arcade.key.SPACE, 0)
+    if tick % 90 == 0:
+        view.on_key_press(rng.choice((arcade.key.A, arcade.key.D)), 0)
+    if tick % 90 == 10:
+        view.on_key_release(arcade.key.A, 0)
+        view.on_key_release(arcade.key.D, 0)
+
+
+def random_bot(view, tick, rng):
+    # случайные нажатия, зерно бота отдельно от зерна игры
+    if rng.random() < 0.1:
+        key = rng.choice((arcade.key.A, arcade.key.D, arcade.key.SPACE))
+        if rng.random() < 0.5:
+            view.on_key_press(key, 0)
+        else:
+            view.on_key_release(key, 0)
+
+
+def dodge_bot(view, tick, rng):
+    # уходит от пуль над собой, иначе встает под ближайшего врага; стреляет без перерыва
+    player = view.player_sprite
+    pool = view.enemy_bullets
+    rows = pool.data[pool.alive_indices()]
+    danger = rows[(np.abs(rows[:, 0] - player.center_x) < 40) & (rows[:, 1] < player.center_y + 160)]
+    if len(danger):
+        target = player.center_x + (120 if danger[0, 0] < player.center_x else -120)
+    elif len(view.enemy_list):
+        target = min((enemy.center_x for enemy in view.enemy_list), key=lambda x: abs(x - player.center_x))
+    else:
+        target = player.center_x
+    view.on_key_release(arcade.key.A, 0)
+    view.on_key_release(arcade.key.D, 0)
+    if target < player.center_x - 5:
+        view.on_key_press(arcade.key.A, 0)
+    elif target > player.center_x + 5:
+        view.on_key_press(arcade.key.D, 0)
+    if tick == 0:
+        view.on_key_press(arcade.key.SPACE, 0)
+
+
+BOTS = {
+    "dodge": dodge_bot,
+    "sweep": sweep_bot,
+    "turret": turret_bot,
+    "random": random_bot,
+}
+
+
+def record_bot_session(output, bot_name, seed, max_ticks):
+    # запись сессии бота: часы очереди ввода идут по тикам, поэтому запись не зависит от машины
+    window, view = create_game()
+    clock_ticks = [0]
+    view.input = InputQueue(clock=lambda: clock_ticks[0] / TICKS_PER_SECOND)
+    start_session(window, view, seed)
+    recording = view.input_recording = InputRecording(seed)
+    bot = BOTS[bot_name]
+    rng = random.Random(seed)
+    for tick in range(max_ticks):
+        bot(view, tick, rng)
+        clock_ticks[0] += 1
+        view.on_update(1 / TICKS_PER_SECOND)
+        if window.current_view is not view:
+            break
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    recording.save(output)
+    print(f"записано {recording.size} тиков в {output} (очки {view.score}, уровень {view.current_level})")
+    window.close()
+
+
+def bot_game(window, view, counters, bot_name, seed, steps, max_ticks):
+    # игра бота с шагом симуляции steps; бот вызывается на каждом тике, как при записи,
+    # а игра обновляется раз в steps тиков. возвращает число тиков и суммы событий игры
+    clock_ticks = [0]
+    view.input = InputQueue(clock=lambda: clock_ticks[0] / TICKS_PER_SECOND)
+    start_session(window, view, seed)
+    view.sim_steps = steps
+    counters.reset()
+    enemy_shots = view.enemy_bullets.spawned
+    bot = BOTS[bot_name]
+    rng = random.Random(seed)
+    tick = 0
+    while tick < max_ticks and window.current_view is view:
+        for _ in range(steps):
+            bot(view, tick, rng)
+            tick += 1
+            clock_ticks[0] += 1
+        view.on_update(steps / TICKS_PER_SECOND)
+    view.sim_steps = 1
+    view.input = InputQueue()
+    return {"ticks": tick, "score": view.score, "shots": counters.shots,
+            "enemy_shots": view.enemy_bullets.spawned - enemy_shots, "kills": counters.kills,
+            "hits": counters.hits, "lives_lost": counters.lives_lost, "powerups": counters.powerups}
+
+
+def compare_steps(steps, seeds, max_ticks, tolerance):
+    # покадровые игры против игр с крупным шагом, возвращает код выхода
+    with contextlib.redirect_stdout(io.StringIO()):
+        window, view = create_game()
+        counters = EventCounters(view.events)
+        totals = {}
+        for bot_name in STEPS_BOTS:
+            for step in (1, steps):
+                total = totals[bot_name, step] = defaultdict(int)
+                for seed in range(seeds):
+                    for name, value in bot_game(window, view, counters, bot_name, seed, step, max_ticks).items():
+                        total[name] += value
+        window.close()
+
+    failed = False
+    print(f"шаг {steps} тиков против покадрового: {seeds} игр на бота до {max_ticks} тиков, "
+          f"допуск {tolerance:.0%}; событий на 1000 тиков")
+    print(f"{'бот':<10}{'величина':<12}{'покадрово':>12}{'шаг ' + str(steps):>12}{'разница':>10}  итог")
+    for bot_name in STEPS_BOTS:
+        base, current = totals[bot_name, 1], totals[bot_name, steps]
+        rows = [("ticks", base["ticks"], current["ticks"], base["ticks"], current["ticks"])]
+        for name in STEPS_METRICS:
+            # ожидаемое число событий - покадровая частота на число тиков игр с крупным шагом
+            expected = base[name] * current["ticks"] / base["ticks"]
+            rows.append((name, base[name] * 1000 / base["ticks"], current[name] * 1000 / current["ticks"],
+                         expected, current[name]))
+        for name, base_rate, rate, expected, value in rows:
+            allowed = tolerance * expected + 2 * math.sqrt(expected + value)
+            verdict = "ok"
+            if abs(value - expected) > allowed:
+                verdict = "РАСХОЖДЕНИЕ"
+                failed = True
+            print(f"{bot_name:<10}{name:<12}{base_rate:>12.1f}{rate:>12.1f}"
+                  f"{relative_change(rate, base_rate):>+10.1%}  {verdict}")
+    print("ПРОВАЛ: крупный шаг расходится с покадровым" if failed else "пройдено")
+    return 1 if failed else 0
+
+
+def load_sessions(directory):
+    # все записи папки по имени, вместе с хешами файлов
+    sessions = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".lvin"):
+            continue
+        path = os.path.join(directory, file_name)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        sessions.append((file_name, digest, InputRecording.load(path)))
+    if not sessions:
+        raise SystemExit(f"нет записанных сессий в {directory}")
+    return sessions
+
+
+def calibrate(rounds=CALIBRATION_ROUNDS):
+    # время эталонной нагрузки (циклы python и мелкие операции numpy, как в тике игры), мс;
+    # сравнение с замером базовой линии показывает, что машина сейчас быстрее или медленнее обычного
+    values = list(range(200))
+    data = np.arange(512, dtype=np.float32).reshape(-1, 4)
+    best = math.inf
+    for _ in range(rounds):
+        started = time.perf_counter()
+        total = 0
+        for value in values:
+            total += value * value % 7
+        for _ in range(20):
+            mask = data[:, 1] > 100
+            data[mask, 0] += 1.0
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def tick_minimums(passes, phase):
+    # повтор детерминирован - в каждом проходе тик выполняет ту же работу, поэтому лучшее время
+    # тика по всем проходам отсекает помехи от других процессов машины
+    samples = [trace[phase] for trace in passes]
+    if len({len(values) for values in samples}) != 1:
+        raise SystemExit(f"проходы различаются числом замеров фазы {phase}: повтор сессий не детерминирован")
+    return np.min(np.array(samples, dtype=np.float32), axis=0)
+
+
+def measure(sessions, repeat):
+    # замер всех сессий: repeat проходов со временем фаз и один проход под tracemalloc;
+    # сообщения игры (сохранение результатов и т.п.) в отчет не попадают
+    with contextlib.redirect_stdout(io.StringIO()):
+        window, view = create_game()
+        # разогрев: кэши уровней, контуров и текстур заполняются до замеров
+        replay(window, view, sessions[0][2], FrameProfiler())
+
+        passes = []
+        results = {}
+        calibration = [calibrate()]
+        started = time.perf_counter()
+        # проходы чередуют сессии, чтобы медленный дрейф машины не ложился на одну сессию
+        for _ in range(repeat):
+            profiler = TraceProfiler()
+            for name, _, recording in sessions:
+                results[name] = replay(window, view, recording, profiler)
+            passes.append(profiler.trace)
+            calibration.append(calibrate())
+        elapsed = time.perf_counter() - started
+
+        allocations = AllocationProfiler()
+        tracemalloc.start()
+        for _, _, recording in sessions:
+            replay(window, view, recording, allocations)
+        tracemalloc.stop()
+        window.close()
+
+    ticks = sum(result[0] for result in results.values())
+    print(f"повторено {ticks} тиков x {repeat} за {elapsed:.1f} с, эталон {np.median(calibration):.4f} мс")
+    return {
+        "calibration": float(np.median(calibration)),
+        "times": {phase: tick_minimums(passes, phase) for phase in PHASES},
+        "peaks": {phase: float(np.mean(allocations.peaks[phase])) for phase in PHASES},
+        "blocks": {phase: float(np.mean(allocations.blocks[phase])) for phase in PHASES},
+        "results": results,
+    }
+
+
+def save_baseline(path, sessions, measured, repeat):
+    meta = {
+        "sessions": {name: digest for name, digest, _ in sessions},
+        "results": measured["results"],
+        "calibration": measured["calibration"],
+        "peaks": measured["peaks"],
+        "blocks": measured["blocks"],
+        "repeat": repeat,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # замеры хранятся в float16: трех значащих цифр хватает для критерия, а файл вдвое меньше
+    np.savez_compressed(path, meta=json.dumps(meta, ensure_ascii=False),
+                        **{f"time_{phase}": measured["times"][phase].astype(np.float16) for phase in PHASES})
+    print(f"базовая линия записана в {path}")
+
+
+def load_baseline(path):
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        times = {phase: data[f"time_{phase}"].astype(np.float32) for phase in PHASES if f"time_{phase}" in data}
+    return meta, times
+
+
+def mann_whitney(current, baseline):
+    # односторонний критерий Манна-Уитни (нормальное приближение с поправкой на совпадения):
+    # p-значение гипотезы, что замеры current в целом больше baseline
+    n1, n2 = len(current), len(baseline)
+    values = np.concatenate((current, baseline)).astype(np.float64)
+    order = values.argsort(kind="mergesort")
+    _, first, counts = np.unique(values[order], return_index=True, return_counts=True)
+    # совпадающим значениям - средний ранг (ранги с единицы)
+    ranks = np.empty(len(values))
+    ranks[order] = np.repeat(first + (counts + 1) / 2, counts)
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    ties = float(np.sum(counts.astype(np.float64) ** 3 - counts))
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def relative_change(current, base):
+    return (current - base) / base if base else 0.0
+
+
+def compare(meta, baseline_times, measured, alpha, time_threshold, alloc_threshold):
+    # сравнение с базовой линией, возвращает (строки отчета, найдены ли регрессии)
+    lines = []
+    failed = False
+
+    lines.append(f"базовая линия: {meta['date']}, python {meta['python']}, {meta['platform']}, "
+                 f"повторов {meta['repeat']}")
+    speed = relative_change(measured["calibration"], meta["calibration"])
+    lines.append(f"эталонная нагрузка: {measured['calibration']:.4f} мс, было {meta['calibration']:.4f} мс "
+                 f"({speed:+.0%})")
+    if abs(speed) > CALIBRATION_WARNING:
+        lines.append("внимание: скорость машины заметно отличается от базовой линии "
+                     "(другая машина или фоновая нагрузка) - сравнение времени ненадежно")
+    for name, result in measured["results"].items():
+        base_result = meta["results"].get(name)
+        if base_result is not None and list(base_result) != list(result):
+            lines.append(f"внимание: {name} проходит иначе, чем в базовой линии "
+                         f"(тиков, очки, уровень: {tuple(base_result)} -> {tuple(result)}) - "
+                         f"изменилась игровая логика, нагрузка не сравнима напрямую")
+
+    lines.append("")
+    lines.append(f"лучшее время тика по повторам, мс (регрессия: p < {alpha} и медиана выросла больше "
+                 f"чем на {time_threshold:.0%} и на {TIME_FLOOR_MS} мс)")
+    lines.append(f"{'фаза':<12}{'медиана':>10}{'было':>10}{'p95':>10}{'было':>10}{'изменение':>12}"
+                 f"{'p':>10}  итог")
+    for phase in PHASES:
+        current = measured["times"][phase]
+        base = baseline_times.get(phase)
+        if base is None or len(base) == 0 or len(current) == 0:
+            lines.append(f"{phase:<12}нет данных")
+            continue
+        median, base_median = float(np.median(current)), float(np.median(base))
+        p95, base_p95 = float(np.percentile(current, 95)), float(np.percentile(base, 95))
+        change = relative_change(median, base_median)
+        significant = abs(median - base_median) > TIME_FLOOR_MS
+        p_value = mann_whitney(current, base)
+        if p_value < alpha and change > time_threshold and significant:
+            verdict = "РЕГРЕССИЯ"
+            failed = True
+        elif mann_whitney(base, current) < alpha and change < -time_threshold and significant:
+            verdict = "быстрее"
+        else:
+            verdict = "ok"
+        lines.append(f"{phase:<12}{median:>10.4f}{base_median:>10.4f}{p95:>10.4f}{base_p95:>10.4f}"
+                     f"{change:>+12.1%}{p_value:>10.2g}  {verdict}")
+
+    lines.append("")
+    lines.append(f"выделения памяти за тик (регрессия: рост больше чем на {alloc_threshold:.0%})")
+    lines.append(f"{'фаза':<12}{'пик, кб':>10}{'было':>10}{'блоков':>10}{'было':>10}  итог")
+    for phase in PHASES:
+        peak, base_peak = measured["peaks"][phase], meta["peaks"].get(phase, 0.0)
+        blocks, base_blocks = measured["blocks"][phase], meta["blocks"].get(phase, 0.0)
+        worse = []
+        if peak - base_peak > ALLOC_PEAK_FLOOR_KB and relative_change(peak, base_peak) > alloc_threshold:
+            worse.append(f"пик {relative_change(peak, base_peak):+.0%}" if base_peak else "пик")
+        if blocks - base_blocks > ALLOC_BLOCKS_FLOOR and \
+                (base_blocks <= 0 or relative_change(blocks, base_blocks) > alloc_threshold):
+            worse.append(f"блоки {blocks - base_blocks:+.1f}")
+        if worse:
+            failed = True
+        verdict = "РЕГРЕССИЯ (" + ", ".join(worse) + ")" if worse else "ok"
+        lines.append(f"{phase:<12}{peak:>10.2f}{base_peak:>10.2f}{blocks:>10.2f}{base_blocks:>10.2f}  {verdict}")
+
+    lines.append("")
+    lines.append("ПРОВАЛ: найдены регрессии" if failed else "пройдено: регрессий нет")
+    return lines, failed
+
+
+def check(sessions_dir, baseline_path, repeat, alpha, time_threshold, alloc_threshold, report_path):
+    sessions = load_sessions(sessions_dir)
+    if not os.path.exists(baseline_path):
+        # первый запуск на этой машине - сравнивать не с чем
+        print(f"нет базовой линии {baseline_path}, она записывается по текущим замерам")
+        save_baseline(baseline_path, sessions, measure(sessions, repeat), repeat)
+        return 0
+    meta, baseline_times = load_baseline(baseline_path)
+    if {name: digest for name, digest, _ in sessions} != meta["sessions"]:
+        print(f"сессии в {sessions_dir} не совпадают с базовой линией, перезапишите ее: "
+              f"python perf_gate.py baseline")
+        return 2
+    measured = measure(sessions, repeat)
+    lines, failed = compare(meta, baseline_times, measured, alpha, time_threshold, alloc_threshold)
+    report = "\n".join(lines)
+    print(report)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="проверка производительности игровой логики по записанным сессиям")
+    parser.add_argument("--sessions", default=SESSIONS_DIR, help=f"папка записей ввода (по умолчанию {SESSIONS_DIR})")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"файл базовой линии (по умолчанию {BASELINE_FILE})")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="повторов каждой сессии")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="записать сессию бота")
+    record_parser.add_argument("output")
+    record_parser.add_argument("--bot", choices=sorted(BOTS), default="sweep")
+    record_parser.add_argument("--seed", type=int, default=1)
+    record_parser.add_argument("--ticks", type=int, default=TICKS_PER_SECOND * 60)
+
+    commands.add_parser("baseline", help="замерить сессии и записать базовую линию")
+
+    check_parser = commands.add_parser("check", help="замерить сессии и сравнить с базовой линией")
+    check_parser.add_argument("--alpha", type=float, default=ALPHA)
+    check_parser.add_argument("--threshold", type=float, default=TIME_THRESHOLD,
+                              help="допустимый рост медианы времени фазы (доля)")
+    check_parser.add_argument("--alloc-threshold", type=float, default=ALLOC_THRESHOLD,
+                              help="допустимый рост выделений памяти фазы (доля)")
+    check_parser.add_argument("--report", help="записать отчет в файл")
+
+    steps_parser = commands.add_parser("steps", help="сравнить игры с крупным шагом симуляции и покадровые")
+    steps_parser.add_argument("--steps", type=int, default=STEPS, help="тиков за один шаг симуляции")
+    steps_parser.add_argument("--seeds", type=int, default=STEPS_SEEDS, help="игр на каждого бота")
+    steps_parser.add_argument("--ticks", type=int, default=STEPS_TICKS, help="наибольшая длина игры в тиках")
+    steps_parser.add_argument("--tolerance", type=float, default=STEPS_TOLERANCE,
+                              help="допустимое отличие частоты событий (доля)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record_bot_session(args.output, args.bot, args.seed, args.ticks)
+    elif args.command == "baseline":
+        sessions = load_sessions(args.sessions)
+        save_baseline(args.baseline, sessions, measure(sessions, args.repeat), args.repeat)
+    elif args.command == "check":
+        return check(args.sessions, args.baseline, args.repeat, args.alpha, args.threshold,
+                     args.alloc_threshold, args.report)
+    elif args.command == "steps":
+        return compare_steps(args.steps, args.seeds, args.ticks, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import contextlib
+import os
+import sqlite3
+import sys
+import time
+
+from linvadersfinal import DatabaseManager, ScoreLog, ScoreRecord, SCORE_FORMATS
+
+# утилита для массового импорта/экспорта результатов и обслуживания базы рекордов
+#
+# примеры:
+#   python scores_tool.py import game_scores_cab2.db highscores.csv game_results.txt
+#   python scores_tool.py export scores.jsonl --format jsonl
+#   python scores_tool.py dedupe
+#   python scores_tool.py compact
+#
+# утилита работает с таблицей scores: сессии и сводки игроков для таблицы рекордов
+# база создает и удаляет вместе с записями сама (триггеры схемы версии 3)
+
+SCORE_COLUMNS = "player_name, score, level, lives, date"
+
+# условие "записи {a} и {b} - один и тот же результат": совпадают все поля (поиск по
+# индексу idx_scores_record). даты везде в местном времени - старые базы с датами по utc
+# переводит миграция 4, а load_sqlite_source - подключаемые базы старых версий
+SAME_RESULT = """
+    {a}.player_name = {b}.player_name AND {a}.score = {b}.score
+    AND {a}.level = {b}.level AND {a}.lives = {b}.lives AND {a}.date IS {b}.date
+"""
+
+# сколько строк читать/писать за один раз при потоковой обработке
+CHUNK_SIZE = 10000
+
+# расширения файлов и соответствующие форматы журналов
+EXTENSION_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".txt": "txt",
+    ".bin": "bin",
+}
+
+
+@contextlib.contextmanager
+def connect(db_name):
+    # соединение с базой, настроенное для массовых операций; режим журнала хранится
+    # в файле базы, поэтому wal включается только на время работы утилиты
+    DatabaseManager(db_name).close()  # создание или обновление схемы базы
+    conn = sqlite3.connect(db_name)
+    journal_mode, = conn.execute("PRAGMA journal_mode").fetchone()
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # индекс по всем полям записи - для поиска дубликатов
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_scores_record ON scores ({SCORE_COLUMNS})")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_score ON scores (score DESC)")
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        except sqlite3.Error as e:
+            print(f"не удалось вернуть режим журнала {journal_mode}: {e}")
+        conn.close()
+
+
+def source_format(path):
+    # определение формата файла по расширению
+    if path.endswith(".gz"):
+        path = path[:-3]
+        # сегменты ротации: highscores.csv.3.gz
+        base, index = os.path.splitext(path)
+        if index[1:].isdigit():
+            path = base
+    extension = os.path.splitext(path)[1].lower()
+    return EXTENSION_FORMATS.get(extension)
+
+
+def load_sqlite_source(conn, path):
+    # копирование таблицы scores другой базы одним запросом; база старой версии
+    # не обновляется, ее даты по utc переводятся в местное время при копировании
+    # attach нельзя выполнить внутри транзакции
+    conn.commit()
+    conn.execute("ATTACH DATABASE ? AS source", (path,))
+    try:
+        version, = conn.execute("PRAGMA source.user_version").fetchone()
+        date = "date" if version >= DatabaseManager.LOCAL_DATE_VERSION else "datetime(date, 'localtime')"
+        cursor = conn.execute(f"INSERT INTO staging ({SCORE_COLUMNS}) "
+                              f"SELECT player_name, score, level, lives, {date} FROM source.scores")
+        return cursor.rowcount
+    finally:
+        conn.commit()
+        conn.execute("DETACH DATABASE source")
+
+
+def load_log_source(conn, path, format_name):
+    # потоковое чтение журнала (вместе с его сжатыми сегментами) в промежуточную таблицу
+    score_log = ScoreLog(path, SCORE_FORMATS[format_name]())
+    if not score_log.segments():
+        print(f"файл не найден: {path}")
+        return 0
+    cursor = conn.executemany(f"INSERT INTO staging ({SCORE_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                              (tuple(record) for record in score_log))
+    return cursor.rowcount
+
+
+def import_sources(db_name, sources):
+    # импорт всех источников в таблицу scores без дубликатов
+    with connect(db_name) as conn:
+        conn.execute(f"CREATE TEMP TABLE staging ({SCORE_COLUMNS})")
+        started = time.perf_counter()
+        total = 0
+
+        for path in sources:
+            if os.path.abspath(path) == os.path.abspath(db_name):
+                print(f"пропуск {path}: это целевая база")
+                continue
+            if path.endswith((".db", ".sqlite", ".sqlite3")):
+                count = load_sqlite_source(conn, path)
+            else:
+                format_name = source_format(path)
+                if format_name is None:
+                    print(f"пропуск {path}: неизвестный формат")
+                    continue
+                count = load_log_source(conn, path, format_name)
+            total += count
+            print(f"{path}: прочитано записей {count}")
+
+        # перенос из промежуточной таблицы одной транзакцией, повторы отбрасываются -
+        # и уже бывшие в базе, и встретившиеся в нескольких источниках (остается первый)
+        with conn:
+            conn.execute(f"CREATE INDEX temp.idx_staging_record ON staging ({SCORE_COLUMNS})")
+            cursor = conn.execute(f'''
+                INSERT INTO scores ({SCORE_COLUMNS})
+                SELECT {SCORE_COLUMNS} FROM staging AS st
+                WHERE NOT EXISTS (SELECT 1 FROM scores AS s WHERE {SAME_RESULT.format(a="s", b="st")})
+                  AND NOT EXISTS (SELECT 1 FROM staging AS prev
+                                  WHERE prev.rowid < st.rowid AND {SAME_RESULT.format(a="prev", b="st")})
+                ORDER BY st.rowid
+            ''')
+            inserted = cursor.rowcount
+        conn.execute("DROP TABLE staging")
+
+    elapsed = time.perf_counter() - started
+    print(f"импортировано {inserted} из {total} записей за {elapsed:.2f} с "
+          f"(дубликатов: {total - inserted})")
+    return inserted
+
+
+def dedupe(db_name):
+    # удаление повторяющихся записей, остается запись с наименьшим id
+    with connect(db_name) as conn, conn:
+        cursor = conn.execute(f'''
+            DELETE FROM scores WHERE id NOT IN (
+                SELECT MIN(id) FROM scores GROUP BY {SCORE_COLUMNS}
+            )
+        ''')
+    print(f"удалено дубликатов: {cursor.rowcount}")
+    return cursor.rowcount
+
+
+def row_to_record(row):
+    # строка базы -> запись журнала (дата в базе может быть пустой)
+    player_name, score, level, lives, date = row
+    return ScoreRecord(player_name, score, level, lives, date or "1970-01-01 00:00:00")
+
+
+def export_scores(db_name, output, format_name, chunk_size=CHUNK_SIZE):
+    # потоковая выгрузка таблицы scores в файл порциями
+    score_format = SCORE_FORMATS[format_name]()
+    count = 0
+    with connect(db_name) as conn, open(output, 'wb') as f:
+        cursor = conn.execute(f"SELECT {SCORE_COLUMNS} FROM scores ORDER BY id")
+        f.write(score_format.file_header())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            f.write(b"".join(score_format.encode(row_to_record(row)) for row in rows))
+            count += len(rows)
+    print(f"выгружено {count} записей в {output}")
+    return count
+
+
+def compact(db_name):
+    # сжатие файла базы и обновление статистики планировщика
+    with connect(db_name) as conn:
+        size_before = os.path.getsize(db_name)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+    size_after = os.path.getsize(db_name)
+    print(f"база сжата: {size_before // 1024} кб -> {size_after // 1024} кб")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="импорт, экспорт и обслуживание базы рекордов")
+    parser.add_argument("--db", default="game_scores.db", help="база sqlite (по умолчанию game_scores.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="импорт результатов из баз и журналов")
+    import_parser.add_argument("sources", nargs="+",
+                               help="файлы .db, .csv, .txt, .jsonl, .bin (сегменты .gz подхватываются)")
+    import_parser.add_argument("--no-compact", action="store_true",
+                               help="не выполнять VACUUM и ANALYZE после импорта")
+
+    export_parser = commands.add_parser("export", help="выгрузка результатов в файл")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    export_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    commands.add_parser("dedupe", help="удаление дубликатов из базы")
+    commands.add_parser("compact", help="VACUUM и ANALYZE")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        import_sources(args.db, args.sources)
+        dedupe(args.db)
+        if not args.no_compact:
+            compact(args.db)
+    elif args.command == "export":
+        export_scores(args.db, args.output, args.format, args.chunk_size)
+    elif args.command == "dedupe":
+        dedupe(args.db)
+    elif args.command == "compact":
+        compact(args.db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import sys
+import threading
+import time
+
+import arcade
+import numpy as np
+
+from linvadersfinal import (SpectatorDelta, SPECTATOR_CHANNELS, SPECTATOR_HOST, SPECTATOR_POSITION_SCALE,
+                            SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# зритель: подключается к игре, запущенной с LINVADERS_SPECTATOR=<порт>,
+# и показывает ее на втором экране
+#
+# примеры:
+#   LINVADERS_SPECTATOR=7777 python linvadersfinal.py
+#   python spectator.py 7777
+#   python spectator.py 7777 --stats --seconds 30   # без окна, только статистика приема
+
+# тиков игры в секунду - для продвижения сущностей между сообщениями
+TICKS_PER_SECOND = 60
+
+CHANNEL_STYLES = {
+    "enemies": (arcade.color.GREEN, 12),
+    "player_bullets": (arcade.color.WHITE, 4),
+    "enemy_bullets": (arcade.color.RED, 4),
+    "powerups": (arcade.color.GOLD, 10),
+}
+
+
+class SpectatorClient:
+    # прием сообщений сервера в отдельном потоке с циклом asyncio;
+    # последнее состояние заменяется целиком, поэтому окно читает его без блокировок
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.snapshot = None  # (таблицы каналов, SpectatorState, время приема)
+        self.messages = 0
+        self.bytes = 0
+        self.keyframes = 0
+        self.decode_time = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="spectator-client", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        try:
+            asyncio.run(self.receive())
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.error = e
+
+    async def receive(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        tables = {}
+        last_tick = 0
+        frame = SpectatorDelta.FRAME
+        try:
+            while True:
+                length, message_type = frame.unpack(await reader.readexactly(frame.size))
+                body = await reader.readexactly(length)
+                if message_type != SpectatorDelta.KEYFRAME and not tables:
+                    continue
+                started = time.perf_counter()
+                tables = dict(tables)
+                state = SpectatorDelta.apply(tables, message_type, body, last_tick)
+                self.decode_time += time.perf_counter() - started
+                last_tick = state.tick
+                self.snapshot = (tables, state, time.perf_counter())
+                self.messages += 1
+                self.bytes += frame.size + length
+                self.keyframes += message_type == SpectatorDelta.KEYFRAME
+        finally:
+            writer.close()
+
+
+class SpectatorWindow(arcade.Window):
+    # упрощенная картинка игры: сущности точками, игрок прямоугольником
+
+    def __init__(self, client):
+        super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, "Лицей Invaders - зритель")
+        self.client = client
+        arcade.set_background_color(arcade.color.BLACK)
+
+    def on_update(self, delta_time):
+        if self.client.error is not None:
+            print(f"соединение закрыто: {self.client.error}")
+            self.close()
+
+    def on_draw(self):
+        self.clear()
+        snapshot = self.client.snapshot
+        if snapshot is None:
+            arcade.draw_text("ожидание игры...", SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
+                             arcade.color.WHITE, 20, anchor_x="center")
+            return
+        tables, state, received = snapshot
+        # продвижение по скорости с момента приема, как это делает сам протокол
+        ticks = (time.perf_counter() - received) * TICKS_PER_SECOND
+        for channel in SPECTATOR_CHANNELS:
+            table = tables[channel]
+            if len(table) == 0:
+                continue
+            x = (table["x"] + table["vx"] * ticks) / SPECTATOR_POSITION_SCALE
+            y = (table["y"] + table["vy"] * ticks) / SPECTATOR_POSITION_SCALE
+            color, size = CHANNEL_STYLES[channel]
+            arcade.draw_points(np.column_stack((x, y)).tolist(), color, size)
+
+        arcade.draw_rectangle_filled(state.player_x / SPECTATOR_POSITION_SCALE,
+                                     state.player_y / SPECTATOR_POSITION_SCALE, 40, 20, arcade.color.CYAN)
+        arcade.draw_text(f"Очки: {state.score}   Уровень: {state.level}   Жизни: {state.lives}",
+                         10, SCREEN_HEIGHT - 30, arcade.color.WHITE, 16)
+
+
+def print_stats(client, seconds):
+    # прием без окна: раз в секунду - сообщения, трафик и число сущностей
+    started = time.perf_counter()
+    messages = received = 0
+    while client.error is None and (seconds is None or time.perf_counter() - started < seconds):
+        time.sleep(1)
+        snapshot = client.snapshot
+        counts = " ".join(f"{channel}={len(snapshot[0][channel])}" for channel in SPECTATOR_CHANNELS) \
+            if snapshot else "нет данных"
+        decode_ms = client.decode_time / client.messages * 1000 if client.messages else 0.0
+        print(f"сообщений {client.messages - messages}/с, {(client.bytes - received) / 1024:.1f} кб/с, "
+              f"разбор {decode_ms:.3f} мс, {counts}")
+        messages, received = client.messages, client.bytes
+    if client.error is not None:
+        print(f"соединение закрыто: {client.error}")
+    print(f"всего: сообщений {client.messages} (ключевых {client.keyframes}), {client.bytes} байт")
+    return client.error is None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="зритель игры, запущенной с LINVADERS_SPECTATOR")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--host", default=SPECTATOR_HOST)
+    parser.add_argument("--stats", action="store_true", help="без окна, печатать статистику приема")
+    parser.add_argument("--seconds", type=float, help="сколько секунд принимать в режиме --stats")
+    args = parser.parse_args(argv)
+
+    client = SpectatorClient(args.host, args.port)
+    client.start()
+    if args.stats:
+        return 0 if print_stats(client, args.seconds) else 1
+    SpectatorWindow(client)
+    arcade.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())